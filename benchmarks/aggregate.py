@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+"""Compares aggregate() over the Place column store with a walk of the
+places (what it does without NumPy).
+
+Usage: python3 -m benchmarks.aggregate [places] [cities]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+from models.engine import columns
+from models.engine.file_storage import FileStorage
+from models.place import Place
+
+
+def rate(run):
+    """Returns the calls/sec of run, for 1 second."""
+    calls = 0
+    start = time.perf_counter()
+    while calls == 0 or time.perf_counter() - start < 1:
+        run()
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def main(places=1000000, cities=1000):
+    """Prints the queries/sec of each reporting query both ways."""
+    os.chdir(tempfile.mkdtemp())
+    FileStorage._FileStorage__objects = {}
+    storage = FileStorage()
+    rand = random.Random(0)
+    storage.bulk_new(({"city_id": "city-{}".format(rand.randrange(cities)),
+                       "price_by_night": rand.randrange(20, 500),
+                       "max_guest": rand.randrange(1, 10),
+                       "number_rooms": rand.randrange(1, 6)}
+                      for i in range(places)), cls=Place)
+    queries = (("total max_guest", ("max_guest", "sum")),
+               ("mean price by city", ("price_by_night", "mean",
+                                       "city_id")),
+               ("max price, 3+ rooms", ("price_by_night", "max", None,
+                                        {"number_rooms": (3, None)})),
+               ("count by city, <100", ("price_by_night", "count",
+                                        "city_id",
+                                        {"price_by_night": (None, 99)})))
+    print("{} places in {} cities".format(places, cities))
+    if columns.np is None:
+        print("NumPy isn't installed: aggregate() walks the places")
+    else:
+        start = time.perf_counter()
+        storage.aggregate(Place, "max_guest", "count")
+        print("column store built in {:.1f} s".format(
+            time.perf_counter() - start))
+    print("{:<22}{:>12}{:>12}{:>10}".format("query", "walk", "columns",
+                                            "speedup"))
+    for name, query in queries:
+        with patch.object(columns, "np", None):
+            walk = rate(lambda: storage.aggregate(Place, *query))
+        if columns.np is None:
+            print("{:<22}{:>12.2f}".format(name, walk))
+            continue
+        vector = rate(lambda: storage.aggregate(Place, *query))
+        print("{:<22}{:>12.2f}{:>12.1f}{:>9.0f}x".format(
+            name, walk, vector, vector / walk))
+    print("queries/sec")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
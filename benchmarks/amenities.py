@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+"""Compares find_containing() on amenity_ids with a scan of all().
+
+Usage: python3 -m benchmarks.amenities [places] [amenities]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from models.engine.file_storage import FileStorage
+from models.place import Place
+
+
+def main(places=200000, amenities=30):
+    """Prints the queries/sec of a scan and of find_containing()."""
+    os.chdir(tempfile.mkdtemp())
+    FileStorage._FileStorage__objects = {}
+    storage = FileStorage()
+    rand = random.Random(0)
+    ids = ["amenity-{}".format(i) for i in range(amenities)]
+    odds = [0.9 / (i + 1) for i in range(amenities)]
+    storage.bulk_new(({"amenity_ids": [a for a, p in zip(ids, odds)
+                                       if rand.random() < p]}
+                      for i in range(places)), cls=Place)
+    storage.find_containing(Place, "amenity_ids", ids[:1])
+    print("{} places, {} amenities".format(places, amenities))
+    print("{:<24}{:>10}{:>14}".format("filter", "matches", "queries/sec"))
+
+    def scan(wanted):
+        return [place for place in storage.all(Place).values()
+                if all(a in place.amenity_ids for a in wanted)]
+
+    for wanted in (ids[:2], ids[:3], ids[1:4:2], ids[-2:]):
+        for name, run in (("scan", scan),
+                          ("index", lambda wanted: storage.find_containing(
+                              Place, "amenity_ids", wanted))):
+            queries = 0
+            start = time.perf_counter()
+            while queries == 0 or time.perf_counter() - start < 1:
+                found = run(wanted)
+                queries += 1
+            print("{:<24}{:>10}{:>14.1f}".format(
+                "{} {}".format(name, ",".join(a.split("-")[1]
+                                              for a in wanted)),
+                len(found), queries / (time.perf_counter() - start)))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+"""Compares seeding Places one save at a time with bulk_load().
+
+Usage: python3 -m benchmarks.bulk_load [objects]
+"""
+import os
+import sys
+import tempfile
+import time
+from models.engine.file_storage import FileStorage
+from models.place import Place
+
+
+def records(objects):
+    """Returns the dicts of objects Places."""
+    return [{"name": "place{}".format(i), "price_by_night": i % 500,
+             "amenity_ids": []} for i in range(objects)]
+
+
+def one_by_one(rows):
+    """Creates and saves one Place per row, as the console does."""
+    for row in rows:
+        place = Place()
+        for k, v in row.items():
+            setattr(place, k, v)
+        place.save()
+
+
+def main(objects=2000):
+    """Prints objects/sec for each way of seeding the storage."""
+    os.chdir(tempfile.mkdtemp())
+    storage = FileStorage()
+    print("{} Places".format(objects))
+    print("{:<24}{:>12}".format("method", "objects/sec"))
+    runs = (("Place() + save() each", one_by_one),
+            ("bulk_load(index=True)", lambda rows: storage.bulk_load(
+                rows, cls=Place)),
+            ("bulk_load(index=False)", lambda rows: storage.bulk_load(
+                rows, cls=Place, index=False)))
+    for name, run in runs:
+        FileStorage._FileStorage__objects = {}
+        storage.checkpoint()
+        rows = records(objects)
+        start = time.perf_counter()
+        run(rows)
+        rate = objects / (time.perf_counter() - start)
+        print("{:<24}{:>12.0f}".format(name, rate))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+"""Measures FileStorage reads per second while one thread keeps saving.
+
+Usage: python3 -m benchmarks.concurrent_reads [objects] [seconds]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from models.engine.file_storage import FileStorage
+from models.user import User
+
+
+def run(storage, users, readers, seconds):
+    """Runs readers threads and one writer; returns (reads, saves)/sec."""
+    stop = threading.Event()
+    reads = [0] * readers
+    saves = [0]
+
+    def read(n):
+        while not stop.is_set():
+            user = users[reads[n] % len(users)]
+            storage.get(User, user.id)
+            storage.count(User)
+            reads[n] += 1
+
+    def write():
+        while not stop.is_set():
+            users[saves[0] % len(users)].first_name = str(saves[0])
+            storage.save()
+            saves[0] += 1
+
+    threads = [threading.Thread(target=read, args=(n,))
+               for n in range(readers)]
+    threads.append(threading.Thread(target=write))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(reads) / seconds, saves[0] / seconds
+
+
+def main(objects=1000, seconds=2):
+    """Prints a reads/sec and saves/sec table per number of readers."""
+    os.chdir(tempfile.mkdtemp())
+    FileStorage._FileStorage__objects = {}
+    users = [User() for i in range(objects)]
+    print("{} objects, {}s per run".format(objects, seconds))
+    print("{:<10}{:>12}{:>12}".format("readers", "reads/sec", "saves/sec"))
+    for journal in (False, True):
+        storage = FileStorage(journal=journal)
+        storage.checkpoint()
+        print("journal" if journal else "snapshot")
+        for readers in (1, 2, 4, 8):
+            reads, saves = run(storage, users, readers, seconds)
+            print("{:<10}{:>12.0f}{:>12.0f}".format(readers, reads, saves))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,40 @@
+#!/usr/bin/python3
+"""Compares find() on an indexed attribute with a scan of all().
+
+Usage: python3 -m benchmarks.find [cities] [states]
+"""
+import os
+import sys
+import tempfile
+import time
+from models.city import City
+from models.engine.file_storage import FileStorage
+
+
+def main(cities=100000, states=1000):
+    """Prints the lookups/sec of a scan and of find()."""
+    os.chdir(tempfile.mkdtemp())
+    FileStorage._FileStorage__objects = {}
+    storage = FileStorage()
+    storage.bulk_new(({"state_id": str(i % states)} for i in range(cities)),
+                     cls=City)
+    print("{} cities in {} states".format(cities, states))
+    print("{:<10}{:>14}".format("method", "lookups/sec"))
+    runs = (("scan", lambda state_id: [
+                city for city in storage.all(City).values()
+                if city.state_id == state_id]),
+            ("find", lambda state_id: storage.find(City,
+                                                   state_id=state_id)))
+    storage.find(City, state_id="0")
+    for name, run in runs:
+        lookups = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < 1:
+            run(str(lookups % states))
+            lookups += 1
+        print("{:<10}{:>14.0f}".format(
+            name, lookups / (time.perf_counter() - start)))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+"""Compares bytes per Review with and without compact models.
+
+Usage: python3 -m benchmarks.model_memory [objects]
+"""
+import os
+import subprocess
+import sys
+import tracemalloc
+
+
+def measure(objects):
+    """Returns the bytes allocated per Review loaded from a record, and
+    once to_dict() and str() have run on each."""
+    from models.review import Review
+    record = {"id": "", "created_at": "2024-02-11T12:34:56.000001",
+              "updated_at": "2024-02-11T12:45:00.000001",
+              "place_id": "1b9f2f3c-2b46-4bd2-a53c-c0d1c7fbd0e2",
+              "user_id": "5d2c4f20-79e1-4d7a-8a4f-0a3e1c6f9a51",
+              "text": "Great place", "__class__": "Review"}
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    reviews = [Review(**dict(record, id=str(i))) for i in range(objects)]
+    loaded = tracemalloc.get_traced_memory()[0] - before
+    for review in reviews:
+        review.to_dict()
+        str(review)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return loaded / len(reviews), used / len(reviews)
+
+
+def main(objects=100000):
+    """Runs measure() in a child process for each mode and prints it."""
+    if os.getenv("HBNB_BENCH_CHILD"):
+        print(*measure(objects))
+        return
+    print("{} Reviews, bytes/object".format(objects))
+    print("{:<10}{:>10}{:>10}".format("", "loaded", "used"))
+    for compact in ("0", "1"):
+        env = dict(os.environ, HBNB_BENCH_CHILD="1",
+                   HBNB_COMPACT_MODELS=compact)
+        out = subprocess.run([sys.executable, "-m", __spec__.name,
+                              str(objects)], env=env, check=True,
+                             capture_output=True, text=True).stdout
+        print("{:<10}{:>10.0f}{:>10.0f}".format(
+            "compact" if compact == "1" else "default",
+            *(float(n) for n in out.split())))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
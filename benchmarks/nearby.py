@@ -0,0 +1,59 @@
+#!/usr/bin/python3
+"""Compares find_near() with a scan of all() as the places grow.
+
+Usage: python3 -m benchmarks.nearby [places] [k] [km]
+"""
+import heapq
+import os
+import random
+import sys
+import tempfile
+import time
+from models.engine.file_storage import FileStorage
+from models.engine.indexes import distance_km
+from models.place import Place
+
+
+def rate(run, rand):
+    """Returns the calls/sec of run at random points, for 1 second."""
+    calls = 0
+    start = time.perf_counter()
+    while calls == 0 or time.perf_counter() - start < 1:
+        run(rand.uniform(-60, 70), rand.uniform(-180, 180))
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def main(places=1000000, k=10, km=25):
+    """Prints the queries/sec of each method at 1%, 10% and all places."""
+    os.chdir(tempfile.mkdtemp())
+    FileStorage._FileStorage__objects = {}
+    storage = FileStorage()
+    rand = random.Random(0)
+    print("{:>10}{:>12}{:>12}{:>12}".format(
+        "places", "scan", "nearest", "radius"))
+    stored = 0
+    for size in (places // 100, places // 10, places):
+        storage.bulk_new(({"latitude": rand.uniform(-60, 70),
+                           "longitude": rand.uniform(-180, 180)}
+                          for i in range(size - stored)), cls=Place)
+        stored = size
+        storage.find_near(Place, 0, 0, limit=1)
+
+        def scan(latitude, longitude):
+            return heapq.nsmallest(k, storage.all(Place).values(),
+                                   key=lambda place: distance_km(
+                                       latitude, longitude,
+                                       place.latitude, place.longitude))
+
+        print("{:>10}{:>12.1f}{:>12.0f}{:>12.0f}".format(
+            size, rate(scan, rand),
+            rate(lambda latitude, longitude: storage.find_near(
+                Place, latitude, longitude, limit=k), rand),
+            rate(lambda latitude, longitude: storage.find_near(
+                Place, latitude, longitude, km=km), rand)))
+    print("queries/sec; nearest: {} places, radius: {} km".format(k, km))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+"""Compares find_range() on a sorted index with a scan of all().
+
+Usage: python3 -m benchmarks.range_query [places] [width]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from models.engine.file_storage import FileStorage
+from models.place import Place
+
+
+def main(places=1000000, width=100):
+    """Prints the queries/sec of a scan and of find_range()."""
+    os.chdir(tempfile.mkdtemp())
+    FileStorage._FileStorage__objects = {}
+    storage = FileStorage()
+    rand = random.Random(0)
+    storage.bulk_new(({"price_by_night": rand.randrange(100000)}
+                      for i in range(places)), cls=Place)
+    print("{} places, prices in windows of {} out of 100000".format(
+        places, width))
+    print("{:<10}{:>14}".format("method", "queries/sec"))
+
+    def scan(lo, hi):
+        found = [place for place in storage.all(Place).values()
+                 if lo <= place.price_by_night <= hi]
+        return sorted(found, key=lambda place: place.price_by_night)
+
+    runs = (("scan", scan),
+            ("index", lambda lo, hi: storage.find_range(
+                Place, "price_by_night", lo, hi)),
+            ("top-10", lambda lo, hi: storage.find_range(
+                Place, "price_by_night", hi=hi, reverse=True, limit=10)))
+    storage.find_range(Place, "price_by_night", 0, 0)
+    for name, run in runs:
+        queries = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < 1:
+            lo = rand.randrange(100000 - width)
+            run(lo, lo + width)
+            queries += 1
+        print("{:<10}{:>14.0f}".format(
+            name, queries / (time.perf_counter() - start)))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+"""Times rendering one state page (cities, places, reviews) as the
+store grows, by scanning all(), through relations and with prefetch().
+
+Usage: python3 -m benchmarks.relations [states]
+"""
+import os
+import sys
+import tempfile
+import time
+from models.city import City
+from models.engine.file_storage import FileStorage
+from models.place import Place
+from models.review import Review
+from models.state import State
+
+
+def scan(storage, state):
+    """Returns the reviews of a state's places, filtering all()."""
+    cities = {city.id for city in storage.all(City).values()
+              if city.state_id == state.id}
+    places = {place.id for place in storage.all(Place).values()
+              if place.city_id in cities}
+    return [review for review in storage.all(Review).values()
+            if review.place_id in places]
+
+
+def relations(storage, state):
+    """Returns the reviews of a state's places, through relations."""
+    return [review for city in state.cities for place in city.places
+            for review in place.reviews]
+
+
+def prefetch(storage, state):
+    """Returns the reviews of a state's places, a level at a time."""
+    places = [place for found in City.places.prefetch(state.cities).values()
+              for place in found]
+    return [review for found in Place.reviews.prefetch(places).values()
+            for review in found]
+
+
+def main(states=1000):
+    """Prints the ms per page of each method at growing store sizes."""
+    os.chdir(tempfile.mkdtemp())
+    FileStorage._FileStorage__objects = {}
+    storage = FileStorage()
+    print("each state: 10 cities, 5 places per city, 4 reviews per place")
+    print("{:>8}{:>10}{:>12}{:>12}{:>12}".format(
+        "states", "objects", "scan ms", "relation ms", "prefetch ms"))
+    stored = []
+    for size in (states // 100, states // 10, states):
+        while len(stored) < size:
+            state = storage.bulk_new([{}], cls=State)[0]
+            cities = storage.bulk_new([{"state_id": state.id}] * 10,
+                                      cls=City)
+            places = storage.bulk_new([{"city_id": city.id}
+                                       for city in cities for i in range(5)],
+                                      cls=Place)
+            storage.bulk_new([{"place_id": place.id}
+                              for place in places for i in range(4)],
+                             cls=Review)
+            stored.append(state)
+        times = []
+        for run in (scan, relations, prefetch):
+            start = time.perf_counter()
+            for state in stored[:10]:
+                assert len(run(storage, state)) == 200
+            times.append((time.perf_counter() - start) * 100)
+        print("{:>8}{:>10}{:>12.2f}{:>12.2f}{:>12.2f}".format(
+            size, storage.count(), *times))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+"""Measures FileStorage saves per second under each fsync policy.
+
+Usage: python3 -m benchmarks.save_fsync [objects] [saves]
+"""
+import os
+import sys
+import tempfile
+import time
+from models.engine.file_storage import FileStorage
+from models.user import User
+
+
+def run(storage, users, saves):
+    """Updates one user and saves, saves times; returns saves/sec."""
+    start = time.perf_counter()
+    for i in range(saves):
+        users[i % len(users)].first_name = "user{}".format(i)
+        storage.save()
+    return saves / (time.perf_counter() - start)
+
+
+def main(objects=1000, saves=200):
+    """Prints a saves/sec table for every mode and fsync policy."""
+    os.chdir(tempfile.mkdtemp())
+    FileStorage._FileStorage__objects = {}
+    users = [User() for i in range(objects)]
+    print("{} objects, {} saves per run".format(objects, saves))
+    print("{:<10}{:<10}{:>12}".format("mode", "fsync", "saves/sec"))
+    for journal in (False, True):
+        for fsync in ("always", "batched", "never"):
+            storage = FileStorage(journal=journal, fsync=fsync,
+                                  fsync_interval=100)
+            storage.checkpoint()
+            rate = run(storage, users, saves)
+            print("{:<10}{:<10}{:>12.0f}".format(
+                "journal" if journal else "snapshot", fsync, rate))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
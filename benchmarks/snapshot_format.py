@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+"""Compares save time, load time and size of JSON and binary snapshots.
+
+Usage: python3 -m benchmarks.snapshot_format [objects]
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+from models.engine.file_storage import FileStorage
+from models.place import Place
+
+
+def main(objects=100000):
+    """Prints one row per snapshot format."""
+    os.chdir(tempfile.mkdtemp())
+    FileStorage._FileStorage__objects = {}
+    for i in range(objects):
+        place = Place()
+        place.name = "Place {}".format(i)
+        place.city_id = place.id
+        place.price_by_night = i % 500
+        place.latitude = 37.77
+        place.amenity_ids = ["wifi", "tv"]
+    print("{} Places".format(objects))
+    print("{:<8}{:>10}{:>10}{:>10}{:>12}".format(
+        "format", "save s", "load s", "lazy s", "size KiB"))
+    for fmt, path in (("json", "file.json"), ("binary", "file.bin")):
+        storage = FileStorage(format=fmt)
+        FileStorage._FileStorage__fragments.clear()
+        FileStorage._FileStorage__bodies.clear()
+        gc.collect()
+        start = time.perf_counter()
+        storage.checkpoint()
+        saved = time.perf_counter() - start
+        objs = FileStorage._FileStorage__objects
+        FileStorage._FileStorage__objects = {}
+        gc.collect()
+        start = time.perf_counter()
+        storage.reload()
+        loaded = time.perf_counter() - start
+        FileStorage._FileStorage__objects = {}
+        gc.collect()
+        start = time.perf_counter()
+        FileStorage(format=fmt, lazy=True).reload()
+        lazy = time.perf_counter() - start
+        FileStorage._FileStorage__objects = objs
+        FileStorage._FileStorage__changed.clear()
+        print("{:<8}{:>10.3f}{:>10.3f}{:>10.3f}{:>12.0f}".format(
+            fmt, saved, loaded, lazy, os.path.getsize(path) / 1024))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+"""Measures the memory and query speed of the Review text index.
+
+Usage: python3 -m benchmarks.text_search [reviews] [words] [limit]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from models.engine.file_storage import FileStorage
+from models.engine.indexes import TextIndex
+from models.review import Review
+
+
+def rate(run, queries):
+    """Returns the calls/sec of run over queries, for 1 second."""
+    calls = 0
+    start = time.perf_counter()
+    while calls == 0 or time.perf_counter() - start < 1:
+        run(queries[calls % len(queries)])
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def main(reviews=100000, words=20000, limit=10):
+    """Prints the index size and the queries/sec of a scan and search()."""
+    os.chdir(tempfile.mkdtemp())
+    FileStorage._FileStorage__objects = {}
+    storage = FileStorage()
+    rand = random.Random(0)
+    vocabulary = ["w{}".format(i) for i in range(words)]
+    weights = [1 / (i + 1) for i in range(words)]
+    storage.bulk_new(({"text": " ".join(rand.choices(vocabulary, weights,
+                                                     k=30))}
+                      for i in range(reviews)), cls=Review)
+    start = time.perf_counter()
+    storage.search(Review, "w0", limit=1)
+    built = time.perf_counter() - start
+    tracemalloc.start()
+    index = TextIndex(Review._text)
+    index.rebuild(storage.all(Review))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del index
+    print("{} reviews of 30 words out of {}".format(reviews, words))
+    print("index built in {:.1f} s, {:.1f} MB ({:.0f} bytes/review)".format(
+        built, size / 2 ** 20, size / reviews))
+
+    def scan(query):
+        terms = query.split()
+        return [review for review in storage.all(Review).values()
+                if all(term in review.text.split() for term in terms)]
+
+    def search(query):
+        return storage.search(Review, query, limit=limit)
+
+    def search_any(query):
+        return storage.search(Review, query, any=True, limit=limit)
+
+    common = vocabulary[:10]
+    rare = vocabulary[-1000:]
+    pairs = ["{} {}".format(c, r) for c in common for r in rare[:100]]
+    runs = (("scan, 1 rare word", scan, rare),
+            ("1 common word", search, common),
+            ("1 rare word", search, rare),
+            ("2 words, AND", search, pairs),
+            ("2 words, OR", search_any, pairs))
+    print("{:<20}{:>14}  (top {})".format("query", "queries/sec", limit))
+    for name, run, queries in runs:
+        print("{:<20}{:>14.1f}".format(name, rate(run, queries)))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -2,15 +2,11 @@
 """Console module"""
 import re
 import cmd
+import math
 import models
 import shlex
-from models.user import User
-from models.base_model import BaseModel
-from models.state import State
-from models.city import City
-from models.amenity import Amenity
-from models.place import Place
-from models.review import Review
+from models.base_model import classes
+from models.engine.indexes import list_items
 
 
 def my_strip(args):
@@ -42,10 +38,12 @@ class HBNBCommand(cmd.Cmd):
        HBNBCommand class
     """
     prompt = '(hbnb) '
-    __cnames = [
-        "BaseModel", "User",
-        "State", "City", "Amenity",
-        "Place", "Review"]
+    __cnames = classes
+
+    def precmd(self, line):
+        """reload the storage if another process saved meanwhile"""
+        models.storage.refresh()
+        return line
 
     def default(self, line):
         """executed when unrecognized line"""
@@ -53,9 +51,7 @@ class HBNBCommand(cmd.Cmd):
         if len(args) == 2 and args[1] == "all()":
             self.do_all(args[0])
         elif len(args) == 2 and args[1] == "count()":
-            x = len([k for k in models.storage.all().keys()
-                     if k.split('.')[0] == args[0]])
-            print(x)
+            print(models.storage.count(args[0]))
         elif len(args) > 1:
             new_args = my_strip(line)
             if new_args[1] == "show":
@@ -72,10 +68,12 @@ class HBNBCommand(cmd.Cmd):
 
     def do_EOF(self, line):
         """exit the program"""
+        models.storage.flush()
         return True
 
     def do_quit(self, line):
         """Quit command to exit the program"""
+        models.storage.flush()
         return True
 
     def help_quit(self):
@@ -91,7 +89,7 @@ class HBNBCommand(cmd.Cmd):
         elif line not in self.__cnames:
             print("** class doesn't exist **")
         else:
-            obj = eval(line)()
+            obj = classes[line]()
             models.storage.save()
             print(obj.id)
 
@@ -104,10 +102,10 @@ class HBNBCommand(cmd.Cmd):
             print("** class doesn't exist **")
         elif len(result) == 1:
             print("** instance id missing **")
-        elif f"{result[0]}.{result[1]}" not in models.storage.all():
+        elif models.storage.get(result[0], result[1]) is None:
             print("** no instance found **")
         else:
-            print(models.storage.all()[f"{result[0]}.{result[1]}"])
+            print(models.storage.get(result[0], result[1]))
 
     def do_destroy(self, line):
         """Destroy the given object"""
@@ -118,10 +116,10 @@ class HBNBCommand(cmd.Cmd):
             print("** class doesn't exist **")
         elif len(result) == 1:
             print("** instance id missing **")
-        elif f"{result[0]}.{result[1]}" not in models.storage.all():
+        elif models.storage.get(result[0], result[1]) is None:
             print("** no instance found **")
         else:
-            del models.storage.all()[f"{result[0]}.{result[1]}"]
+            models.storage.delete(models.storage.get(result[0], result[1]))
             models.storage.save()
 
     def do_all(self, line):
@@ -131,9 +129,8 @@ class HBNBCommand(cmd.Cmd):
             print("** class doesn't exist **")
             return
         elif line:
-            for k, obj in models.storage.all().items():
-                if line == k.split('.')[0]:
-                    result_list.append(str(obj))
+            for k, obj in models.storage.all(line).items():
+                result_list.append(str(obj))
         else:
             for k, obj in models.storage.all().items():
                 result_list.append(str(obj))
@@ -148,23 +145,87 @@ class HBNBCommand(cmd.Cmd):
             print("** class doesn't exist **")
         elif len(result) == 1:
             print("** instance id missing **")
-        elif (len(result) > 1 and f"{result[0]}.{result[1]}"
-              not in models.storage.all()):
+        elif models.storage.get(result[0], result[1]) is None:
             print("** no instance found **")
         elif len(result) == 2:
             print("** attribute name missing **")
         elif len(result) == 3:
             print("** value missing **")
         else:
-            obj = models.storage.all()[f"{result[0]}.{result[1]}"]
-            if is_numeric(result[3]):
+            obj = models.storage.get(result[0], result[1])
+            value = line.split(None, 3)[3]
+            if value.startswith("[") and \
+                    self.__list_field(classes[result[0]], result[2]):
+                setattr(obj, result[2], list(list_items(value)))
+            elif is_numeric(result[3]):
                 new_value = get_numeric_value(result[3])
                 setattr(obj, result[2], new_value)
             else:
                 setattr(obj, result[2], result[3])
-            models.storage.all()[f"{result[0]}.{result[1]}"] = obj
             models.storage.save()
 
+    @staticmethod
+    def __list_field(cls, name):
+        """Returns True if the attribute name of cls holds a list, as
+        declared in _lists or by a list default."""
+        default = getattr(cls, "_defaults", {}).get(name,
+                                                    getattr(cls, name, None))
+        return name in getattr(cls, "_lists", ()) or isinstance(default, list)
+
+    def do_within(self, line):
+        """Prints the instances inside a box:
+        within <class> <south> <west> <north> <east>"""
+        args = self.__geo_args(line, 4)
+        if args:
+            print([str(obj) for obj in models.storage.find_within(*args)])
+
+    def do_near(self, line):
+        """Prints the instances within a radius, nearest first:
+        near <class> <latitude> <longitude> <km>"""
+        args = self.__geo_args(line, 3)
+        if args:
+            print([str(obj) for obj in models.storage.find_near(*args)])
+
+    def do_nearest(self, line):
+        """Prints the k nearest instances, nearest first:
+        nearest <class> <latitude> <longitude> <k>"""
+        args = self.__geo_args(line, 3)
+        if args:
+            cls, latitude, longitude, k = args
+            print([str(obj) for obj in models.storage.find_near(
+                cls, latitude, longitude, limit=max(int(k), 0))])
+
+    def do_search(self, line):
+        """Prints the instances holding all the words, best match first:
+        search <class> <words>  (words joined by OR match any of them)"""
+        result = line.split()
+        if not result:
+            print("** class name missing **")
+        elif result[0] not in self.__cnames:
+            print("** class doesn't exist **")
+        elif len(result) == 1:
+            print("** words missing **")
+        else:
+            words = [word for word in result[1:] if word != "OR"]
+            found = models.storage.search(result[0], " ".join(words),
+                                          any="OR" in result[1:])
+            print([str(obj) for obj in found])
+
+    def __geo_args(self, line, count):
+        """Returns the class name and count numbers of line, or None"""
+        result = line.split()
+        if not result:
+            print("** class name missing **")
+        elif result[0] not in self.__cnames:
+            print("** class doesn't exist **")
+        elif len(result) != count + 1:
+            print("** {} numbers expected **".format(count))
+        elif not all(is_numeric(arg) and math.isfinite(float(arg))
+                     for arg in result[1:]):
+            print("** invalid number **")
+        else:
+            return [result[0]] + [float(arg) for arg in result[1:]]
+
 
 if __name__ == '__main__':
     HBNBCommand().cmdloop()
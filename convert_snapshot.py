@@ -0,0 +1,36 @@
+#!/usr/bin/python3
+"""Converts FileStorage snapshots between the JSON and binary formats.
+
+binary_format is loaded from its file rather than through the models
+package, whose import would reload the store of the current directory.
+
+Usage: ./convert_snapshot.py to-binary|to-json SRC DST
+"""
+import importlib.util
+import os
+import sys
+
+
+def load_binary_format():
+    """Returns the models/engine/binary_format module."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "models", "engine", "binary_format.py")
+    spec = importlib.util.spec_from_file_location("binary_format", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main(argv):
+    """Runs the conversion asked for by argv."""
+    if len(argv) != 4 or argv[1] not in ("to-binary", "to-json"):
+        sys.exit(__doc__.strip().splitlines()[-1])
+    binary_format = load_binary_format()
+    if argv[1] == "to-binary":
+        binary_format.json_to_binary(argv[2], argv[3])
+    else:
+        binary_format.binary_to_json(argv[2], argv[3])
+
+
+if __name__ == "__main__":
+    main(sys.argv)
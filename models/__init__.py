@@ -1,7 +1,27 @@
 #!/usr/bin/python3
-"""Create a unique FileStorage instance."""
-from models.engine.file_storage import FileStorage
+"""Create a unique storage instance of the engine HBNB_TYPE_STORAGE."""
+from os import getenv
+# every model registers itself in classes, which the engines read
+from models import amenity, city, place, review, state, user  # noqa: F401
 
-
-storage = FileStorage()
+storage_type = getenv("HBNB_TYPE_STORAGE", "file")
+if storage_type == "sqlite":
+    from models.engine.sqlite_storage import SQLiteStorage
+    storage = SQLiteStorage(getenv("HBNB_SQLITE_PATH", "hbnb.db"))
+elif storage_type == "file":
+    from models.engine.file_storage import FileStorage
+    storage = FileStorage(
+        journal=getenv("HBNB_STORAGE_JOURNAL") == "1",
+        commit_delay=float(getenv("HBNB_STORAGE_COMMIT_DELAY", 0)),
+        fsync=getenv("HBNB_STORAGE_FSYNC", "never"),
+        fsync_interval=int(getenv("HBNB_STORAGE_FSYNC_INTERVAL", 1000)),
+        sharded=getenv("HBNB_STORAGE_SHARDED") == "1",
+        lazy=getenv("HBNB_STORAGE_LAZY") == "1",
+        format=getenv("HBNB_STORAGE_FORMAT", "json"),
+        mmap=getenv("HBNB_STORAGE_MMAP") == "1",
+        compact_log_size=int(getenv("HBNB_STORAGE_COMPACT_LOG_SIZE",
+                                    16 * 2 ** 20)),
+        compact_ratio=float(getenv("HBNB_STORAGE_COMPACT_RATIO", 0.5)))
+else:
+    raise ValueError("HBNB_TYPE_STORAGE must be file or sqlite")
 storage.reload()
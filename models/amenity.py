@@ -2,6 +2,7 @@
 """Amenity class"""
 
 from models.base_model import BaseModel
+from models.relation import Relation
 
 
 class Amenity(BaseModel):
@@ -12,3 +13,4 @@ class Amenity(BaseModel):
         name (str): Empty string.
     """
     name = ""
+    places = Relation("Place", by="amenity_ids")
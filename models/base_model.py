@@ -1,12 +1,58 @@
 #!/usr/bin/python3
 """Defines base class"""
 from datetime import datetime
+from os import getenv
 import models
 import uuid
 
+classes = {}
+"""Every model class by name, filled in as the classes are defined."""
 
-class BaseModel:
-    """Define the BaseModel class."""
+COMPACT = getenv("HBNB_COMPACT_MODELS") == "1"
+"""Store declared fields in __slots__ instead of the instance __dict__."""
+
+
+class ModelMeta(type):
+    """Metaclass of the models.
+
+    In compact mode the public class attributes of a model (its declared
+    fields) become __slots__, so instances keep them in fixed slots
+    rather than a per-instance dict.  The declared defaults are moved to
+    _defaults and returned by BaseModel.__getattr__ until a field is set.
+    Instances have no __dict__: attributes that aren't declared go to a
+    dict in the _extra slot, created when the first one is set.
+    """
+
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        """Create a model class, laying out its fields as slots."""
+        if COMPACT:
+            fields = {k: v for k, v in namespace.items()
+                      if not k.startswith("_") and not callable(v) and
+                      not hasattr(type(v), "__get__")}
+            for k in fields:
+                del namespace[k]
+            namespace["__slots__"] = (tuple(namespace.get("__slots__", ())) +
+                                      tuple(fields))
+            namespace["_defaults"] = fields
+        return super().__new__(mcs, name, bases, namespace, **kwargs)
+
+
+class BaseModel(metaclass=ModelMeta):
+    """Define the BaseModel class.
+
+    A model may list attribute names in _indexes to have the storage
+    keep an index on them for storage.find(), and reach related objects
+    through Relation attributes.
+    """
+    if COMPACT:
+        # _extra holds the attributes that aren't declared fields, and
+        # stays None (no dict at all) until one is set
+        __slots__ = ("id", "created_at", "updated_at", "_extra")
+
+    def __init_subclass__(cls, **kwargs):
+        """Register a new model class in classes."""
+        super().__init_subclass__(**kwargs)
+        classes[cls.__name__] = cls
 
     def __init__(self, *args, **kwargs):
         """Initialize a new instance of BaseModel.
@@ -20,7 +66,8 @@ class BaseModel:
         """
         if kwargs:
             for k, v in kwargs.items():
-                if k == "created_at" or k == "updated_at":
+                if ((k == "created_at" or k == "updated_at") and
+                        isinstance(v, str)):
                     v = datetime.fromisoformat(v)
                     self.__setattr__(k, v)
                 elif k != "__class__":
@@ -31,20 +78,107 @@ class BaseModel:
             self.updated_at = datetime.now()
             models.storage.new(self)
 
+    def __setattr__(self, name, value):
+        """Set an attribute and flag the instance as changed in storage."""
+        models.storage.remember(self)
+        self.__store(name, value)
+        models.storage.touch(self)
+
+    def __store(self, name, value):
+        """Set an attribute, in _extra if the instance has no slot for it."""
+        try:
+            object.__setattr__(self, name, value)
+        except AttributeError:
+            if self._extra is None:
+                object.__setattr__(self, "_extra", {})
+            self._extra[name] = value
+
+    def __getattr__(self, name):
+        """Return an attribute kept in _extra, or the default of a declared
+        field that was never set."""
+        if name == "_extra":
+            return None
+        if self._extra is not None and name in self._extra:
+            return self._extra[name]
+        for cls in type(self).__mro__:
+            defaults = cls.__dict__.get("_defaults", {})
+            if name in defaults:
+                return defaults[name]
+        raise AttributeError("'{}' object has no attribute '{}'".format(
+            type(self).__name__, name))
+
+    def __fields(self):
+        """Return the instance attributes, slots included, as a dict."""
+        if not COMPACT:
+            return self.__dict__
+        fields = {}
+        for cls in reversed(type(self).__mro__):
+            for name in cls.__dict__.get("__slots__", ()):
+                if name in ("_extra", "__dict__", "__weakref__"):
+                    continue
+                try:
+                    fields[name] = cls.__dict__[name].__get__(self, cls)
+                except AttributeError:
+                    pass
+        if self._extra:
+            fields.update(self._extra)
+        if type(self).__dictoffset__:
+            # a compact model derived from a class with a __dict__
+            fields.update(self.__dict__)
+        return fields
+
     def __str__(self):
         """Return a string representation of the instance."""
         return "[{}] ({}) {}".format(type(self).__name__,
-                                     self.id, self.__dict__)
+                                     self.id, self.__fields())
 
     def save(self):
         """Update the updated_at attribute and save the instance to storage."""
         self.updated_at = datetime.now()
         models.storage.save()
 
+    def restore(self, record):
+        """Put the instance back in the state of record, a to_dict() of it.
+
+        The attributes are set in place without flagging the instance as
+        changed, for the storage to roll back a transaction.
+        """
+        fields = from_dict(record, type(self)).__fields()
+        for name in set(self.__fields()) - set(fields):
+            if self._extra is not None and name in self._extra:
+                del self._extra[name]
+            else:
+                object.__delattr__(self, name)
+        for name, value in fields.items():
+            self.__store(name, value)
+
     def to_dict(self):
         """Return a dictionary representation of the instance."""
-        c_dict = self.__dict__.copy()
+        c_dict = self.__fields().copy()
         c_dict["__class__"] = str(type(self).__name__)
         c_dict["created_at"] = self.created_at.isoformat()
         c_dict["updated_at"] = self.updated_at.isoformat()
         return c_dict
+
+
+classes["BaseModel"] = BaseModel
+
+
+def from_dict(record, cls=None):
+    """Return a model instance built from a to_dict() style record.
+
+    The class is cls (a class or class name) or the record's __class__.
+    A missing id, created_at or updated_at is filled in as for a new
+    instance; the instance is not added to the storage.
+    """
+    if cls is None:
+        cls = record["__class__"]
+    if isinstance(cls, str):
+        cls = classes[cls]
+    record = dict(record)
+    if "id" not in record:
+        record["id"] = str(uuid.uuid4())
+    now = datetime.now()
+    record.setdefault("created_at", now)
+    record.setdefault("updated_at", now)
+    return cls(**record)
@@ -2,6 +2,7 @@
 """City class"""
 
 from models.base_model import BaseModel
+from models.relation import Relation
 
 
 class City(BaseModel):
@@ -14,3 +15,6 @@ class City(BaseModel):
     """
     state_id = ""
     name = ""
+    _indexes = ("state_id",)
+    state = Relation("State", on="state_id")
+    places = Relation("Place", by="city_id")
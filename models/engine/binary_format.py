@@ -0,0 +1,268 @@
+#!/usr/bin/python3
+"""Compact binary layout for FileStorage snapshots.
+
+A file starts with MAGIC and is followed by length-prefixed records:
+a 4-byte little-endian length, a 1-byte tag and a body of that length.
+Tag 0 defines a class tag (body: the tag byte, then the class name) and
+any other tag is an object of the class it was defined for.  An object
+body holds created_at and updated_at as signed 64-bit microseconds since
+1970-01-01, the length-prefixed id, and every other attribute as JSON.
+
+An indexed file ends with an INDEX record (the class tags, then entries
+of key hash, body offset and body length sorted by hash) and a trailer
+with the offset of that record, so MappedSnapshot can find one object
+with a binary search over the memory-mapped file.
+
+convert_snapshot.py at the root of the repository converts snapshots
+between the JSON and binary formats.
+"""
+import hashlib
+import json
+import mmap
+import struct
+from datetime import datetime, timedelta
+
+MAGIC = b"HBNB\x01"
+INDEX = 255
+INDEX_MAGIC = b"HBIX"
+EPOCH = datetime(1970, 1, 1)
+NO_TIME = -2 ** 63
+_header = struct.Struct("<IB")
+_times = struct.Struct("<qqH")
+_count = struct.Struct("<I")
+_entry = struct.Struct("<QQI")
+_hash = struct.Struct("<Q")
+_trailer = struct.Struct("<Q4s")
+_microsecond = timedelta(microseconds=1)
+_json = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def _micros(value):
+    """Return a naive datetime, or its ISO string, as microseconds."""
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return NO_TIME
+        if parsed.isoformat() != value:
+            return NO_TIME
+        value = parsed
+    if not isinstance(value, datetime) or value.tzinfo is not None:
+        return NO_TIME
+    return (value - EPOCH) // _microsecond
+
+
+def encode(record):
+    """Return the binary body of a to_dict() style record.
+
+    Values that can't be stored natively (aware datetimes, a non-string
+    id) are kept in the JSON part, so the conversion is lossless.
+    """
+    extra = dict(record)
+    extra.pop("__class__", None)
+    created = _micros(extra.get("created_at"))
+    if created != NO_TIME:
+        del extra["created_at"]
+    updated = _micros(extra.get("updated_at"))
+    if updated != NO_TIME:
+        del extra["updated_at"]
+    obj_id = extra.get("id")
+    if isinstance(obj_id, str):
+        del extra["id"]
+        obj_id = obj_id.encode("utf-8")
+    else:
+        obj_id = b""
+    return (_times.pack(created, updated, len(obj_id)) + obj_id +
+            _json(extra).encode("utf-8"))
+
+
+def decode(class_name, body):
+    """Return the record of an object body, datetimes as datetime."""
+    created, updated, id_len = _times.unpack_from(body)
+    start = _times.size
+    record = {}
+    if id_len:
+        record["id"] = body[start:start + id_len].decode("utf-8")
+    if created != NO_TIME:
+        record["created_at"] = EPOCH + created * _microsecond
+    if updated != NO_TIME:
+        record["updated_at"] = EPOCH + updated * _microsecond
+    record.update(json.loads(body[start + id_len:]))
+    record["__class__"] = class_name
+    return record
+
+
+def record_id(class_name, body):
+    """Return the id of an object body without decoding the rest."""
+    id_len = _times.unpack_from(body)[2]
+    if id_len:
+        return body[_times.size:_times.size + id_len].decode("utf-8")
+    return decode(class_name, body).get("id")
+
+
+def key_hash(key):
+    """Return the 64-bit hash of a storage key used by the index."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return _hash.unpack(digest)[0]
+
+
+def write(f, items, index=True):
+    """Write MAGIC and the (class name, body) items to the binary file f.
+
+    With index, the INDEX record and the trailer are written last.
+    """
+    f.write(MAGIC)
+    offset = len(MAGIC)
+    tags = {}
+    entries = []
+    for class_name, body in items:
+        tag = tags.get(class_name)
+        if tag is None:
+            if len(tags) == INDEX - 1:
+                raise ValueError("too many classes for a binary snapshot")
+            tag = tags[class_name] = len(tags) + 1
+            name = class_name.encode("utf-8")
+            f.write(_header.pack(len(name) + 1, 0) + bytes((tag,)) + name)
+            offset += _header.size + len(name) + 1
+        f.write(_header.pack(len(body), tag))
+        f.write(body)
+        offset += _header.size
+        if index:
+            key = "{}.{}".format(class_name, record_id(class_name, body))
+            entries.append((key_hash(key), offset, len(body)))
+        offset += len(body)
+    if index:
+        entries.sort()
+        table = [bytes((len(tags),))]
+        for class_name, tag in tags.items():
+            name = class_name.encode("utf-8")
+            table.append(bytes((tag, len(name))) + name)
+        table.append(_count.pack(len(entries)))
+        table.extend(_entry.pack(*entry) for entry in entries)
+        body = b"".join(table)
+        f.write(_header.pack(len(body), INDEX))
+        f.write(body)
+        f.write(_trailer.pack(offset, INDEX_MAGIC))
+
+
+def read(f):
+    """Yield the (class name, body) items of the binary file f."""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a binary snapshot")
+    names = {}
+    while True:
+        header = f.read(_header.size)
+        if len(header) < _header.size:
+            return
+        size, tag = _header.unpack(header)
+        if tag == INDEX:
+            return
+        body = f.read(size)
+        if tag == 0:
+            names[body[0]] = body[1:].decode("utf-8")
+        else:
+            yield names[tag], body
+
+
+class MappedSnapshot:
+    """Reads single objects of an indexed binary snapshot through mmap.
+
+    Only the index header is read when the snapshot is opened; get()
+    binary-searches the sorted index entries in the mapped file and
+    returns the body of one object without touching the others.
+    """
+
+    def __init__(self, path):
+        """Map the indexed binary snapshot at path.
+
+        Raises:
+            ValueError: if the file is not an indexed binary snapshot.
+        """
+        with open(path, "rb") as f:
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        m = self.__map
+        if (len(m) < len(MAGIC) + _trailer.size or
+                m[:len(MAGIC)] != MAGIC or m[-len(INDEX_MAGIC):] !=
+                INDEX_MAGIC):
+            m.close()
+            raise ValueError("not an indexed binary snapshot")
+        pos = _trailer.unpack_from(m, len(m) - _trailer.size)[0]
+        pos += _header.size
+        self.__names = {}
+        for i in range(m[pos]):
+            tag, size = m[pos + 1], m[pos + 2]
+            self.__names[tag] = m[pos + 3:pos + 3 + size].decode("utf-8")
+            pos += 2 + size
+        self.__count = _count.unpack_from(m, pos + 1)[0]
+        self.__entries = pos + 1 + _count.size
+
+    def __len__(self):
+        """Return the number of objects in the snapshot."""
+        return self.__count
+
+    def get(self, key):
+        """Return the (class name, body) of the object key, or None."""
+        m, start = self.__map, self.__entries
+        h = key_hash(key)
+        lo, hi = 0, self.__count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _hash.unpack_from(m, start + mid * _entry.size)[0] < h:
+                lo = mid + 1
+            else:
+                hi = mid
+        for i in range(lo, self.__count):
+            entry_hash, offset, size = _entry.unpack_from(
+                m, start + i * _entry.size)
+            if entry_hash != h:
+                break
+            class_name = self.__names[m[offset - 1]]
+            body = m[offset:offset + size]
+            if "{}.{}".format(class_name,
+                              record_id(class_name, body)) == key:
+                return class_name, body
+        return None
+
+    def __iter__(self):
+        """Yield the (class name, body) of every object in file order."""
+        m = self.__map
+        pos = len(MAGIC)
+        while True:
+            size, tag = _header.unpack_from(m, pos)
+            pos += _header.size
+            if tag == INDEX:
+                return
+            if tag != 0:
+                yield self.__names[tag], m[pos:pos + size]
+            pos += size
+
+    def close(self):
+        """Unmap the file."""
+        self.__map.close()
+
+
+def json_to_binary(src, dst):
+    """Convert the JSON snapshot at src to a binary snapshot at dst."""
+    with open(src, "r", encoding="utf-8") as f:
+        objects = json.load(f)
+    with open(dst, "wb") as f:
+        write(f, ((record["__class__"], encode(record))
+                  for record in objects.values()))
+
+
+def binary_to_json(src, dst):
+    """Convert the binary snapshot at src to a JSON snapshot at dst."""
+    with open(src, "rb") as f, open(dst, "w", encoding="utf-8") as out:
+        out.write("{")
+        separator = "\n"
+        for class_name, body in read(f):
+            record = decode(class_name, body)
+            for k in ("created_at", "updated_at"):
+                if isinstance(record.get(k), datetime):
+                    record[k] = record[k].isoformat()
+            out.write("{}{}: {}".format(
+                separator,
+                json.dumps("{}.{}".format(class_name, record.get("id"))),
+                json.dumps(record)))
+            separator = ",\n"
+        out.write("\n}\n")
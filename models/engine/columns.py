@@ -0,0 +1,263 @@
+#!/usr/bin/python3
+"""Defines the ColumnStore class and the aggregate() function."""
+import math
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FUNCTIONS = ("count", "sum", "mean", "min", "max")
+
+
+def number(value):
+    """Return value as a float, or None if it isn't a number."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool) \
+            and value == value:
+        return float(value)
+    return None
+
+
+def matches(value, condition):
+    """Return True if value meets a where condition.
+
+    A (low, high) tuple asks for a number within the bounds (inclusive,
+    None for no bound); anything else asks for an equal value.
+    """
+    if not isinstance(condition, tuple):
+        return not value != condition
+    low, high = condition
+    value = number(value)
+    return value is not None and (low is None or value >= low) and \
+        (high is None or value <= high)
+
+
+def covers(attrs, column, by=None, where=None):
+    """Return True if a ColumnStore of attrs can answer a query.
+
+    column must be one of its numeric columns, by one of its label
+    columns and the keys of where either.
+    """
+    numeric, labels = attrs
+    return column in numeric and (by is None or by in labels) and \
+        all(attr in numeric or attr in labels for attr in where or ())
+
+
+def aggregate(objs, column, func="mean", by=None, where=None):
+    """Aggregate the numeric attribute column of objs, one at a time.
+
+    Args:
+        objs: the objects to aggregate.
+        column (str): the attribute aggregated; objects where it isn't a
+            number are skipped.
+        func (str): one of count, sum, mean, min or max.
+        by (str): the attribute to group by, None for a single result.
+        where (dict): the conditions (see matches()) the objects must
+            meet, by attribute name.
+
+    Returns:
+        The result, or a dict of the results by value of by.  mean, min
+        and max of no values are None.
+    """
+    if func not in FUNCTIONS:
+        raise ValueError("unknown aggregate: {}".format(func))
+    where = where or {}
+    groups = {}
+    for obj in objs:
+        if not all(matches(getattr(obj, attr, None), condition)
+                   for attr, condition in where.items()):
+            continue
+        value = number(getattr(obj, column, None))
+        if value is None:
+            continue
+        try:
+            groups.setdefault(getattr(obj, by, None) if by else None,
+                              []).append(value)
+        except TypeError:
+            continue
+    if by is None:
+        return _reduce(func, groups.get(None, []))
+    return {key: _reduce(func, values) for key, values in groups.items()}
+
+
+def _reduce(func, values):
+    """Return func applied to the list of floats values."""
+    if func == "count":
+        return len(values)
+    if func == "sum":
+        return math.fsum(values)
+    if not values:
+        return None
+    if func == "mean":
+        return math.fsum(values) / len(values)
+    return min(values) if func == "min" else max(values)
+
+
+class ColumnStore:
+    """Mirrors attributes of the objects in NumPy arrays, for aggregate().
+
+    Each object gets a row (slot) in a float64 array per numeric column,
+    NaN where the attribute isn't a number, and in an int64 array of
+    codes per label column (e.g. city_id), the codes indexing the list
+    of distinct values seen.  Rows of discarded objects are reused, and
+    the arrays double when full.  aggregate() filters with boolean masks
+    and groups with bincount(), and gives the results of the aggregate()
+    function.  It follows the update(), discard() and rebuild() protocol
+    of HashIndex, and needs NumPy.
+    """
+
+    def __init__(self, attrs):
+        """Initialize a ColumnStore.
+
+        Args:
+            attrs (tuple): the names of the numeric columns and the
+                names of the label columns.
+        """
+        numeric, labels = attrs
+        self.__slots = {}
+        self.__free = []
+        self.__size = 0
+        self.__alive = np.zeros(0, dtype=bool)
+        self.__columns = {attr: np.zeros(0) for attr in numeric}
+        self.__codes = {attr: np.zeros(0, dtype=np.int64) for attr in labels}
+        self.__labels = {attr: [] for attr in labels}
+        self.__lookup = {attr: {} for attr in labels}
+
+    def __len__(self):
+        """Return the number of objects mirrored."""
+        return len(self.__slots)
+
+    def update(self, k, obj):
+        """Copy the columns of obj, stored as k, in its row."""
+        slot = self.__slots.get(k)
+        if slot is None:
+            slot = self.__free.pop() if self.__free else self.__append()
+            self.__slots[k] = slot
+            self.__alive[slot] = True
+        for attr, column in self.__columns.items():
+            value = number(getattr(obj, attr, None))
+            column[slot] = math.nan if value is None else value
+        for attr, codes in self.__codes.items():
+            codes[slot] = self.__code(attr, getattr(obj, attr, None))
+
+    def discard(self, k):
+        """Forget the object stored as k, freeing its row."""
+        slot = self.__slots.pop(k, None)
+        if slot is not None:
+            self.__alive[slot] = False
+            self.__free.append(slot)
+
+    def rebuild(self, objs):
+        """Mirror every object of the dict objs from scratch."""
+        self.__slots.clear()
+        self.__free = []
+        self.__size = 0
+        self.__resize(len(objs))
+        self.__alive[:] = False
+        for attr in self.__labels:
+            self.__labels[attr] = []
+            self.__lookup[attr] = {}
+        for k, obj in objs.items():
+            self.update(k, obj)
+
+    def aggregate(self, column, func="mean", by=None, where=None):
+        """Aggregate column like the aggregate() function, vectorized.
+
+        The store must cover the query (see covers()).
+        """
+        if func not in FUNCTIONS:
+            raise ValueError("unknown aggregate: {}".format(func))
+        n = self.__size
+        values = self.__columns[column][:n]
+        mask = self.__alive[:n] & ~np.isnan(values)
+        for attr, condition in (where or {}).items():
+            if attr in self.__columns:
+                mask &= self.__matching(self.__columns[attr][:n], condition)
+            else:
+                ok = np.array([matches(label, condition)
+                               for label in self.__labels[attr]] + [False])
+                mask &= ok[self.__codes[attr][:n]]
+        if by is None:
+            return self.__reduce(func, values[mask])
+        codes = self.__codes[by][:n]
+        mask &= codes >= 0
+        values, codes = values[mask], codes[mask]
+        labels = self.__labels[by]
+        counts = np.bincount(codes, minlength=len(labels))
+        if func == "count":
+            results = counts
+        elif func in ("sum", "mean"):
+            results = np.bincount(codes, weights=values,
+                                  minlength=len(labels))
+            if func == "mean":
+                results = results / np.maximum(counts, 1)
+        else:
+            results = np.full(len(labels), math.inf if func == "min"
+                              else -math.inf)
+            (np.minimum if func == "min" else np.maximum).at(
+                results, codes, values)
+        cast = int if func == "count" else float
+        return {labels[i]: cast(results[i]) for i in np.flatnonzero(counts)}
+
+    @staticmethod
+    def __matching(column, condition):
+        """Return the mask of the rows of column meeting condition."""
+        if not isinstance(condition, tuple):
+            value = number(condition)
+            if value is None:
+                return np.zeros(len(column), dtype=bool)
+            return column == value
+        low, high = condition
+        mask = ~np.isnan(column)
+        if low is not None:
+            mask &= column >= low
+        if high is not None:
+            mask &= column <= high
+        return mask
+
+    @staticmethod
+    def __reduce(func, values):
+        """Return func applied to the float array values."""
+        if func == "count":
+            return int(values.size)
+        if func == "sum":
+            return float(values.sum())
+        if not values.size:
+            return None
+        if func == "mean":
+            return float(values.mean())
+        return float(values.min() if func == "min" else values.max())
+
+    def __code(self, attr, value):
+        """Return the code of value in the label column attr, -1 if it
+        can't be hashed."""
+        lookup = self.__lookup[attr]
+        try:
+            code = lookup.get(value)
+        except TypeError:
+            return -1
+        if code is None:
+            code = lookup[value] = len(self.__labels[attr])
+            self.__labels[attr].append(value)
+        return code
+
+    def __append(self):
+        """Return a new row at the end, growing the arrays if full."""
+        if self.__size == len(self.__alive):
+            self.__resize(max(1024, 2 * self.__size))
+        self.__size += 1
+        return self.__size - 1
+
+    def __resize(self, capacity):
+        """Give every array room for capacity rows."""
+        size = self.__size
+
+        def grown(array, fill):
+            new = np.full(capacity, fill, dtype=array.dtype)
+            new[:size] = array[:size]
+            return new
+
+        self.__alive = grown(self.__alive, False)
+        for attr in self.__columns:
+            self.__columns[attr] = grown(self.__columns[attr], math.nan)
+        for attr in self.__codes:
+            self.__codes[attr] = grown(self.__codes[attr], -1)
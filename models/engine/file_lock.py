@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+"""Defines the FileLock class."""
+import threading
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class FileLock:
+    """An advisory lock on a file, held by a whole process at a time.
+
+    The first thread to acquire the lock takes an exclusive flock() on
+    the file; until the last one releases it, other threads of the same
+    process enter at once, so they must exclude each other by other
+    means.  The file also holds a generation counter that writers bump,
+    which lets other processes tell cheaply whether anything was saved
+    since they last read.  Without fcntl (e.g. on Windows) only the
+    counter is kept.
+    """
+
+    def __init__(self, path):
+        """Initialize a FileLock.
+
+        Args:
+            path (str): the path of the lock file.
+        """
+        self.__path = path
+        self.__mutex = threading.Lock()
+        self.__file = None
+        self.__holders = 0
+
+    def acquire(self):
+        """Take the lock, waiting for other processes to release it."""
+        with self.__mutex:
+            if not self.__holders:
+                f = open(self.__path, 'a+')
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                self.__file = f
+            self.__holders += 1
+
+    def release(self):
+        """Release the lock; the last holder of the process unlocks it."""
+        with self.__mutex:
+            self.__holders -= 1
+            if not self.__holders:
+                self.__file.close()
+                self.__file = None
+
+    def __enter__(self):
+        """Take the lock."""
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        """Release the lock."""
+        self.release()
+
+    def generation(self):
+        """Return the generation counter, 0 if nothing was ever saved."""
+        try:
+            with open(self.__path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def bump(self):
+        """Increment the generation counter and return it.
+
+        The lock must be held.
+        """
+        gen = self.generation() + 1
+        with open(self.__path, 'r+') as f:
+            f.write("{:020d}".format(gen))
+        return gen
@@ -1,42 +1,1339 @@
 #!/usr/bin/python3
 """Defines a new class called FileStorage."""
+import atexit
 import json
-from models.base_model import BaseModel
-from models.user import User
-from models.state import State
-from models.city import City
-from models.amenity import Amenity
-from models.place import Place
-from models.review import Review
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice, takewhile
+from models.base_model import classes, from_dict
+from models.engine import binary_format, columns
+from models.engine.columns import ColumnStore
+from models.engine.file_lock import FileLock
+from models.engine.indexes import (HashIndex, ListIndex, SortedIndex,
+                                   SpatialIndex, TextIndex)
+from models.engine.lazy_model import LazyModel
+from models.engine.rwlock import RWLock
+from models.engine.transaction import Transaction
 
 
 class FileStorage:
+    """Serializes instances to a JSON file and deserializes them back.
+
+    In journal mode save() only appends the objects created, updated or
+    deleted since the previous save to a log file, and reload() replays
+    that log on top of the last full snapshot.
+
+    The JSON text of every saved object is cached, so a save only
+    re-encodes the objects changed since the previous one.  Changes are
+    detected through new(), delete() and touch(), which BaseModel calls
+    whenever an attribute is set; mutating a value in place (e.g.
+    appending to a list attribute) must be followed by new(obj).
+
+    With a commit_delay, save() only schedules a write that a background
+    thread performs commit_delay seconds later, so every save requested
+    in that window is folded into one write.  flush() writes any
+    scheduled changes immediately and also runs at interpreter exit.
+
+    Snapshots are written to a temporary file that is renamed over the
+    JSON file, so a crash never leaves a truncated store behind.  The
+    fsync policy decides when written data is forced to disk: "always"
+    on every write, "batched" at most once every fsync_interval
+    milliseconds (a write that comes sooner is synced by a timer when
+    the interval is over), or "never" (left to the operating system).
+
+    The JSON file holds one object per line, so reload() can stream it
+    and build one instance at a time instead of decoding the whole
+    document at once; files written on a single line still load.
+
+    When sharded, each class is kept in its own file (file.<Class>.json)
+    that is only read the first time objects of that class are asked
+    for, and a save only rewrites the files of classes that changed.
+
+    Objects are also indexed by class name, so all(cls) and count(cls)
+    never look at the objects of other classes.  The attributes a model
+    lists in _indexes get a HashIndex, built on the first find() on
+    them and kept up to date by new(), touch() and delete() after that.
+    The numeric attributes listed in _ranges get a SortedIndex the same
+    way, used by find_range(), the (latitude, longitude) pair named by
+    _geo a SpatialIndex, used by find_within() and find_near(), the
+    text attributes listed in _text a TextIndex, used by search(), and
+    the list attributes listed in _lists a ListIndex, used by
+    find_containing().  With NumPy installed, aggregate() also keeps a
+    ColumnStore of the _ranges and _indexes attributes of a class.
+
+    When lazy, reload() stores a LazyModel holding the JSON text of each
+    object, and the model instance is only built when it is first used.
+
+    With format="binary" snapshots use the compact layout of
+    binary_format (file.bin) instead of JSON; the log stays JSON.
+    Adding mmap=True, reload() only maps the indexed snapshot and get()
+    reads the one object asked for; the whole snapshot is only read
+    when every object is needed (all(), count() or a save).
+
+    In journal mode the log is compacted once it reaches compact_log_size
+    bytes, or once compact_ratio of its records are garbage (superseded
+    or deleted objects).  compact() rotates the log to file.json.log.old
+    and gathers the text of the live objects under the lock, then writes
+    the new snapshot from a background thread while writers go on
+    appending to a fresh log; reload() replays the snapshot, the rotated
+    log and the log, in that order.
+
+    Every change holds __lock exclusively, while all(), count() and the
+    queries only share it, so any number of threads may read at once;
+    a missing attribute index is built under the exclusive lock first.  all()
+    returns a copy that later changes don't affect.  A save gathers the
+    text of the objects under the lock and writes the file after
+    releasing it, so readers and writers never wait for the disk.
+
+    Processes sharing the files take an advisory lock on file.json.lock
+    (the JSON file path plus .lock) around every write and reload, and
+    bump the generation counter it holds.  A save that finds the counter
+    moved first merges what the other process saved with its own unsaved
+    changes, and refresh() reloads only when the counter moved, so
+    several processes can work on the same files without losing each
+    other's writes.
+
+    Inside a transaction() block save() only notes that a save is
+    wanted, and the changes of the block are written once when it ends,
+    as a single log record in journal mode.  The state every object had
+    before its first change in the block is kept, so that if the block
+    raises, the objects are put back as they were and nothing is saved.
+    That state is kept per thread, so the block of one thread never
+    defers or rolls back the changes of another.  Scheduled writes of
+    the background thread wait until no block is open in any thread,
+    so they never hold half of the changes of one.
+    """
     __file_path = "file.json"
+    __log_path = "file.json.log"
+    __old_log_path = "file.json.log.old"
     __objects = {}
+    __changed = set()
+    __fragments = {}
+    __bodies = {}
+    __loaded = set()
+    __by_class = {}
+    __attr_indexes = {}
+    __indexed = None
+    __mapped = None
+    __gone = set()
+    __lock = RWLock()
+    __checkpointing = threading.Lock()
+    __appending = threading.RLock()
+    __file_locks = {}
+    __generation = None
+    __tx = Transaction()
+    __blocks = 0
+    __log = {"bytes": 0, "records": 0, "garbage": 0}
+    __log_keys = set()
+    __compactions = {"runs": 0, "bytes_reclaimed": 0, "last_duration": 0,
+                     "last_pause": 0, "total_duration": 0}
+    __compact_min_records = 1000
+    __fsync_policies = ("always", "batched", "never")
+    __formats = ("json", "binary")
+
+    def __init__(self, journal=False, commit_delay=0, fsync="never",
+                 fsync_interval=1000, sharded=False, lazy=False,
+                 format="json", mmap=False, compact_log_size=16 * 2 ** 20,
+                 compact_ratio=0.5):
+        """Initialize a FileStorage.
+
+        Args:
+            journal (bool): append changes to the log file on save()
+                instead of rewriting the whole JSON file.
+            commit_delay (float): seconds a background thread waits to
+                group saves into one write; 0 writes on every save().
+            fsync (str): one of "always", "batched" or "never".
+            fsync_interval (int): minimum milliseconds between two
+                fsyncs under the "batched" policy.
+            sharded (bool): keep one file per class, loaded lazily.
+            lazy (bool): build the objects read by reload() on first use.
+            format (str): snapshot format, "json" or "binary".
+            mmap (bool): read a binary snapshot one object at a time
+                through a memory map.
+            compact_log_size (int): log size in bytes that triggers a
+                compaction in journal mode; 0 never triggers one.
+            compact_ratio (float): share of garbage log records that
+                triggers a compaction in journal mode; 0 never does.
+        """
+        if fsync not in self.__fsync_policies:
+            raise ValueError("fsync must be one of {}".format(
+                ", ".join(self.__fsync_policies)))
+        if format not in self.__formats:
+            raise ValueError("format must be one of {}".format(
+                ", ".join(self.__formats)))
+        if journal and sharded:
+            raise ValueError("journal mode does not support sharding")
+        if mmap and (format != "binary" or journal or sharded):
+            raise ValueError("mmap needs the binary format, without "
+                             "journal mode or sharding")
+        if not 0 <= compact_ratio <= 1:
+            raise ValueError("compact_ratio must be between 0 and 1")
+        self.__journal = journal
+        self.__sharded = sharded
+        self.__lazy = lazy
+        self.__format = format
+        self.__mmap = mmap
+        self.__compact_log_size = compact_log_size
+        self.__compact_ratio = compact_ratio
+        self.__fsync = fsync
+        self.__fsync_interval = fsync_interval / 1000
+        self.__last_sync = 0
+        self.__unsynced = set()
+        self.__sync_timer = None
+        self.__sync_lock = threading.Lock()
+        self.__commit_delay = commit_delay
+        self.__scheduled = False
+        self.__flushing = threading.Lock()
+        self.__wakeup = threading.Event()
+        self.__writer = None
+
+    @property
+    def __file_lock(self):
+        """The FileLock of the lock file next to the JSON file."""
+        path = self.__file_path + ".lock"
+        lock = self.__file_locks.get(path)
+        if lock is None:
+            lock = self.__file_locks.setdefault(path, FileLock(path))
+        return lock
+
+    def all(self, cls=None):
+        """Returns a copy of __objects, or of the objects of cls.
+
+        Args:
+            cls: a model class or class name.
+        """
+        objs = self.__visible(cls)
+        with self.__lock.read():
+            return dict(objs)
+
+    def __visible(self, cls):
+        """Loads what all(cls) needs and returns the live dict it reads."""
+        self.__map_all()
+        if cls is None:
+            for name in classes:
+                self.__load_shard(name)
+            return self.__objects
+        name = cls if isinstance(cls, str) else cls.__name__
+        self.__load_shard(name)
+        return self.__class_index().get(name, {})
 
-    def all(self):
-        """Returns  the dictionary __objects"""
-        return self.__objects
+    def get(self, cls, id):
+        """Returns the object of class cls with the given id, or None.
+
+        Args:
+            cls: a model class or class name.
+            id (str): the id of the object.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        k = "{}.{}".format(name, id)
+        self.__load_shard(name)
+        obj = self.__objects.get(k)
+        if obj is None and self.__mapped is not None:
+            with self.__lock:
+                found = None
+                if self.__mapped is not None and k not in self.__gone:
+                    found = self.__mapped.get(k)
+                if found is not None and k not in self.__objects:
+                    self.__put(k, LazyModel(k, found[1]))
+                    self.__bodies[k] = found[1]
+                obj = self.__objects.get(k)
+        return obj
+
+    def count(self, cls=None):
+        """Returns the number of objects stored, or of objects of cls."""
+        objs = self.__visible(cls)
+        with self.__lock.read():
+            return len(objs)
+
+    def __class_index(self):
+        """Returns __by_class, rebuilt if __objects has been replaced."""
+        if FileStorage.__indexed is not self.__objects:
+            with self.__lock:
+                self.__by_class.clear()
+                self.__attr_indexes.clear()
+                for k, obj in self.__objects.items():
+                    self.__by_class.setdefault(k.split(".")[0], {})[k] = obj
+                FileStorage.__indexed = self.__objects
+        return self.__by_class
 
     def new(self, obj):
         """Sets in __objects the obj with key <obj class name>.id."""
         # k = str(obj.__class__.__name__) + '.' + str(obj.id)
         k = "{}.{}".format(obj.__class__.__name__, obj.id)
+        with self.__lock:
+            self.__remember(k)
+            self.__put(k, obj)
+            self.__changed.add(k)
+            self.__forget(k)
+            self.__gone.discard(k)
+
+    def bulk_new(self, objs, cls=None, index=True):
+        """Stores many objects in one pass and returns them as a list.
+
+        Args:
+            objs: model instances, or to_dict() style dicts that are
+                built with from_dict().
+            cls: the class (or class name) of dicts without __class__.
+            index (bool): update the class index as the objects are
+                stored; False leaves it to be rebuilt once when next used.
+        """
+        built = [from_dict(obj, cls) if isinstance(obj, dict) else obj
+                 for obj in objs]
+        with self.__lock:
+            for obj in built:
+                k = "{}.{}".format(obj.__class__.__name__, obj.id)
+                self.__remember(k)
+                if index:
+                    self.__put(k, obj)
+                else:
+                    self.__objects[k] = obj
+                self.__changed.add(k)
+                self.__forget(k)
+                self.__gone.discard(k)
+            if not index:
+                FileStorage.__indexed = None
+        return built
+
+    def bulk_load(self, objs, cls=None, index=True):
+        """Stores many objects like bulk_new(), then saves once."""
+        built = self.bulk_new(objs, cls, index)
+        self.save()
+        return built
+
+    def __forget(self, k):
+        """Drops the cached JSON text and binary body of key k."""
+        self.__fragments.pop(k, None)
+        self.__bodies.pop(k, None)
+
+    def __put(self, k, obj):
+        """Stores obj under k in __objects and the indexes."""
         self.__objects[k] = obj
+        name = k.split(".")[0]
+        self.__class_index().setdefault(name, {})[k] = obj
+        for index in self.__attr_indexes.get(name, {}).values():
+            index.update(k, obj)
+
+    def find(self, cls, **equals):
+        """Returns the objects of cls whose attributes equal equals.
+
+        An attribute listed in the _indexes of cls is looked up in its
+        HashIndex, so only the matching objects are read; without one,
+        every object of cls is compared.
+
+        Args:
+            cls: a model class or class name.
+            equals: the attribute values to match.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        objs = self.__visible(name)
+        declared = getattr(classes.get(name), "_indexes", ())
+        indexes = {attr: self.__attr_index(name, attr)
+                   for attr in equals if attr in declared}
+        with self.__lock.read():
+            keys = None
+            for attr, index in indexes.items():
+                found = index.get(equals[attr])
+                if keys is None or len(found) < len(keys):
+                    keys = found
+            if keys is None:
+                candidates = list(objs.values())
+            else:
+                candidates = [objs[k] for k in keys if k in objs]
+        return [obj for obj in candidates
+                if all(getattr(obj, attr, None) == value
+                       for attr, value in equals.items())]
+
+    def group(self, cls, attr, values):
+        """Returns the objects of cls whose attr equals each of values.
+
+        It answers find(cls, attr=value) for every value at once, as a
+        dict of lists by value, e.g. the cities of many states; the
+        HashIndex of a declared attribute is read once per value and any
+        other attribute takes a single scan.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        objs = self.__visible(name)
+        groups = {value: [] for value in values}
+        if attr in getattr(classes.get(name), "_indexes", ()):
+            index = self.__attr_index(name, attr)
+            with self.__lock.read():
+                candidates = [(value, objs[k]) for value in groups
+                              for k in index.get(value) if k in objs]
+            for value, obj in candidates:
+                if getattr(obj, attr, None) == value:
+                    groups[value].append(obj)
+        else:
+            with self.__lock.read():
+                candidates = list(objs.values())
+            for obj in candidates:
+                try:
+                    found = groups.get(getattr(obj, attr, None))
+                except TypeError:
+                    continue
+                if found is not None:
+                    found.append(obj)
+        return groups
+
+    def find_range(self, cls, attr, lo=None, hi=None, reverse=False,
+                   limit=None):
+        """Returns the objects of cls whose attr is within [lo, hi].
+
+        The objects are ordered by attr (then key), and only those whose
+        attr is a number are returned.  An attribute listed in the
+        _ranges of cls is read from its SortedIndex, so only the objects
+        returned are visited; any other attribute is sorted on the fly.
+
+        Args:
+            cls: a model class or class name.
+            attr (str): the numeric attribute.
+            lo: the lowest value, or None for no lower bound.
+            hi: the highest value, or None for no upper bound.
+            reverse (bool): highest values first, e.g. for a top-k.
+            limit (int): the most objects to return, None for all.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        if attr in getattr(classes.get(name), "_ranges", ()):
+            objs = self.__visible(name)
+            index = self.__attr_index(name, attr, SortedIndex)
+        else:
+            objs = self.all(name)
+            index = SortedIndex(attr)
+            index.rebuild(objs)
+        with self.__lock.read():
+            return [objs[k] for k in islice(index.range(lo, hi, reverse),
+                                            limit)]
+
+    def find_within(self, cls, south, west, north, east):
+        """Returns the objects of cls inside a latitude/longitude box.
+
+        A box whose west edge is greater than its east edge crosses the
+        180th meridian.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        index, objs = self.__spatial_index(name)
+        with self.__lock.read():
+            return [objs[k] for k in index.within(south, west, north, east)]
+
+    def find_near(self, cls, latitude, longitude, km=None, limit=None):
+        """Returns the objects of cls by increasing distance from a point.
+
+        Args:
+            cls: a model class or class name.
+            latitude (float): the latitude of the point.
+            longitude (float): the longitude of the point.
+            km (float): the largest distance, None for no limit.
+            limit (int): the most objects to return (the k nearest),
+                None for all.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        index, objs = self.__spatial_index(name)
+        with self.__lock.read():
+            found = index.nearest(latitude, longitude)
+            if km is not None:
+                found = takewhile(lambda pair: pair[0] <= km, found)
+            return [objs[k] for distance, k in islice(found, limit)]
+
+    def __spatial_index(self, name):
+        """Returns the SpatialIndex of class name and the objects it holds.
+
+        Classes without _geo get one built for the query, on their
+        latitude and longitude attributes.
+        """
+        attrs = getattr(classes.get(name), "_geo", None)
+        if attrs is not None:
+            objs = self.__visible(name)
+            return self.__attr_index(name, attrs, SpatialIndex), objs
+        objs = self.all(name)
+        index = SpatialIndex()
+        index.rebuild(objs)
+        return index, objs
+
+    def search(self, cls, query, any=False, limit=None):
+        """Returns the objects of cls whose text holds the words of query.
+
+        The best matches come first.  Classes without _text are searched
+        on the fly in all their string attributes.
+
+        Args:
+            cls: a model class or class name.
+            query (str): the words to look for, in any case.
+            any (bool): match any of the words instead of all of them.
+            limit (int): the most objects to return, None for all.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        attrs = getattr(classes.get(name), "_text", None)
+        if attrs is not None:
+            objs = self.__visible(name)
+            index = self.__attr_index(name, attrs, TextIndex)
+        else:
+            objs = self.all(name)
+            index = TextIndex()
+            index.rebuild(objs)
+        with self.__lock.read():
+            return [objs[k] for score, k in index.search(query, any, limit)]
+
+    def find_containing(self, cls, attr, values):
+        """Returns the objects of cls whose list attr holds all of values.
+
+        e.g. find_containing(Place, "amenity_ids", [wifi.id, tv.id]).  An
+        attribute listed in the _lists of cls is read from its ListIndex;
+        any other one is indexed for the query.
+
+        Args:
+            cls: a model class or class name.
+            attr (str): the list attribute.
+            values: the items every object returned must hold.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        values = [str(value) for value in values]
+        if not values:
+            return list(self.all(name).values())
+        if attr in getattr(classes.get(name), "_lists", ()):
+            objs = self.__visible(name)
+            index = self.__attr_index(name, attr, ListIndex)
+        else:
+            objs = self.all(name)
+            index = ListIndex(attr)
+            index.rebuild(objs)
+        with self.__lock.read():
+            return [objs[k] for k in index.having(values)]
+
+    def aggregate(self, cls, column, func="mean", by=None, where=None):
+        """Returns count, sum, mean, min or max of a numeric attribute.
+
+        e.g. aggregate(Place, "price_by_night", by="city_id") gives the
+        average price in each city.  When NumPy is installed and column
+        and the attributes of where are listed in the _ranges or
+        _indexes of cls (by in _indexes), the query runs vectorized over
+        the ColumnStore of cls; any other one walks the objects.
+
+        Args:
+            cls: a model class or class name.
+            column (str): the numeric attribute aggregated.
+            func (str): one of count, sum, mean, min or max.
+            by (str): the attribute to group by, None for a single result.
+            where (dict): the conditions the objects must meet, by
+                attribute: a (lo, hi) tuple for a numeric range (None for
+                no bound) or a value to equal.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        model = classes.get(name)
+        attrs = (getattr(model, "_ranges", ()), getattr(model, "_indexes", ()))
+        if columns.np is not None and columns.covers(attrs, column, by, where):
+            self.__visible(name)
+            store = self.__attr_index(name, attrs, ColumnStore)
+            with self.__lock.read():
+                return store.aggregate(column, func, by, where)
+        return columns.aggregate(self.all(name).values(), column, func, by,
+                                 where)
+
+    def __attr_index(self, name, attr, kind=HashIndex):
+        """Returns the kind index of attr of class name, built if needed.
+
+        A missing index is built once under the exclusive lock; the
+        queries then read it under the shared side, which must not be
+        held when calling this.
+        """
+        index = self.__attr_indexes.get(name, {}).get((kind, attr))
+        if index is not None:
+            return index
+        with self.__lock:
+            indexes = self.__attr_indexes.setdefault(name, {})
+            index = indexes.get((kind, attr))
+            if index is None:
+                index = kind(attr)
+                index.rebuild(self.__class_index().get(name, {}))
+                indexes[kind, attr] = index
+            return index
+
+    def replace(self, proxy, obj):
+        """Stores obj in place of proxy, its LazyModel, as is."""
+        with self.__lock:
+            if self.__objects.get(proxy._key) is proxy:
+                self.__put(proxy._key, obj)
+
+    def touch(self, obj):
+        """Marks obj as changed since the last save if it is stored."""
+        k = "{}.{}".format(obj.__class__.__name__, getattr(obj, "id", None))
+        if self.__objects.get(k) is not obj:
+            return
+        with self.__lock:
+            if self.__objects.get(k) is obj:
+                self.__changed.add(k)
+                self.__forget(k)
+                for index in self.__attr_indexes.get(
+                        k.split(".")[0], {}).values():
+                    index.update(k, obj)
+
+    def delete(self, obj=None):
+        """Deletes obj from __objects if it's inside."""
+        if obj is None:
+            return
+        k = "{}.{}".format(obj.__class__.__name__, obj.id)
+        with self.__lock:
+            if k in self.__objects:
+                self.__remember(k)
+                self.__discard(k)
+                self.__changed.add(k)
+                if self.__mapped is not None:
+                    self.__gone.add(k)
+
+    def __discard(self, k):
+        """Removes the object stored under k from __objects and indexes."""
+        self.__objects.pop(k, None)
+        name = k.split(".")[0]
+        self.__class_index().get(name, {}).pop(k, None)
+        for index in self.__attr_indexes.get(name, {}).values():
+            index.discard(k)
+        self.__forget(k)
+
+    def remember(self, obj):
+        """Keeps the state of obj for a rollback, before it is changed.
+
+        BaseModel calls it before setting an attribute; it does nothing
+        outside a transaction() block of the calling thread.
+        """
+        undo = self.__tx.undo
+        if undo is None:
+            return
+        k = "{}.{}".format(obj.__class__.__name__, getattr(obj, "id", None))
+        if k not in undo and self.__objects.get(k) is obj:
+            with self.__lock:
+                self.__remember(k)
+
+    def __remember(self, k):
+        """Keeps the object stored under k, if any, for a rollback, with
+        its record and whether it was already changed."""
+        undo = self.__tx.undo
+        if undo is not None and k not in undo:
+            obj = self.get(*k.split(".", 1))
+            undo[k] = (obj, None if obj is None else obj.to_dict(),
+                       k in self.__changed)
+
+    @contextmanager
+    def transaction(self):
+        """Groups the changes of a with block into a single save.
+
+        save() calls in the block are deferred to its end.  If the block
+        raises, the objects created, changed or deleted in it are put
+        back as they were, the same instances, and nothing is saved.
+        Nested blocks are part of the outermost one.  A block only holds
+        the changes of its own thread: other threads save as usual, and
+        if one saves while the block is open the rollback saves again.
+        """
+        tx = self.__tx
+        with self.__lock:
+            if not tx.depth:
+                tx.undo = {}
+                tx.save_wanted = False
+                tx.generation = self.__generation
+                FileStorage.__blocks += 1
+            tx.depth += 1
+        try:
+            yield self
+        except BaseException:
+            with self.__lock:
+                tx.depth -= 1
+                written = not tx.depth and self.__rollback()
+                if not tx.depth:
+                    self.__end_block()
+            if written:
+                self.save()
+            raise
+        with self.__lock:
+            tx.depth -= 1
+            if tx.depth:
+                return
+            tx.undo = None
+            save_wanted = tx.save_wanted
+            self.__end_block()
+        if save_wanted:
+            self.__commit(atomic=True)
+
+    def __end_block(self):
+        """Counts an outermost block as ended; __lock must be held.
+
+        The writes scheduled while blocks were open go ahead once the
+        last one ends.
+        """
+        FileStorage.__blocks -= 1
+        if not self.__blocks and self.__scheduled:
+            self.__wakeup.set()
+
+    def __rollback(self):
+        """Puts back the objects kept by __remember().
+
+        Returns True if the store was written since the transaction
+        began, and so holds changes that were rolled back.
+        """
+        undo, self.__tx.undo = self.__tx.undo, None
+        written = self.__generation != self.__tx.generation
+        for k, (obj, record, changed) in undo.items():
+            if record is None:
+                self.__discard(k)
+                if written and self.__mapped is not None:
+                    self.__gone.add(k)
+            else:
+                obj.restore(record)
+                self.__put(k, obj)
+                self.__forget(k)
+                if self.__mapped is not None:
+                    self.__gone.discard(k)
+            if changed or written:
+                self.__changed.add(k)
+            else:
+                self.__changed.discard(k)
+        return written
 
     def save(self):
-        """Serializes __objects to the JSON file (path: __file_path)."""
-        my_dict = {k: v.to_dict() for k, v in self.__objects.items()}
-        with open(self.__file_path, 'w', encoding='utf-8') as f:
-            json.dump(my_dict, f)
+        """Serializes __objects to the JSON file (path: __file_path).
 
-    def reload(self):
-        """Deserializes the JSON file to __objects."""
+        In journal mode only the changes since the previous save are
+        appended to the log file (path: __log_path).
+        """
+        if self.__tx.undo is not None:
+            self.__tx.save_wanted = True
+            return
+        if not self.__commit_delay:
+            self.__commit()
+            return
+        with self.__lock:
+            self.__scheduled = True
+            if self.__writer is None:
+                self.__writer = threading.Thread(target=self.__run_writer,
+                                                 daemon=True)
+                self.__writer.start()
+                atexit.register(self.flush)
+            self.__wakeup.set()
+
+    def flush(self):
+        """Writes the changes scheduled by save() right away.
+
+        A write the background thread has already started is waited for,
+        so everything saved is on disk when flush() returns.  While a
+        transaction() block is open in any thread the changes stay
+        scheduled, and the background thread writes them once the last
+        block ends.
+        """
+        with self.__flushing:
+            with self.__lock:
+                if self.__blocks:
+                    self.__wakeup.clear()
+                    return
+                self.__wakeup.clear()
+                scheduled = self.__scheduled
+                self.__scheduled = False
+            if scheduled:
+                self.__commit()
+
+    def __run_writer(self):
+        """Background loop that groups scheduled saves into one write."""
+        while True:
+            self.__wakeup.wait()
+            time.sleep(self.__commit_delay)
+            self.flush()
+
+    def __commit(self, atomic=False):
+        """Writes the changes to the log file or a full snapshot.
+
+        With atomic, the changes go to the log as one batch record.
+        """
+        if not self.__journal:
+            self.checkpoint()
+            return
+        with self.__file_lock:
+            self.__catch_up()
+            self.__append_log(atomic)
+            FileStorage.__generation = self.__file_lock.bump()
+        if self.__compaction_due():
+            self.compact()
+
+    def refresh(self):
+        """Reloads the objects if another process saved since we last read.
+
+        Unsaved changes are kept.  Objects held from before a refresh
+        must be looked up again, as the stored ones are new instances.
+
+        Returns:
+            bool: True if the objects were reloaded.
+        """
+        if self.__file_lock.generation() == self.__generation:
+            return False
+        with self.__file_lock:
+            return self.__catch_up()
+
+    def __catch_up(self):
+        """Merges what other processes saved; the file lock must be held.
+
+        Returns True if anything had to be merged.
+        """
+        gen = self.__file_lock.generation()
+        if gen == self.__generation:
+            return False
+        with self.__lock:
+            pending = {k: self.__objects.get(k) for k in self.__changed}
+            self.__objects.clear()
+            FileStorage.__indexed = None
+            self.__fragments.clear()
+            self.__bodies.clear()
+            self.__loaded.clear()
+            self.__load_files()
+            for name in classes:
+                self.__load_shard(name)
+            for k, obj in pending.items():
+                if obj is None:
+                    if k in self.__objects:
+                        self.__discard(k)
+                    if self.__mapped is not None:
+                        self.__gone.add(k)
+                else:
+                    self.__put(k, obj)
+                    self.__forget(k)
+            self.__changed.clear()
+            self.__changed.update(pending)
+            FileStorage.__generation = gen
+        return True
+
+    def __append_log(self, atomic=False):
+        """Appends the changes since the previous save to the log file.
+
+        With atomic, they are written as the records of one batch line,
+        so a torn write at the tail drops all of them.  The records are
+        built under __lock and written after releasing it; __appending
+        keeps the writes of several threads in order.
+        """
+        with self.__appending:
+            with self.__lock:
+                if not self.__changed:
+                    return
+                dirty = set(self.__changed)
+                records = []
+                set_record = '{{"op": "set", "key": {}, "value": {}}}'
+                for k in dirty:
+                    if k in self.__objects:
+                        record = set_record.format(json.dumps(k),
+                                                   self.__fragment(k))
+                    else:
+                        record = json.dumps({"op": "del", "key": k})
+                    records.append(record)
+                    self.__count_log_record(k, k not in self.__objects,
+                                            len(record) + 1)
+                self.__changed.clear()
+            try:
+                with open(self.__log_path, 'a', encoding='utf-8') as f:
+                    if not self.__ends_line(self.__log_path):
+                        f.write("\n")
+                    if atomic and len(records) > 1:
+                        f.write('{{"op": "batch", "records": [{}]}}\n'
+                                .format(", ".join(records)))
+                    else:
+                        f.write("".join(r + "\n" for r in records))
+                    self.__sync(f)
+            except BaseException:
+                with self.__lock:
+                    self.__changed.update(dirty)
+                raise
+
+    @staticmethod
+    def __ends_line(path):
+        """Returns False if the file at path ends with a partial line."""
+        with open(path, 'rb') as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return True
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def __count_log_record(self, k, deleted, size):
+        """Adds a log record of key k to the log size and garbage counts."""
+        log = self.__log
+        log["bytes"] += size
+        log["records"] += 1
+        if k in self.__log_keys:
+            log["garbage"] += 1
+        if deleted:
+            log["garbage"] += 1
+        self.__log_keys.add(k)
+
+    def __reset_log_counts(self):
+        """Resets the log counts after the log has been emptied."""
+        self.__log.update(bytes=0, records=0, garbage=0)
+        self.__log_keys.clear()
+
+    def __compaction_due(self):
+        """Returns True if the log crossed a compaction threshold."""
+        log = self.__log
+        if self.__compact_log_size and log["bytes"] >= self.__compact_log_size:
+            return True
+        return bool(self.__compact_ratio and
+                    log["records"] >= self.__compact_min_records and
+                    log["garbage"] >= self.__compact_ratio * log["records"])
+
+    def __sync(self, f, defer=True):
+        """Forces f to disk if the fsync policy asks for it now.
+
+        Under "batched", an fsync that comes too soon is deferred (unless
+        defer is False) until the interval is over, so no write stays
+        unsynced for much longer than fsync_interval.
+        """
+        now = time.monotonic()
+        if self.__fsync == "never":
+            return False
+        if (self.__fsync == "batched" and
+                now - self.__last_sync < self.__fsync_interval):
+            if defer:
+                self.__defer_sync(f.name)
+            return False
+        f.flush()
+        os.fsync(f.fileno())
+        self.__last_sync = now
+        return True
+
+    def __defer_sync(self, path):
+        """Has the file at path synced when the fsync interval is over."""
+        with self.__sync_lock:
+            self.__unsynced.add(path)
+            if self.__sync_timer is None:
+                delay = (self.__last_sync + self.__fsync_interval -
+                         time.monotonic())
+                self.__sync_timer = threading.Timer(max(delay, 0),
+                                                    self.__sync_deferred)
+                self.__sync_timer.daemon = True
+                self.__sync_timer.start()
+
+    def __sync_deferred(self):
+        """Syncs the files whose fsync __sync() deferred, and their
+        directories."""
+        with self.__sync_lock:
+            paths, self.__unsynced = self.__unsynced, set()
+            self.__sync_timer = None
+        for path in paths:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self.__sync_dir(path)
+        self.__last_sync = time.monotonic()
+
+    @staticmethod
+    def __sync_dir(path):
+        """Forces the directory entry of the file at path to disk."""
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(os.path.dirname(os.path.abspath(path)),
+                     os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def __fragment(self, k):
+        """Returns the cached JSON text of the object stored under k."""
+        text = self.__fragments.get(k)
+        if text is None:
+            text = json.dumps(self.__objects[k].to_dict())
+            self.__fragments[k] = text
+        return text
+
+    def __body(self, k):
+        """Returns the cached binary body of the object stored under k."""
+        body = self.__bodies.get(k)
+        if body is None:
+            obj = self.__objects[k]
+            record = obj.to_dict()
+            record["created_at"] = obj.created_at
+            record["updated_at"] = obj.updated_at
+            body = binary_format.encode(record)
+            self.__bodies[k] = body
+        return body
+
+    def __encoded(self, keys):
+        """Yields the (key, JSON text or binary body) pairs of keys."""
+        encode = self.__body if self.__format == "binary" else \
+            self.__fragment
+        for k in keys:
+            yield k, encode(k)
+
+    def checkpoint(self):
+        """Writes a full snapshot of __objects and empties the log.
+
+        When sharded, only the files of classes that changed are written.
+        Waits for a running compaction to finish first.
+        """
+        with self.__file_lock, self.__checkpointing:
+            self.__catch_up()
+            with self.__appending:
+                if self.__journal:
+                    self.__append_log()
+                files, dirty = self.__gather()
+            try:
+                self.__write_files(files)
+            except BaseException:
+                with self.__lock:
+                    self.__changed.update(dirty)
+                raise
+            FileStorage.__generation = self.__file_lock.bump()
+
+    def __gather(self):
+        """Takes a consistent snapshot of what checkpoint() must write.
+
+        Rotates the log and returns the (path, records) of every file to
+        write along with the keys that were marked as changed.
+        __checkpointing and __appending must be held.
+        """
+        with self.__lock:
+            self.__map_all()
+            dirty = set(self.__changed)
+            if self.__sharded:
+                names = {k.split(".")[0] for k in dirty}
+                for name in names:
+                    self.__load_shard(name)
+                index = self.__class_index()
+                files = [(self.__snapshot_path(name),
+                          list(self.__encoded(index.get(name, {}))))
+                         for name in names]
+            else:
+                self.__rotate_log()
+                self.__reset_log_counts()
+                files = [(self.__snapshot_path(),
+                          list(self.__encoded(self.__objects)))]
+            self.__changed.clear()
+        return files, dirty
+
+    def __write_files(self, files):
+        """Writes the files gathered by __gather() and drops the old log."""
+        for path, records in files:
+            self.__write_snapshot(path, records)
+        if not self.__sharded:
+            try:
+                os.remove(self.__old_log_path)
+            except FileNotFoundError:
+                pass
+
+    def compact(self, wait=False):
+        """Writes a snapshot of the live objects and drops the old log.
+
+        The changes not saved yet are appended to the log, which is then
+        rotated to __old_log_path, and the text of every object is
+        gathered; only this part holds off writers.  The snapshot is
+        written by a background thread that deletes the rotated log when
+        done.  Outside journal mode this is the same as checkpoint().
+
+        Args:
+            wait (bool): return only once the snapshot is written.
+
+        Returns:
+            bool: False if a compaction was already running.
+        """
+        if not self.__journal:
+            self.checkpoint()
+            return True
+        self.__file_lock.acquire()
+        if not self.__checkpointing.acquire(blocking=False):
+            self.__file_lock.release()
+            return False
+        start = time.monotonic()
         try:
-            with open(FileStorage.__file_path, 'r', encoding='utf-8') as f:
-                objects_dict = json.load(f)
-                for obj in objects_dict.values():
-                    class_name = obj['__class__']
-                    self.new(eval(class_name)(**obj))
+            self.__catch_up()
+            with self.__appending:
+                self.__append_log()
+                files = self.__gather()[0]
+            FileStorage.__generation = self.__file_lock.bump()
+        except BaseException:
+            self.__checkpointing.release()
+            self.__file_lock.release()
+            raise
+        self.__compactions["last_pause"] = time.monotonic() - start
+        thread = threading.Thread(target=self.__finish_compaction,
+                                  args=(files, start), daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return True
+
+    def __rotate_log(self):
+        """Moves the log to __old_log_path, appending to one left there."""
+        if not os.path.exists(self.__old_log_path):
+            try:
+                os.replace(self.__log_path, self.__old_log_path)
+            except FileNotFoundError:
+                pass
+            return
+        try:
+            with open(self.__log_path, 'rb') as src, \
+                    open(self.__old_log_path, 'ab') as dst:
+                shutil.copyfileobj(src, dst)
+                self.__sync(dst)
         except FileNotFoundError:
             return
+        os.remove(self.__log_path)
+
+    def __finish_compaction(self, files, start):
+        """Writes the snapshot of a compaction and removes the old log.
+
+        Runs without the storage lock, holding only __checkpointing and
+        the file lock.
+        """
+        try:
+            path = self.__snapshot_path()
+            before = sum(os.path.getsize(p) for p in
+                         (path, self.__old_log_path) if os.path.exists(p))
+            self.__write_files(files)
+            reclaimed = before - os.path.getsize(path)
+            duration = time.monotonic() - start
+            stats = self.__compactions
+            stats["runs"] += 1
+            stats["bytes_reclaimed"] += max(reclaimed, 0)
+            stats["last_duration"] = duration
+            stats["total_duration"] += duration
+        finally:
+            self.__checkpointing.release()
+            self.__file_lock.release()
+
+    def compaction_stats(self):
+        """Returns the compaction counters and the current log counts.
+
+        runs, bytes_reclaimed (snapshot and log bytes freed in total),
+        last_duration and total_duration (seconds, gathering included),
+        last_pause (seconds writers were held off), log_bytes,
+        log_records and garbage_ratio (share of log records that a
+        compaction would drop).
+        """
+        stats = dict(self.__compactions)
+        log = self.__log
+        stats["log_bytes"] = log["bytes"]
+        stats["log_records"] = log["records"]
+        stats["garbage_ratio"] = (log["garbage"] / log["records"]
+                                  if log["records"] else 0.0)
+        return stats
+
+    def __write_snapshot(self, path, records):
+        """Atomically replaces the file at path with the given records.
+
+        Args:
+            records: (key, JSON text or binary body) pairs.
+        """
+        tmp_path = path + ".tmp"
+        if self.__format == "binary":
+            with open(tmp_path, 'wb') as f:
+                binary_format.write(f, ((k.split(".")[0], body)
+                                        for k, body in records))
+                synced = self.__sync(f, defer=False)
+        else:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write("{\n")
+                f.write(",\n".join("{}: {}".format(json.dumps(k), text)
+                                   for k, text in records))
+                f.write("\n}\n")
+                synced = self.__sync(f, defer=False)
+        os.replace(tmp_path, path)
+        if synced:
+            self.__sync_dir(path)
+        elif self.__fsync == "batched":
+            # only once renamed, or the old file would be synced instead
+            self.__defer_sync(path)
+
+    def reload(self):
+        """Deserializes the JSON file, then the log files, to __objects.
+
+        When sharded, the class files are only marked as not loaded yet.
+        In journal mode a log left rotated by an interrupted compaction
+        is folded into a new snapshot.
+        """
+        with self.__file_lock, self.__checkpointing, self.__appending, \
+                self.__lock:
+            FileStorage.__generation = self.__file_lock.generation()
+            if self.__load_files() and self.__journal:
+                self.__write_files(self.__gather()[0])
+
+    def __load_files(self):
+        """Does the work of reload(); the locks must be held.
+
+        Returns True if a log left rotated by a compaction was replayed.
+        """
+        self.__attr_indexes.clear()
+        if self.__sharded:
+            self.__loaded.clear()
+            return False
+        if self.__mmap and self.__map(self.__snapshot_path()):
+            return False
+        self.__reset_log_counts()
+        loaded = self.__load_snapshot(self.__snapshot_path())
+        loaded |= self.__replay_log(self.__old_log_path)
+        interrupted = bool(self.__log["records"])
+        loaded |= self.__replay_log(self.__log_path)
+        self.__changed.difference_update(loaded)
+        return interrupted
+
+    def __map(self, path):
+        """Maps the indexed binary snapshot at path instead of loading it.
+
+        Returns False if path is missing or has no index.
+        """
+        if self.__mapped is not None:
+            self.__mapped.close()
+            FileStorage.__mapped = None
+        self.__gone.clear()
+        try:
+            FileStorage.__mapped = binary_format.MappedSnapshot(path)
+        except (FileNotFoundError, ValueError):
+            return False
+        return True
+
+    def __map_all(self):
+        """Loads every mapped object as a LazyModel and drops the map."""
+        if self.__mapped is None:
+            return
+        with self.__lock:
+            if self.__mapped is None:
+                return
+            for name, body in self.__mapped:
+                k = "{}.{}".format(name, binary_format.record_id(name, body))
+                if k not in self.__objects and k not in self.__gone:
+                    self.__put(k, LazyModel(k, body))
+                    self.__bodies[k] = body
+            self.__mapped.close()
+            FileStorage.__mapped = None
+            self.__gone.clear()
+
+    def __snapshot_path(self, name=None):
+        """Returns the path of the snapshot, or of the file of class name."""
+        root, ext = os.path.splitext(self.__file_path)
+        if self.__format == "binary":
+            ext = ".bin"
+        if name is not None:
+            root = "{}.{}".format(root, name)
+        return root + ext
+
+    def __load_shard(self, name):
+        """Loads the file of class name unless it's already loaded."""
+        if not self.__sharded or name in self.__loaded:
+            return
+        with self.__lock:
+            if name in self.__loaded or name not in classes:
+                return
+            self.__loaded.add(name)
+            loaded = self.__load_snapshot(self.__snapshot_path(name))
+            self.__changed.difference_update(loaded)
+
+    def __load_snapshot(self, path):
+        """Loads the snapshot at path and returns the keys it contained."""
+        if self.__format == "binary":
+            return self.__load_binary(path)
+        loaded = set()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                if f.readline().strip() == "{" and \
+                        self.__record_line(f.readline()):
+                    f.seek(0)
+                    f.readline()
+                    records = self.__stream_records(f)
+                else:
+                    f.seek(0)
+                    records = json.load(f).items()
+                for k, record in records:
+                    if self.__lazy:
+                        self.__put(k, LazyModel(k, record))
+                        self.__forget(k)
+                        if isinstance(record, str):
+                            self.__fragments[k] = record
+                    else:
+                        if isinstance(record, str):
+                            record = json.loads(record)
+                        self.new(classes[record['__class__']](**record))
+                    loaded.add(k)
+        except FileNotFoundError:
+            pass
+        return loaded
+
+    def __load_binary(self, path):
+        """Loads the binary snapshot at path and returns its keys."""
+        loaded = set()
+        try:
+            with open(path, 'rb') as f:
+                for name, body in binary_format.read(f):
+                    if self.__lazy:
+                        k = "{}.{}".format(
+                            name, binary_format.record_id(name, body))
+                        self.__put(k, LazyModel(k, body))
+                        self.__forget(k)
+                        self.__bodies[k] = body
+                    else:
+                        obj = classes[name](**binary_format.decode(name,
+                                                                   body))
+                        k = "{}.{}".format(name, obj.id)
+                        self.new(obj)
+                    loaded.add(k)
+        except FileNotFoundError:
+            pass
+        return loaded
+
+    @staticmethod
+    def __record_line(line):
+        """Returns True if line is a '"key": {...}' line of a file written
+        one object per line, or its closing brace."""
+        line = line.strip()
+        if line == "}":
+            return True
+        try:
+            k, end = json.JSONDecoder().raw_decode(line)
+            text = line[end:].lstrip()
+            value = json.loads(text[1:].rstrip(","))
+        except ValueError:
+            return False
+        return isinstance(k, str) and text.startswith(":") and \
+            isinstance(value, dict)
+
+    @staticmethod
+    def __stream_records(f):
+        """Yields the (key, JSON text) pairs of a one-object-per-line file."""
+        decoder = json.JSONDecoder()
+        for line in f:
+            line = line.strip()
+            if line == "}":
+                break
+            if not line:
+                continue
+            k, end = decoder.raw_decode(line)
+            text = line[end:].lstrip(": ").rstrip(",")
+            yield k, text
+
+    def __replay_log(self, path):
+        """Applies the records of the log at path and returns their keys.
+
+        A line torn by a crash is skipped, and cut off the log if it is
+        the last one, so the next save starts on a line of its own.
+        """
+        loaded = set()
+        try:
+            with open(path, 'rb') as f:
+                end = size = 0
+                for line in f:
+                    size += len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    end = size
+                    records = record.get("records", [record])
+                    for record in records:
+                        k = record["key"]
+                        if record["op"] == "set":
+                            obj = record["value"]
+                            self.new(classes[obj['__class__']](**obj))
+                        else:
+                            self.__discard(k)
+                        self.__count_log_record(k, record["op"] != "set",
+                                                len(line) // len(records))
+                        loaded.add(k)
+        except FileNotFoundError:
+            return loaded
+        if end < size:
+            os.truncate(path, end)
+        return loaded
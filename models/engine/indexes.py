@@ -0,0 +1,644 @@
+#!/usr/bin/python3
+"""Defines the attribute indexes the storage engines keep up to date."""
+import ast
+import heapq
+import math
+import re
+from array import array
+from bisect import bisect_left, insort
+from itertools import count
+from numbers import Number
+
+_missing = object()
+EARTH_RADIUS_KM = 6371.0088
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Return the great-circle distance between two points, in km."""
+    return _arc(abs(lat2 - lat1), abs(lon2 - lon1),
+                math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)))
+
+
+def tokenize(text):
+    """Return the lowercased words of text."""
+    return re.findall(r"\w+", text.lower())
+
+
+def list_items(value):
+    """Return the items of a list attribute as a tuple of strings.
+
+    Strings, as the console may store them, are read as a list literal
+    (e.g. '["a", "b"]') or else as comma separated items.
+    """
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            value = value.strip("[]").split(",")
+        if isinstance(value, str):
+            value = [value]
+    if not isinstance(value, (list, tuple, set, frozenset)):
+        return ()
+    items = (str(item).strip().strip("\"'") for item in value)
+    return tuple(dict.fromkeys(item for item in items if item))
+
+
+def _arc(dlat, dlon, cosines):
+    """Return the haversine distance for the given deltas, in km."""
+    h = math.sin(math.radians(dlat) / 2) ** 2 + \
+        cosines * math.sin(math.radians(dlon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, h)))
+
+
+class HashIndex:
+    """Maps the values of one attribute to the keys of the objects.
+
+    The storage calls update() whenever an object is stored or one of
+    its attributes is set, and discard() when it is removed.  Objects
+    whose value can't be hashed (e.g. a list) are kept apart and handed
+    to every lookup, so callers must still compare the values.
+    """
+
+    def __init__(self, attr):
+        """Initialize a HashIndex.
+
+        Args:
+            attr (str): the name of the indexed attribute.
+        """
+        self.__attr = attr
+        self.__keys = {}
+        self.__values = {}
+        self.__unhashable = set()
+
+    def update(self, k, obj):
+        """Index the current value of the attribute of obj, stored as k."""
+        value = getattr(obj, self.__attr, None)
+        old = self.__values.get(k, _missing)
+        if old is not _missing and old is value:
+            return
+        self.discard(k)
+        try:
+            self.__keys.setdefault(value, set()).add(k)
+        except TypeError:
+            self.__unhashable.add(k)
+            return
+        self.__values[k] = value
+
+    def discard(self, k):
+        """Forget the object stored as k."""
+        value = self.__values.pop(k, _missing)
+        if value is _missing:
+            self.__unhashable.discard(k)
+            return
+        keys = self.__keys[value]
+        keys.discard(k)
+        if not keys:
+            del self.__keys[value]
+
+    def rebuild(self, objs):
+        """Index every object of the dict objs from scratch."""
+        self.__keys.clear()
+        self.__values.clear()
+        self.__unhashable.clear()
+        for k, obj in objs.items():
+            self.update(k, obj)
+
+    def get(self, value):
+        """Return the keys of the objects that may hold value."""
+        try:
+            keys = self.__keys.get(value, ())
+        except TypeError:
+            keys = self.__values
+        if not self.__unhashable:
+            return set(keys)
+        return set(keys) | self.__unhashable
+
+
+class SortedIndex:
+    """Keeps the keys of the objects ordered by a numeric attribute.
+
+    The (value, key) pairs are kept in sorted chunks of at most 2 *
+    CHUNK items, so an update only shifts one chunk and range() finds
+    its first item with two binary searches.  Objects whose value is
+    not a number are left out of the order.  It follows the update(),
+    discard() and rebuild() protocol of HashIndex.
+    """
+    CHUNK = 512
+
+    def __init__(self, attr):
+        """Initialize a SortedIndex.
+
+        Args:
+            attr (str): the name of the indexed attribute.
+        """
+        self.__attr = attr
+        self.__chunks = []
+        self.__maxes = []
+        self.__values = {}
+
+    def __len__(self):
+        """Return the number of objects in the order."""
+        return len(self.__values)
+
+    def update(self, k, obj):
+        """Index the current value of the attribute of obj, stored as k."""
+        value = getattr(obj, self.__attr, None)
+        old = self.__values.get(k, _missing)
+        if old is not _missing and old == value and type(old) is type(value):
+            return
+        self.discard(k)
+        if isinstance(value, Number) and not isinstance(value, bool) and \
+                value == value:
+            self.__values[k] = value
+            self.__insert((value, k))
+
+    def discard(self, k):
+        """Forget the object stored as k."""
+        value = self.__values.pop(k, _missing)
+        if value is _missing:
+            return
+        item = (value, k)
+        i = bisect_left(self.__maxes, item)
+        chunk = self.__chunks[i]
+        del chunk[bisect_left(chunk, item)]
+        if chunk:
+            self.__maxes[i] = chunk[-1]
+        else:
+            del self.__chunks[i]
+            del self.__maxes[i]
+
+    def rebuild(self, objs):
+        """Index every object of the dict objs from scratch."""
+        self.__values.clear()
+        for k, obj in objs.items():
+            value = getattr(obj, self.__attr, None)
+            if isinstance(value, Number) and not isinstance(value, bool) \
+                    and value == value:
+                self.__values[k] = value
+        items = sorted((v, k) for k, v in self.__values.items())
+        self.__chunks = [items[i:i + self.CHUNK]
+                         for i in range(0, len(items), self.CHUNK)]
+        self.__maxes = [chunk[-1] for chunk in self.__chunks]
+
+    def range(self, lo=None, hi=None, reverse=False):
+        """Yield the keys whose value is within [lo, hi], in value order.
+
+        Args:
+            lo: the lowest value, or None for no lower bound.
+            hi: the highest value, or None for no upper bound.
+            reverse (bool): yield the highest values first.
+        """
+        chunks = self.__chunks
+        if not reverse:
+            i = 0 if lo is None else self.__bisect(self.__maxes, lo, False)
+            j = 0 if lo is None or i == len(chunks) else \
+                self.__bisect(chunks[i], lo, False)
+            while i < len(chunks):
+                for value, k in chunks[i][j:]:
+                    if hi is not None and value > hi:
+                        return
+                    yield k
+                i, j = i + 1, 0
+        else:
+            i = len(chunks) - 1
+            if hi is not None:
+                i = min(self.__bisect(self.__maxes, hi, True), i)
+            while i >= 0:
+                chunk = chunks[i]
+                j = len(chunk) if hi is None else \
+                    self.__bisect(chunk, hi, True)
+                for value, k in reversed(chunk[:j]):
+                    if lo is not None and value < lo:
+                        return
+                    yield k
+                i -= 1
+                hi = None
+
+    def __insert(self, item):
+        """Insert the (value, key) item in its chunk, splitting it if full."""
+        if not self.__chunks:
+            self.__chunks.append([item])
+            self.__maxes.append(item)
+            return
+        i = min(bisect_left(self.__maxes, item), len(self.__maxes) - 1)
+        chunk = self.__chunks[i]
+        insort(chunk, item)
+        self.__maxes[i] = chunk[-1]
+        if len(chunk) > 2 * self.CHUNK:
+            self.__chunks[i:i + 1] = [chunk[:self.CHUNK], chunk[self.CHUNK:]]
+            self.__maxes[i:i + 1] = [chunk[self.CHUNK - 1], chunk[-1]]
+
+    @staticmethod
+    def __bisect(items, value, right):
+        """Return the first position in the sorted (value, key) items
+        whose value is >= value, or > value when right."""
+        lo, hi = 0, len(items)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if items[mid][0] < value or right and items[mid][0] == value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+class SpatialIndex:
+    """Finds the keys of the objects around a latitude/longitude.
+
+    The points are kept in a quadtree: a cell holds at most CAPACITY
+    points and splits into four when it gets more, so dense areas get
+    small cells and a query only opens the few cells it overlaps, however
+    many objects there are.  nearest() visits the cells by increasing
+    distance, so the k closest points are found without reading the
+    others.  Objects without a valid latitude and longitude are left
+    out.  It follows the update(), discard() and rebuild() protocol of
+    HashIndex.
+    """
+    CAPACITY = 64
+    MAX_DEPTH = 32
+
+    def __init__(self, attrs=("latitude", "longitude")):
+        """Initialize a SpatialIndex.
+
+        Args:
+            attrs (tuple): the names of the latitude and longitude
+                attributes.
+        """
+        self.__lat, self.__lon = attrs
+        self.__points = {}
+        self.__root = self.__cell(-90.0, -180.0, 90.0, 180.0, 0)
+
+    def __len__(self):
+        """Return the number of points indexed."""
+        return len(self.__points)
+
+    def update(self, k, obj):
+        """Index the current position of obj, stored as k."""
+        point = self.__point(obj)
+        old = self.__points.get(k)
+        if old == point:
+            return
+        if old is not None:
+            self.discard(k)
+        if point is not None:
+            self.__points[k] = point
+            self.__insert(k, point)
+
+    def discard(self, k):
+        """Forget the object stored as k."""
+        point = self.__points.pop(k, None)
+        if point is None:
+            return
+        path = [self.__root]
+        while path[-1][6] is not None:
+            path.append(path[-1][6][self.__quadrant(path[-1], point)])
+        del path[-1][5][k]
+        for cell in reversed(path[:-1]):
+            children = cell[6]
+            if any(child[6] is not None for child in children) or \
+                    sum(len(child[5]) for child in children) > \
+                    self.CAPACITY // 2:
+                break
+            cell[5] = {}
+            for child in children:
+                cell[5].update(child[5])
+            cell[6] = None
+
+    def rebuild(self, objs):
+        """Index every object of the dict objs from scratch."""
+        self.__points.clear()
+        self.__root = self.__cell(-90.0, -180.0, 90.0, 180.0, 0)
+        for k, obj in objs.items():
+            self.update(k, obj)
+
+    def within(self, south, west, north, east):
+        """Yield the keys of the points inside a bounding box.
+
+        A box whose west edge is greater than its east edge crosses the
+        180th meridian.
+        """
+        if west > east:
+            yield from self.within(south, west, north, 180.0)
+            yield from self.within(south, -180.0, north, east)
+            return
+        stack = [self.__root]
+        while stack:
+            cell = stack.pop()
+            if cell[2] < south or cell[0] > north or \
+                    cell[3] < west or cell[1] > east:
+                continue
+            if cell[6] is not None:
+                stack.extend(cell[6])
+                continue
+            for k, (lat, lon) in cell[5].items():
+                if south <= lat <= north and west <= lon <= east:
+                    yield k
+
+    def nearest(self, latitude, longitude):
+        """Yield (km, key) pairs by increasing distance from a point."""
+        cos_lat = math.cos(math.radians(latitude))
+        ties = count()
+        heap = [(0.0, next(ties), self.__root)]
+        while heap:
+            km, tie, item = heapq.heappop(heap)
+            if not isinstance(item, list):
+                yield km, item
+            elif item[6] is None:
+                for k, (lat, lon) in item[5].items():
+                    heapq.heappush(heap, (distance_km(
+                        latitude, longitude, lat, lon), next(ties), k))
+            else:
+                for cell in item[6]:
+                    heapq.heappush(heap, (self.__bound(
+                        latitude, longitude, cos_lat, cell), next(ties), cell))
+
+    def __point(self, obj):
+        """Return the (latitude, longitude) of obj, None if invalid."""
+        lat = getattr(obj, self.__lat, None)
+        lon = getattr(obj, self.__lon, None)
+        for value in (lat, lon):
+            if not isinstance(value, Number) or isinstance(value, bool):
+                return None
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return None
+        return (float(lat), float(lon))
+
+    def __insert(self, k, point):
+        """Add point in its leaf cell, splitting it if it is full."""
+        cell = self.__root
+        while cell[6] is not None:
+            cell = cell[6][self.__quadrant(cell, point)]
+        cell[5][k] = point
+        self.__split(cell)
+
+    def __split(self, cell):
+        """Split cell in four while it holds more than CAPACITY points."""
+        if len(cell[5]) <= self.CAPACITY or cell[4] >= self.MAX_DEPTH:
+            return
+        south, west, north, east, depth = cell[:5]
+        lat, lon = (south + north) / 2, (west + east) / 2
+        cell[6] = [self.__cell(south, west, lat, lon, depth + 1),
+                   self.__cell(south, lon, lat, east, depth + 1),
+                   self.__cell(lat, west, north, lon, depth + 1),
+                   self.__cell(lat, lon, north, east, depth + 1)]
+        for k, point in cell[5].items():
+            cell[6][self.__quadrant(cell, point)][5][k] = point
+        cell[5] = None
+        for child in cell[6]:
+            self.__split(child)
+
+    @staticmethod
+    def __cell(south, west, north, east, depth):
+        """Return a new empty leaf cell.
+
+        A cell is a list [south, west, north, east, depth, points,
+        children] where points maps keys to (latitude, longitude) in a
+        leaf and children holds the four quarters otherwise.
+        """
+        return [south, west, north, east, depth, {}, None]
+
+    @staticmethod
+    def __quadrant(cell, point):
+        """Return the index of the child of cell that holds point."""
+        return 2 * (point[0] >= (cell[0] + cell[2]) / 2) + \
+            (point[1] >= (cell[1] + cell[3]) / 2)
+
+    @staticmethod
+    def __bound(latitude, longitude, cos_lat, cell):
+        """Return a lower bound of the distance from a point to cell."""
+        south, west, north, east = cell[:4]
+        dlat = 0.0 if south <= latitude <= north else \
+            min(abs(latitude - south), abs(latitude - north))
+        if west <= longitude <= east:
+            dlon = 0.0
+        else:
+            dlon = min(abs((longitude - edge + 180) % 360 - 180)
+                       for edge in (west, east))
+        far = math.cos(math.radians(max(abs(south), abs(north))))
+        return _arc(dlat, dlon, cos_lat * far)
+
+
+class TextIndex:
+    """Maps the words of text attributes to the keys of the objects.
+
+    Each word has a posting list, a dict of the keys whose text holds it
+    to the number of times it does; each key only keeps the tuple of its
+    distinct words, to be taken out of those lists.  search() intersects
+    (or unites)
+    the posting lists of the query words, starting with the shortest,
+    and ranks the keys found with BM25.  With attrs None, every string
+    attribute of to_dict() other than the id and dates is indexed.  It
+    follows the update(), discard() and rebuild() protocol of HashIndex.
+    """
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, attrs=None):
+        """Initialize a TextIndex.
+
+        Args:
+            attrs (tuple): the names of the text attributes.
+        """
+        self.__attrs = attrs
+        self.__postings = {}
+        self.__words = {}
+        self.__lengths = {}
+        self.__total = 0
+
+    def __len__(self):
+        """Return the number of objects with words indexed."""
+        return len(self.__words)
+
+    def update(self, k, obj):
+        """Index the current words of obj, stored as k."""
+        counts = {}
+        for word in tokenize(self.__text(obj)):
+            counts[word] = counts.get(word, 0) + 1
+        words = self.__words.get(k)
+        if words is not None and len(words) == len(counts) and \
+                all(self.__postings[word].get(k) == counts.get(word)
+                    for word in words):
+            return
+        self.discard(k)
+        if not counts:
+            return
+        self.__words[k] = tuple(counts)
+        length = sum(counts.values())
+        self.__lengths[k] = length
+        self.__total += length
+        for word, n in counts.items():
+            self.__postings.setdefault(word, {})[k] = n
+
+    def discard(self, k):
+        """Forget the object stored as k."""
+        words = self.__words.pop(k, None)
+        if words is None:
+            return
+        self.__total -= self.__lengths.pop(k)
+        for word in words:
+            posting = self.__postings[word]
+            del posting[k]
+            if not posting:
+                del self.__postings[word]
+
+    def rebuild(self, objs):
+        """Index every object of the dict objs from scratch."""
+        self.__postings.clear()
+        self.__words.clear()
+        self.__lengths.clear()
+        self.__total = 0
+        for k, obj in objs.items():
+            self.update(k, obj)
+
+    def search(self, query, any=False, limit=None):
+        """Return the (score, key) pairs matching query, best first.
+
+        Args:
+            query (str): the words to look for.
+            any (bool): match the keys holding any of the words instead
+                of all of them.
+            limit (int): the most pairs to return, None for all.
+        """
+        words = set(tokenize(query))
+        postings = sorted((self.__postings.get(word, {}) for word in words),
+                          key=len)
+        if any:
+            keys = set().union(*postings)
+        else:
+            keys = set(postings[0]) if postings else set()
+            for posting in postings[1:]:
+                keys.intersection_update(posting)
+        if not keys:
+            return []
+        n = len(self.__words)
+        lengths = self.__lengths
+        k1, b = self.K1, self.B
+        scale = k1 * b * n / self.__total
+        scores = dict.fromkeys(keys, 0.0)
+        for posting in postings:
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for k in (keys if len(keys) < len(posting) else posting):
+                tf = posting.get(k)
+                if tf is not None and k in scores:
+                    scores[k] += idf * tf * (k1 + 1) / (
+                        tf + k1 * (1 - b) + scale * lengths[k])
+        pairs = ((score, k) for k, score in scores.items())
+        order = (lambda pair: (-pair[0], pair[1]))
+        if limit is None:
+            return sorted(pairs, key=order)
+        return heapq.nsmallest(limit, pairs, key=order)
+
+    def __text(self, obj):
+        """Return the indexed text of obj."""
+        if self.__attrs is None:
+            values = [v for name, v in obj.to_dict().items()
+                      if name not in ("id", "created_at", "updated_at",
+                                      "__class__")]
+        else:
+            values = [getattr(obj, attr, None) for attr in self.__attrs]
+        return " ".join(v for v in values if isinstance(v, str))
+
+
+class ListIndex:
+    """Maps the items of a list attribute to the keys of the objects.
+
+    Each key gets a small integer slot, and each item the sorted array
+    of the slots holding it (4 bytes per entry).  having() starts from
+    the shortest array and keeps the slots found in each of the others,
+    by binary search or through a set, whichever is cheaper.  Strings
+    are read with list_items().  It follows the update(), discard() and
+    rebuild() protocol of HashIndex.
+    """
+
+    def __init__(self, attr):
+        """Initialize a ListIndex.
+
+        Args:
+            attr (str): the name of the indexed attribute.
+        """
+        self.__attr = attr
+        self.__slots = {}
+        self.__keys = []
+        self.__free = []
+        self.__items = {}
+        self.__arrays = {}
+
+    def __len__(self):
+        """Return the number of objects with items indexed."""
+        return len(self.__items)
+
+    def update(self, k, obj):
+        """Index the current items of the attribute of obj, stored as k."""
+        items = list_items(getattr(obj, self.__attr, None))
+        if self.__items.get(k, ()) == items:
+            return
+        self.discard(k)
+        if not items:
+            return
+        if self.__free:
+            slot = self.__free.pop()
+            self.__keys[slot] = k
+        else:
+            slot = len(self.__keys)
+            self.__keys.append(k)
+        self.__slots[k] = slot
+        self.__items[k] = items
+        for item in items:
+            insort(self.__arrays.setdefault(item, array("I")), slot)
+
+    def discard(self, k):
+        """Forget the object stored as k."""
+        items = self.__items.pop(k, None)
+        if items is None:
+            return
+        slot = self.__slots.pop(k)
+        for item in items:
+            slots = self.__arrays[item]
+            del slots[bisect_left(slots, slot)]
+            if not slots:
+                del self.__arrays[item]
+        self.__keys[slot] = None
+        self.__free.append(slot)
+
+    def rebuild(self, objs):
+        """Index every object of the dict objs from scratch."""
+        self.__slots.clear()
+        self.__keys = []
+        self.__free = []
+        self.__items.clear()
+        lists = {}
+        for k, obj in objs.items():
+            items = list_items(getattr(obj, self.__attr, None))
+            if items:
+                self.__slots[k] = len(self.__keys)
+                self.__items[k] = items
+                for item in items:
+                    lists.setdefault(item, []).append(len(self.__keys))
+                self.__keys.append(k)
+        self.__arrays = {item: array("I", slots)
+                         for item, slots in lists.items()}
+
+    def having(self, items):
+        """Return the keys of the objects holding every one of items."""
+        items = set(items)
+        if not items:
+            return [k for k in self.__keys if k is not None]
+        arrays = sorted((self.__arrays.get(item, ()) for item in items),
+                        key=len)
+        found = arrays[0]
+        for slots in arrays[1:]:
+            if not found:
+                break
+            if len(found) * max(len(slots), 2).bit_length() < len(slots):
+                found = [slot for slot in found
+                         if self.__contains(slots, slot)]
+            else:
+                within = set(slots)
+                found = [slot for slot in found if slot in within]
+        return [self.__keys[slot] for slot in found]
+
+    @staticmethod
+    def __contains(slots, slot):
+        """Return True if the sorted array slots holds slot."""
+        i = bisect_left(slots, slot)
+        return i < len(slots) and slots[i] == slot
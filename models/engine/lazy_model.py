@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+"""Defines the LazyModel class."""
+import json
+import models
+from models.base_model import classes
+from models.engine import binary_format
+
+
+class LazyModel:
+    """Stands in for a stored model until the model is actually used.
+
+    A LazyModel keeps the record read from the storage file (its JSON
+    text, binary body or a dict) and only builds the real instance the
+    first time an attribute is read or set, after which it forwards
+    everything to that instance and asks the storage to keep it instead.
+    """
+    __slots__ = ("_key", "_record", "_obj")
+
+    def __init__(self, key, record):
+        """Initialize a LazyModel.
+
+        Args:
+            key (str): the storage key, <class name>.<id>.
+            record (str, bytes or dict): the stored JSON text, binary
+                body or dictionary.
+        """
+        object.__setattr__(self, "_key", key)
+        object.__setattr__(self, "_record", record)
+        object.__setattr__(self, "_obj", None)
+
+    @property
+    def __class__(self):
+        """Return the model class, so isinstance() sees the real type."""
+        return classes[self._key.split(".")[0]]
+
+    def materialize(self):
+        """Return the real instance, building it on first use."""
+        if self._obj is None:
+            record = self._record
+            if isinstance(record, str):
+                record = json.loads(record)
+            elif isinstance(record, bytes):
+                record = binary_format.decode(self._key.split(".")[0],
+                                              record)
+            obj = self.__class__(**record)
+            object.__setattr__(self, "_obj", obj)
+            object.__setattr__(self, "_record", None)
+            models.storage.replace(self, obj)
+        return self._obj
+
+    def __getattr__(self, name):
+        """Read an attribute of the real instance."""
+        return getattr(self.materialize(), name)
+
+    def __setattr__(self, name, value):
+        """Set an attribute on the real instance."""
+        setattr(self.materialize(), name, value)
+
+    def __delattr__(self, name):
+        """Delete an attribute of the real instance."""
+        delattr(self.materialize(), name)
+
+    def __str__(self):
+        """Return the string representation of the real instance."""
+        return str(self.materialize())
+
+    def __repr__(self):
+        """Return the repr of the real instance."""
+        return repr(self.materialize())
@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+"""Defines the RWLock class."""
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+    """A many-readers/one-writer lock.
+
+    Used directly as a context manager the lock is held exclusively, like
+    a threading.RLock: the writer may re-enter it and may also take the
+    shared side.  read() holds it shared with other readers.  Waiting
+    writers go first, so a stream of readers can't starve them; a reader
+    must therefore not take read() again while it already holds it.
+    """
+
+    def __init__(self):
+        """Initialize an RWLock."""
+        self.__cond = threading.Condition(threading.Lock())
+        self.__readers = 0
+        self.__writer = None
+        self.__depth = 0
+        self.__waiting = 0
+
+    def __enter__(self):
+        """Take the lock exclusively."""
+        me = threading.get_ident()
+        with self.__cond:
+            if self.__writer == me:
+                self.__depth += 1
+                return self
+            self.__waiting += 1
+            while self.__writer is not None or self.__readers:
+                self.__cond.wait()
+            self.__waiting -= 1
+            self.__writer = me
+            self.__depth = 1
+        return self
+
+    def __exit__(self, *exc):
+        """Release the exclusive lock."""
+        with self.__cond:
+            self.__depth -= 1
+            if not self.__depth:
+                self.__writer = None
+                self.__cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        """Hold the lock shared for the duration of a with block."""
+        if self.__writer == threading.get_ident():
+            yield self
+            return
+        with self.__cond:
+            while self.__writer is not None or self.__waiting:
+                self.__cond.wait()
+            self.__readers += 1
+        try:
+            yield self
+        finally:
+            with self.__cond:
+                self.__readers -= 1
+                if not self.__readers:
+                    self.__cond.notify_all()
@@ -0,0 +1,536 @@
+#!/usr/bin/python3
+"""Defines a new class called SQLiteStorage."""
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from itertools import islice, takewhile
+from models.base_model import classes, from_dict
+from models.engine import columns
+from models.engine.columns import ColumnStore
+from models.engine.indexes import ListIndex, SpatialIndex, TextIndex
+from models.engine.transaction import Transaction
+
+
+class SQLiteStorage:
+    """Stores instances in a SQLite database, one table per class.
+
+    It offers the interface of FileStorage: objects are kept in memory
+    once reloaded, also by class so that all(cls) and count(cls) never
+    look at the objects of other classes, and save() only writes the
+    rows of the objects created, updated or deleted since the previous
+    save, in a single transaction.  Each table has the id as primary
+    key, created_at, updated_at, one indexed column per declared
+    <name>_id field (e.g. City.state_id, Place.city_id, Review.place_id)
+    or attribute listed in the model's _indexes (User.email) or _ranges
+    (Place.price_by_night, with NUMERIC affinity), and the whole
+    to_dict() record as JSON in data; find() and find_range() query
+    those columns.  The *_id columns aren't declared as FOREIGN KEY
+    constraints since the console lets them point anywhere.
+
+    find_within() and find_near() read a SpatialIndex, search() a
+    TextIndex, find_containing() a ListIndex and aggregate() a
+    ColumnStore (with NumPy), kept in memory per class, built on first
+    use and updated by new(), touch() and delete().
+
+    transaction() works as in FileStorage: save() calls in the block are
+    deferred to its end, and if it raises the objects are put back.
+    """
+
+    def __init__(self, path="hbnb.db"):
+        """Initialize a SQLiteStorage.
+
+        Args:
+            path (str): the path of the database file.
+        """
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        self.__db.execute("PRAGMA journal_mode=WAL")
+        self.__lock = threading.RLock()
+        self.__objects = {}
+        self.__by_class = {}
+        self.__changed = set()
+        self.__tables = {}
+        self.__indexes = {}
+        self.__version = None
+        self.__generation = 0
+        self.__tx = Transaction()
+
+    def all(self, cls=None):
+        """Returns a copy of the stored objects, or of the objects of cls.
+
+        Args:
+            cls: a model class or class name.
+        """
+        with self.__lock:
+            if cls is None:
+                return dict(self.__objects)
+            name = cls if isinstance(cls, str) else cls.__name__
+            return dict(self.__by_class.get(name, {}))
+
+    def get(self, cls, id):
+        """Returns the object of class cls with the given id, or None."""
+        name = cls if isinstance(cls, str) else cls.__name__
+        return self.__objects.get("{}.{}".format(name, id))
+
+    def find(self, cls, **equals):
+        """Returns the objects of cls whose attributes equal equals.
+
+        An indexed column narrows the candidates to its matching rows
+        plus the objects changed since the last save; without one, every
+        object of cls is compared.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        indexed = [attr for attr, value in equals.items()
+                   if attr in self.__table(name)[3:-1] and
+                   isinstance(value, (str, int, float))]
+        with self.__lock:
+            if indexed:
+                keys = {"{}.{}".format(name, row[0]) for row in
+                        self.__db.execute(
+                            'SELECT id FROM "{}" WHERE {} = ?'.format(
+                                name, indexed[0]), (equals[indexed[0]],))}
+                keys.update(k for k in self.__changed
+                            if k.startswith(name + "."))
+                candidates = [self.__objects[k] for k in keys
+                              if k in self.__objects]
+            else:
+                candidates = list(self.all(name).values())
+        return [obj for obj in candidates
+                if all(getattr(obj, attr, None) == value
+                       for attr, value in equals.items())]
+
+    def group(self, cls, attr, values):
+        """Returns the objects of cls whose attr equals each of values,
+        as a dict of lists by value like FileStorage.group().
+
+        An indexed column is read with one query per 500 values, plus
+        the objects changed since the last save.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        prefix = name + "."
+        groups = {value: [] for value in values}
+        with self.__lock:
+            if attr in self.__table(name)[3:-1]:
+                keys = {k for k in self.__changed if k.startswith(prefix)}
+                wanted = [value for value in groups
+                          if isinstance(value, (str, int, float))]
+                for i in range(0, len(wanted), 500):
+                    chunk = wanted[i:i + 500]
+                    keys.update(prefix + row[0] for row in self.__db.execute(
+                        'SELECT id FROM "{}" WHERE {} IN ({})'.format(
+                            name, attr, ", ".join("?" * len(chunk))),
+                        chunk))
+                candidates = [self.__objects[k] for k in keys
+                              if k in self.__objects]
+            else:
+                candidates = list(self.all(name).values())
+        for obj in candidates:
+            try:
+                found = groups.get(getattr(obj, attr, None))
+            except TypeError:
+                continue
+            if found is not None:
+                found.append(obj)
+        return groups
+
+    def find_range(self, cls, attr, lo=None, hi=None, reverse=False,
+                   limit=None):
+        """Returns the objects of cls whose attr is within [lo, hi].
+
+        They are ordered by attr (then key) like in FileStorage.  A
+        column from _ranges narrows the candidates to its rows in range
+        plus the objects changed since the last save; without one, every
+        object of cls is compared.
+        """
+        name = cls if isinstance(cls, str) else cls.__name__
+        prefix = name + "."
+        with self.__lock:
+            if attr in getattr(classes[name], "_ranges", ()) and \
+                    attr in self.__table(name):
+                changed = {k for k in self.__changed if k.startswith(prefix)}
+                where, args = ["typeof({}) IN ('integer', 'real')"
+                               .format(attr)], []
+                if lo is not None:
+                    where.append("{} >= ?".format(attr))
+                    args.append(lo)
+                if hi is not None:
+                    where.append("{} <= ?".format(attr))
+                    args.append(hi)
+                query = 'SELECT id FROM "{}" WHERE {} ORDER BY {} {} ' \
+                    'LIMIT ?'.format(name, " AND ".join(where), attr,
+                                     "DESC" if reverse else "ASC")
+                args.append(-1 if limit is None else limit + len(changed))
+                keys = {prefix + row[0]
+                        for row in self.__db.execute(query, args)}
+                keys.update(changed)
+                candidates = {k: self.__objects[k] for k in keys
+                              if k in self.__objects}
+            else:
+                candidates = self.all(name)
+        found = []
+        for k, obj in candidates.items():
+            value = getattr(obj, attr, None)
+            if (isinstance(value, (int, float)) and
+                    not isinstance(value, bool) and value == value and
+                    (lo is None or value >= lo) and
+                    (hi is None or value <= hi)):
+                found.append((value, k, obj))
+        found.sort(key=lambda item: item[:2], reverse=reverse)
+        return [obj for value, k, obj in found[:limit]]
+
+    def find_within(self, cls, south, west, north, east):
+        """Returns the objects of cls inside a latitude/longitude box."""
+        name = cls if isinstance(cls, str) else cls.__name__
+        with self.__lock:
+            index = self.__memory_index(name, SpatialIndex, getattr(
+                classes[name], "_geo", ("latitude", "longitude")))
+            return [self.__objects[k]
+                    for k in index.within(south, west, north, east)]
+
+    def find_near(self, cls, latitude, longitude, km=None, limit=None):
+        """Returns the objects of cls by increasing distance from a point,
+        within km of it and at most limit of them when given."""
+        name = cls if isinstance(cls, str) else cls.__name__
+        with self.__lock:
+            found = self.__memory_index(name, SpatialIndex, getattr(
+                classes[name], "_geo", ("latitude", "longitude"))).nearest(
+                latitude, longitude)
+            if km is not None:
+                found = takewhile(lambda pair: pair[0] <= km, found)
+            return [self.__objects[k]
+                    for distance, k in islice(found, limit)]
+
+    def search(self, cls, query, any=False, limit=None):
+        """Returns the objects of cls whose text holds the words of query,
+        best matches first, as FileStorage.search() does."""
+        name = cls if isinstance(cls, str) else cls.__name__
+        with self.__lock:
+            index = self.__memory_index(name, TextIndex,
+                                        getattr(classes[name], "_text", None))
+            return [self.__objects[k]
+                    for score, k in index.search(query, any, limit)]
+
+    def find_containing(self, cls, attr, values):
+        """Returns the objects of cls whose list attr holds all of values,
+        as FileStorage.find_containing() does."""
+        name = cls if isinstance(cls, str) else cls.__name__
+        values = [str(value) for value in values]
+        with self.__lock:
+            if not values:
+                return list(self.all(name).values())
+            index = self.__memory_index(name, ListIndex, attr)
+            return [self.__objects[k] for k in index.having(values)]
+
+    def aggregate(self, cls, column, func="mean", by=None, where=None):
+        """Returns count, sum, mean, min or max of a numeric attribute,
+        as FileStorage.aggregate() does."""
+        name = cls if isinstance(cls, str) else cls.__name__
+        model = classes.get(name)
+        attrs = (getattr(model, "_ranges", ()), getattr(model, "_indexes", ()))
+        with self.__lock:
+            if columns.np is not None and \
+                    columns.covers(attrs, column, by, where):
+                store = self.__memory_index(name, ColumnStore, attrs)
+                return store.aggregate(column, func, by, where)
+            return columns.aggregate(self.all(name).values(), column, func,
+                                     by, where)
+
+    def __memory_index(self, name, kind, attrs):
+        """Returns the kind index of attrs of class name, built if needed."""
+        indexes = self.__indexes.setdefault(name, {})
+        index = indexes.get((kind, attrs))
+        if index is None:
+            index = kind(attrs)
+            index.rebuild(self.all(name))
+            indexes[kind, attrs] = index
+        return index
+
+    def __reindex(self, k):
+        """Updates the in-memory indexes of the class of k, if built."""
+        obj = self.__objects.get(k)
+        for index in self.__indexes.get(k.split(".")[0], {}).values():
+            if obj is None:
+                index.discard(k)
+            else:
+                index.update(k, obj)
+
+    def count(self, cls=None):
+        """Returns the number of objects stored, or of objects of cls."""
+        if cls is None:
+            return len(self.__objects)
+        name = cls if isinstance(cls, str) else cls.__name__
+        return len(self.__by_class.get(name, {}))
+
+    def __put(self, k, obj):
+        """Stores obj under k, in the dict of its class too."""
+        self.__objects[k] = obj
+        self.__by_class.setdefault(k.split(".")[0], {})[k] = obj
+
+    def __pop(self, k):
+        """Removes the object stored under k, if any."""
+        self.__objects.pop(k, None)
+        self.__by_class.get(k.split(".")[0], {}).pop(k, None)
+
+    def new(self, obj):
+        """Stores obj and marks it as changed since the last save."""
+        k = "{}.{}".format(obj.__class__.__name__, obj.id)
+        with self.__lock:
+            self.__remember(k)
+            self.__put(k, obj)
+            self.__changed.add(k)
+            self.__reindex(k)
+
+    def bulk_new(self, objs, cls=None, index=True):
+        """Stores many objects in one pass and returns them as a list.
+
+        Args:
+            objs: model instances, or to_dict() style dicts that are
+                built with from_dict().
+            cls: the class (or class name) of dicts without __class__.
+            index (bool): accepted for FileStorage compatibility; the
+                database indexes are kept by SQLite.
+        """
+        built = [from_dict(obj, cls) if isinstance(obj, dict) else obj
+                 for obj in objs]
+        with self.__lock:
+            for obj in built:
+                k = "{}.{}".format(obj.__class__.__name__, obj.id)
+                self.__remember(k)
+                self.__put(k, obj)
+                self.__changed.add(k)
+                self.__reindex(k)
+        return built
+
+    def bulk_load(self, objs, cls=None, index=True):
+        """Stores many objects like bulk_new(), then saves once."""
+        built = self.bulk_new(objs, cls, index)
+        self.save()
+        return built
+
+    def touch(self, obj):
+        """Marks obj as changed since the last save if it is stored."""
+        k = "{}.{}".format(obj.__class__.__name__, getattr(obj, "id", None))
+        if self.__objects.get(k) is obj:
+            with self.__lock:
+                self.__changed.add(k)
+                self.__reindex(k)
+
+    def delete(self, obj=None):
+        """Deletes obj from the stored objects if it's inside."""
+        if obj is None:
+            return
+        k = "{}.{}".format(obj.__class__.__name__, obj.id)
+        with self.__lock:
+            if k in self.__objects:
+                self.__remember(k)
+                self.__pop(k)
+                self.__changed.add(k)
+                self.__reindex(k)
+
+    def remember(self, obj):
+        """Keeps the state of obj for a rollback, before it is changed."""
+        undo = self.__tx.undo
+        if undo is None:
+            return
+        k = "{}.{}".format(obj.__class__.__name__, getattr(obj, "id", None))
+        if k not in undo and self.__objects.get(k) is obj:
+            with self.__lock:
+                self.__remember(k)
+
+    def __remember(self, k):
+        """Keeps the object stored under k, if any, for a rollback, with
+        its record and whether it was already changed."""
+        undo = self.__tx.undo
+        if undo is not None and k not in undo:
+            obj = self.__objects.get(k)
+            undo[k] = (obj, None if obj is None else obj.to_dict(),
+                       k in self.__changed)
+
+    @contextmanager
+    def transaction(self):
+        """Groups the changes of a with block into a single save, as
+        FileStorage.transaction() does, per thread."""
+        tx = self.__tx
+        with self.__lock:
+            if not tx.depth:
+                tx.undo = {}
+                tx.save_wanted = False
+                tx.generation = self.__generation
+            tx.depth += 1
+        try:
+            yield self
+        except BaseException:
+            with self.__lock:
+                tx.depth -= 1
+                written = not tx.depth and self.__rollback()
+            if written:
+                self.save()
+            raise
+        with self.__lock:
+            tx.depth -= 1
+            if tx.depth:
+                return
+            tx.undo = None
+            save_wanted = tx.save_wanted
+        if save_wanted:
+            self.save()
+
+    def __rollback(self):
+        """Puts back the objects kept by __remember(), and returns True
+        if another thread saved since the transaction began."""
+        undo, self.__tx.undo = self.__tx.undo, None
+        written = self.__generation != self.__tx.generation
+        for k, (obj, record, changed) in undo.items():
+            if record is None:
+                self.__pop(k)
+            else:
+                obj.restore(record)
+                self.__put(k, obj)
+            self.__reindex(k)
+            if changed or written:
+                self.__changed.add(k)
+            else:
+                self.__changed.discard(k)
+        return written
+
+    def save(self):
+        """Writes the rows of the objects changed since the last save."""
+        if self.__tx.undo is not None:
+            self.__tx.save_wanted = True
+            return
+        with self.__lock:
+            rows, gone = {}, {}
+            for k in self.__changed:
+                name, obj_id = k.split(".", 1)
+                obj = self.__objects.get(k)
+                if obj is None:
+                    self.__table(name)
+                    gone.setdefault(name, []).append((obj_id,))
+                    continue
+                record = obj.to_dict()
+                columns = self.__table(name)
+                rows.setdefault(name, []).append(
+                    [record[c] for c in columns[:3]] +
+                    [getattr(obj, c, None) for c in columns[3:-1]] +
+                    [json.dumps(record)])
+            with self.__db:
+                for name, ids in gone.items():
+                    self.__db.executemany('DELETE FROM "{}" WHERE id = ?'
+                                          .format(name), ids)
+                for name, values in rows.items():
+                    columns = self.__table(name)
+                    self.__db.executemany(
+                        'INSERT OR REPLACE INTO "{}" ({}) VALUES ({})'.format(
+                            name, ", ".join(columns),
+                            ", ".join("?" * len(columns))), values)
+            self.__changed.clear()
+            self.__generation += 1
+
+    def flush(self):
+        """Does nothing; save() writes right away."""
+
+    def reload(self):
+        """Loads every row of every class table."""
+        with self.__lock:
+            self.__objects.clear()
+            self.__by_class.clear()
+            self.__changed.clear()
+            self.__indexes.clear()
+            self.__load()
+
+    def refresh(self):
+        """Reloads the objects if another connection wrote since.
+
+        Unsaved changes are kept.
+
+        Returns:
+            bool: True if the objects were reloaded.
+        """
+        if self.__data_version() == self.__version:
+            return False
+        with self.__lock:
+            pending = {k: self.__objects.get(k) for k in self.__changed}
+            self.__objects.clear()
+            self.__by_class.clear()
+            self.__indexes.clear()
+            self.__load()
+            for k, obj in pending.items():
+                if obj is None:
+                    self.__pop(k)
+                else:
+                    self.__put(k, obj)
+            self.__changed.update(pending)
+        return True
+
+    def close(self):
+        """Closes the database connection."""
+        self.__db.close()
+
+    def __load(self):
+        """Adds the objects of every class table to the stored objects."""
+        self.__version = self.__data_version()
+        for name in list(classes):
+            self.__table(name)
+            for data, in self.__db.execute(
+                    'SELECT data FROM "{}"'.format(name)):
+                record = json.loads(data)
+                obj = classes[name](**record)
+                self.__put("{}.{}".format(name, obj.id), obj)
+
+    def __data_version(self):
+        """Returns the counter SQLite bumps when another connection writes."""
+        return self.__db.execute("PRAGMA data_version").fetchone()[0]
+
+    def __table(self, name):
+        """Creates the table of class name if needed; returns its columns."""
+        columns = self.__tables.get(name)
+        if columns is not None:
+            return columns
+        keys = self.__indexed_fields(classes[name])
+        columns = ["id", "created_at", "updated_at"] + keys + ["data"]
+        with self.__db:
+            self.__db.execute(
+                'CREATE TABLE IF NOT EXISTS "{}" (id TEXT PRIMARY KEY, '
+                'created_at TEXT, updated_at TEXT, data TEXT)'.format(name))
+            existing = {row[1] for row in self.__db.execute(
+                'PRAGMA table_info("{}")'.format(name))}
+            ranges = getattr(classes[name], "_ranges", ())
+            blank = from_dict({}, name)
+            for key in keys:
+                if key not in existing:
+                    self.__db.execute(
+                        'ALTER TABLE "{}" ADD COLUMN {} {}'.format(
+                            name, key,
+                            "NUMERIC" if key in ranges else "TEXT"))
+                    # to_dict() leaves out fields still at their default
+                    self.__db.execute(
+                        'UPDATE "{0}" SET {1} = CASE WHEN json_type(data, '
+                        '\'$.{1}\') IS NULL THEN ? ELSE json_extract(data, '
+                        '\'$.{1}\') END'.format(name, key),
+                        (getattr(blank, key, None),))
+                self.__db.execute(
+                    'CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" ({1})'
+                    .format(name, key))
+        self.__tables[name] = columns
+        return columns
+
+    @staticmethod
+    def __indexed_fields(cls):
+        """Returns the fields of cls that get an indexed column.
+
+        Those are the declared <name>_id string fields, then the other
+        attributes listed in the _indexes and _ranges of cls.
+        """
+        keys = []
+        for klass in reversed(cls.__mro__):
+            fields = dict(vars(klass).get("_defaults", {}))
+            fields.update(vars(klass))
+            for name, value in fields.items():
+                if (name.endswith("_id") and isinstance(value, str) and
+                        name not in keys):
+                    keys.append(name)
+        for name in (getattr(cls, "_indexes", ()) +
+                     getattr(cls, "_ranges", ())):
+            if name not in keys:
+                keys.append(name)
+        return keys
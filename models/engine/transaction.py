@@ -0,0 +1,18 @@
+#!/usr/bin/python3
+"""Defines the Transaction class."""
+import threading
+
+
+class Transaction(threading.local):
+    """The state of the transaction() block of the current thread.
+
+    Each thread sees its own attributes, so a thread's changes and
+    saves are never taken into the block of another: undo holds the
+    objects (and their to_dict() records, None for objects created in
+    the block) to put back on a rollback, depth the nesting of the
+    blocks and save_wanted whether save() was called inside them.
+    """
+    undo = None
+    depth = 0
+    save_wanted = False
+    generation = None
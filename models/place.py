@@ -2,6 +2,7 @@
 """Place module"""
 
 from models.base_model import BaseModel
+from models.relation import Relation
 
 
 class Place(BaseModel):
@@ -32,3 +33,13 @@ class Place(BaseModel):
     latitude = 0.0
     longitude = 0.0
     amenity_ids = []
+    _indexes = ("city_id", "user_id")
+    _ranges = ("number_rooms", "number_bathrooms", "max_guest",
+               "price_by_night", "latitude", "longitude")
+    _geo = ("latitude", "longitude")
+    _text = ("name", "description")
+    _lists = ("amenity_ids",)
+    city = Relation("City", on="city_id")
+    user = Relation("User", on="user_id")
+    reviews = Relation("Review", by="place_id")
+    amenities = Relation("Amenity", on="amenity_ids")
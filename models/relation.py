@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+"""Defines the Relation class."""
+import models
+from models.base_model import classes
+from models.engine.indexes import list_items
+
+
+class Relation:
+    """A read-only model attribute holding related stored objects.
+
+    Relation("City", by="state_id") on State gives state.cities, the
+    cities whose state_id is the state's id; the storage finds them in
+    its index on City.state_id, so only the cities returned are read.
+    Relation("State", on="state_id") on City gives city.state, the state
+    whose id is city.state_id (None if it isn't stored), and on a list
+    of ids (Place.amenity_ids) the list of the objects stored.
+
+    prefetch() resolves the relation for many objects at once, e.g.
+    State.cities.prefetch(states).
+    """
+
+    def __init__(self, cls, by=None, on=None):
+        """Initialize a Relation.
+
+        Args:
+            cls (str): the name of the related class.
+            by (str): the attribute of cls holding the id of the owner.
+            on (str): the attribute of the owner holding the id (or list
+                of ids) of the related object(s).
+        """
+        self.cls = cls
+        self.by = by
+        self.on = on
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        """Remember the name of the attribute."""
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        """Return the objects related to obj, or self from the class."""
+        if obj is None:
+            return self
+        return self.prefetch([obj])[obj.id]
+
+    def prefetch(self, objs):
+        """Return a dict of the related object(s) of each of objs by id.
+
+        The related objects of all objs are looked up together, with a
+        single storage.group() for a relation by an attribute.
+        """
+        storage = models.storage
+        objs = list(objs)
+        if self.on is None:
+            if self.by in getattr(classes[self.cls], "_lists", ()):
+                return {obj.id: storage.find_containing(self.cls, self.by,
+                                                        [obj.id])
+                        for obj in objs}
+            return storage.group(self.cls, self.by,
+                                 [obj.id for obj in objs])
+        found = {}
+        for obj in objs:
+            value = getattr(obj, self.on, None)
+            if isinstance(value, str) and not value.startswith("["):
+                found[obj.id] = storage.get(self.cls, value)
+            else:
+                related = (storage.get(self.cls, id)
+                           for id in list_items(value))
+                found[obj.id] = [rel for rel in related if rel is not None]
+        return found
@@ -2,6 +2,7 @@
 """Review child class"""
 
 from models.base_model import BaseModel
+from models.relation import Relation
 
 
 class Review(BaseModel):
@@ -16,3 +17,7 @@ class Review(BaseModel):
     place_id = ""
     user_id = ""
     text = ""
+    _indexes = ("place_id", "user_id")
+    _text = ("text",)
+    place = Relation("Place", on="place_id")
+    user = Relation("User", on="user_id")
@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 """Defines the child state"""
 from models.base_model import BaseModel
+from models.relation import Relation
 
 
 class State(BaseModel):
@@ -11,3 +12,4 @@ class State(BaseModel):
         name (str): Empty string.
     """
     name = ""
+    cities = Relation("City", by="state_id")
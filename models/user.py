@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 """Defines the User class."""
 from models.base_model import BaseModel
+from models.relation import Relation
 
 
 class User(BaseModel):
@@ -9,3 +10,6 @@ class User(BaseModel):
     password = ""
     first_name = ""
     last_name = ""
+    _indexes = ("email",)
+    places = Relation("Place", by="user_id")
+    reviews = Relation("Review", by="user_id")
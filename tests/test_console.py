@@ -10,12 +10,17 @@ Unittest classes:
     TestHBNBCommand_all
     TestHBNBCommand_destroy
     TestHBNBCommand_update
+    TestHBNBCommand_count
+    TestHBNBCommand_geo
+    TestHBNBCommand_search
 """
+import ast
 import os
 import sys
 import unittest
 from models import storage
 from models.engine.file_storage import FileStorage
+from models.engine.lazy_model import LazyModel
 from console import HBNBCommand
 from io import StringIO
 from unittest.mock import patch
@@ -99,7 +104,8 @@ class TestHBNBCommand_help(unittest.TestCase):
     def test_help(self):
         h = ("Documented commands (type help <topic>):\n"
              "========================================\n"
-             "EOF  all  count  create  destroy  help  quit  show  update")
+             "EOF  all  count  create  destroy  help  near  nearest  quit  "
+             "search  show  update  within")
         with patch("sys.stdout", new=StringIO()) as output:
             self.assertFalse(HBNBCommand().onecmd("help"))
             self.assertEqual(h, output.getvalue().strip())
@@ -161,6 +167,14 @@ class TestHBNBCommand_create(unittest.TestCase):
             self.assertFalse(HBNBCommand().onecmd("BaseModel.create()"))
             self.assertEqual(correct, output.getvalue().strip())
 
+    def test_create_in_transaction(self):
+        with storage.transaction():
+            with patch("sys.stdout", new=StringIO()) as output:
+                self.assertFalse(HBNBCommand().onecmd("create User"))
+                self.assertFalse(HBNBCommand().onecmd("create Place"))
+            self.assertFalse(os.path.exists("file.json"))
+        self.assertTrue(os.path.exists("file.json"))
+
     def test_create_object(self):
         with patch("sys.stdout", new=StringIO()) as output:
             self.assertFalse(HBNBCommand().onecmd("create BaseModel"))
@@ -1500,6 +1514,42 @@ class TestHBNBCommand_update(unittest.TestCase):
         test_dict = storage.all()["Place.{}".format(testId)].__dict__
         self.assertEqual(9.8, test_dict["latitude"])
 
+    def test_update_list_attr(self):
+        with patch("sys.stdout", new=StringIO()) as output:
+            HBNBCommand().onecmd("create Place")
+            testId = output.getvalue().strip()
+        testCmd = 'update Place {} amenity_ids ["wifi", "tv"]'.format(testId)
+        self.assertFalse(HBNBCommand().onecmd(testCmd))
+        place = storage.get("Place", testId)
+        self.assertEqual(["wifi", "tv"], place.amenity_ids)
+        self.assertIn(place, storage.find_containing("Place", "amenity_ids",
+                                                     ["tv", "wifi"]))
+        testCmd = 'Place.update("{}", "amenity_ids", ["tv"])'.format(testId)
+        self.assertFalse(HBNBCommand().onecmd(testCmd))
+        self.assertEqual(["tv"], place.amenity_ids)
+        self.assertNotIn(place, storage.find_containing(
+            "Place", "amenity_ids", ["wifi"]))
+
+    def test_update_list_attr_lazy(self):
+        with patch("sys.stdout", new=StringIO()) as output:
+            HBNBCommand().onecmd("create Place")
+            testId = output.getvalue().strip()
+        lazy = FileStorage(lazy=True)
+        FileStorage._FileStorage__objects = {}
+        lazy.reload()
+        self.assertIsInstance(storage.get("Place", testId), LazyModel)
+        testCmd = 'update Place {} amenity_ids ["a", "b"]'.format(testId)
+        self.assertFalse(HBNBCommand().onecmd(testCmd))
+        self.assertEqual(["a", "b"], storage.get("Place", testId).amenity_ids)
+
+    def test_update_brackets_other_attr(self):
+        with patch("sys.stdout", new=StringIO()) as output:
+            HBNBCommand().onecmd("create User")
+            testId = output.getvalue().strip()
+        testCmd = "update User {} first_name [Bob]".format(testId)
+        self.assertFalse(HBNBCommand().onecmd(testCmd))
+        self.assertEqual("[Bob]", storage.get("User", testId).first_name)
+
 
 class TestHBNBCommand_count(unittest.TestCase):
     """Unittests for testing count method of HBNB comand interpreter."""
@@ -1566,5 +1616,118 @@ class TestHBNBCommand_count(unittest.TestCase):
             self.assertEqual("1", output.getvalue().strip())
 
 
+class TestHBNBCommand_geo(unittest.TestCase):
+    """Unittests for the within, near and nearest commands."""
+
+    def setUp(self):
+        try:
+            os.rename("file.json", "tmp")
+        except IOError:
+            pass
+        FileStorage._FileStorage__objects = {}
+        self.ids = []
+        for latitude, longitude in ((48.85, 2.35), (48.86, 2.34),
+                                    (51.5, -0.12), (40.7, -74.0)):
+            with patch("sys.stdout", new=StringIO()) as output:
+                HBNBCommand().onecmd("create Place")
+            self.ids.append(output.getvalue().strip())
+            place = storage.get("Place", self.ids[-1])
+            place.latitude = latitude
+            place.longitude = longitude
+
+    def tearDown(self):
+        try:
+            os.remove("file.json")
+        except IOError:
+            pass
+        try:
+            os.rename("tmp", "file.json")
+        except IOError:
+            pass
+
+    def found(self, line):
+        """Runs line and returns the ids of the printed instances."""
+        with patch("sys.stdout", new=StringIO()) as output:
+            self.assertFalse(HBNBCommand().onecmd(line))
+        return [obj.split("(")[1].split(")")[0]
+                for obj in ast.literal_eval(output.getvalue())]
+
+    def test_within(self):
+        self.assertCountEqual(self.found("within Place 45 -5 55 5"),
+                              self.ids[:3])
+        self.assertEqual(self.found("within Place 40 170 50 -70"),
+                         [self.ids[3]])
+
+    def test_near(self):
+        self.assertEqual(self.found("near Place 48.859 2.341 10"),
+                         [self.ids[1], self.ids[0]])
+        self.assertEqual(self.found("near Place 0 0 100"), [])
+
+    def test_nearest(self):
+        self.assertEqual(self.found("nearest Place 51 0 3"),
+                         [self.ids[2], self.ids[1], self.ids[0]])
+
+    def test_errors(self):
+        for line, error in (("near", "** class name missing **"),
+                            ("near MyModel 1 2 3",
+                             "** class doesn't exist **"),
+                            ("nearest Place 1 2", "** 3 numbers expected **"),
+                            ("within Place 1 2 3 x", "** invalid number **")):
+            with patch("sys.stdout", new=StringIO()) as output:
+                self.assertFalse(HBNBCommand().onecmd(line))
+                self.assertEqual(error, output.getvalue().strip())
+
+
+class TestHBNBCommand_search(unittest.TestCase):
+    """Unittests for the search command."""
+
+    def setUp(self):
+        try:
+            os.rename("file.json", "tmp")
+        except IOError:
+            pass
+        FileStorage._FileStorage__objects = {}
+        self.ids = []
+        for text in ("Great view, great host", "Noisy but great food",
+                     "Quiet and clean"):
+            with patch("sys.stdout", new=StringIO()) as output:
+                HBNBCommand().onecmd("create Review")
+            self.ids.append(output.getvalue().strip())
+            storage.get("Review", self.ids[-1]).text = text
+
+    def tearDown(self):
+        try:
+            os.remove("file.json")
+        except IOError:
+            pass
+        try:
+            os.rename("tmp", "file.json")
+        except IOError:
+            pass
+
+    def found(self, line):
+        """Runs line and returns the ids of the printed instances."""
+        with patch("sys.stdout", new=StringIO()) as output:
+            self.assertFalse(HBNBCommand().onecmd(line))
+        return [obj.split("(")[1].split(")")[0]
+                for obj in ast.literal_eval(output.getvalue())]
+
+    def test_search(self):
+        self.assertEqual(self.found("search Review great"), self.ids[:2])
+        self.assertEqual(self.found("search Review Great food"),
+                         [self.ids[1]])
+        self.assertEqual(self.found("search Review clean OR noisy"),
+                         [self.ids[2], self.ids[1]])
+        self.assertEqual(self.found("search Review nothing"), [])
+
+    def test_errors(self):
+        for line, error in (("search", "** class name missing **"),
+                            ("search MyModel x", "** class doesn't exist **"),
+                            ("search Review", "** words missing **")):
+            with patch("sys.stdout", new=StringIO()) as output:
+                self.assertFalse(HBNBCommand().onecmd(line))
+                self.assertEqual(error, output.getvalue().strip())
+
+
 if __name__ == "__main__":
     unittest.main()
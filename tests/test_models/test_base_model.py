@@ -1,10 +1,15 @@
 #!/usr/bin/python3
 """ Defines unittests for models/base_model.py. """
 
+import os
+import subprocess
+import sys
 import unittest
 from time import sleep
+from unittest.mock import patch
+import models
 from datetime import datetime
-from models.base_model import BaseModel
+from models.base_model import BaseModel, classes, from_dict
 
 
 class TestBaseModelInit(unittest.TestCase):
@@ -146,6 +151,18 @@ class TestBaseModelInit(unittest.TestCase):
         self.assertEqual(obj.name, "Godfrey")
         self.assertEqual(obj.age, 23)
 
+    def test_save_stores_nothing(self):
+        """Test that save() never adds the instance to the storage"""
+        deleted = BaseModel()
+        models.storage.delete(deleted)
+        built = BaseModel(id="built", created_at="2024-02-11T12:34:56",
+                          updated_at="2024-02-11T12:45:00")
+        with patch.object(models.storage, "save"):
+            deleted.save()
+            built.save()
+        self.assertIsNone(models.storage.get(BaseModel, deleted.id))
+        self.assertIsNone(models.storage.get(BaseModel, "built"))
+
     def test_print_class(self):
         """Test case to check if the class can be printed"""
         instance = BaseModel()
@@ -207,5 +224,99 @@ class TestBaseModelInit(unittest.TestCase):
         self.assertEqual(instance.to_dict(), expected_dict)
 
 
+class TestBaseModelRegistry(unittest.TestCase):
+    def test_models_registered(self):
+        """Verify that every model class is registered by name."""
+        import models.engine.file_storage
+        for name in ("BaseModel", "User", "State", "City",
+                     "Amenity", "Place", "Review"):
+            self.assertEqual(classes[name].__name__, name)
+
+    def test_subclass_registered(self):
+        """Verify that a new subclass registers itself."""
+        class Booking(BaseModel):
+            pass
+        try:
+            self.assertIs(classes["Booking"], Booking)
+        finally:
+            del classes["Booking"]
+
+    def test_from_dict(self):
+        """Verify that from_dict() builds without storing the instance."""
+        obj = from_dict({"__class__": "BaseModel", "name": "x"})
+        self.assertIsInstance(obj, BaseModel)
+        self.assertEqual(obj.name, "x")
+        self.assertIsInstance(obj.created_at, datetime)
+        self.assertNotIn("BaseModel.{}".format(obj.id),
+                         models.storage.all())
+        copy = from_dict(obj.to_dict())
+        self.assertEqual(copy.to_dict(), obj.to_dict())
+        self.assertEqual(from_dict({"id": "1"}, "BaseModel").id, "1")
+
+
+class TestBaseModelCompact(unittest.TestCase):
+    def setUp(self):
+        """Define a model class with compact mode turned on."""
+        self.patcher = patch("models.base_model.COMPACT", True)
+        self.patcher.start()
+
+        class Room(BaseModel):
+            name = ""
+            beds = 0
+        self.Room = Room
+
+    def tearDown(self):
+        for room in list(models.storage.all("Room").values()):
+            models.storage.delete(room)
+        self.patcher.stop()
+        del classes["Room"]
+
+    def test_fields_are_slots(self):
+        """Verify that declared fields are stored in slots."""
+        self.assertEqual(self.Room.__slots__, ("name", "beds"))
+        room = self.Room()
+        room.beds = 2
+        self.assertEqual(room.beds, 2)
+        self.assertNotIn("beds", getattr(room, "__dict__", {}))
+
+    def test_defaults(self):
+        """Verify that unset fields return the declared default."""
+        room = self.Room()
+        self.assertEqual(room.beds, 0)
+        self.assertEqual(room.name, "")
+        with self.assertRaises(AttributeError):
+            room.missing
+
+    def test_to_dict_and_str(self):
+        """Verify that slots and ad-hoc attributes are both reported."""
+        room = self.Room()
+        room.beds = 2
+        room.view = "sea"
+        self.assertEqual(room.view, "sea")
+        d = room.to_dict()
+        self.assertEqual(d["beds"], 2)
+        self.assertEqual(d["view"], "sea")
+        self.assertNotIn("name", d)
+        self.assertIn("'beds': 2", str(room))
+
+    def test_no_instance_dict(self):
+        """Verify that compact instances only get a dict for ad-hoc
+        attributes, and not from to_dict() or str()."""
+        code = ("from models.review import Review\n"
+                "review = Review()\n"
+                "review.to_dict(), str(review)\n"
+                "print(hasattr(review, '__dict__'), review._extra)\n"
+                "review.view = 'sea'\n"
+                "print(review._extra, review.to_dict()['view'])\n"
+                "review.restore(Review().to_dict())\n"
+                "print(review._extra, hasattr(review, 'view'))\n")
+        out = subprocess.check_output(
+            [sys.executable, "-c", code], universal_newlines=True,
+            env=dict(os.environ, HBNB_COMPACT_MODELS="1"))
+        self.assertEqual(out.splitlines(), ["False None",
+                                            "{'view': 'sea'} sea",
+                                            "{} False"])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+""" Defines unittests for models/engine/binary_format.py. """
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from models.engine import binary_format
+from models.place import Place
+
+
+class TestBinaryFormat(unittest.TestCase):
+    def setUp(self):
+        self.record = {
+            'id': 'test_id',
+            'created_at': '2024-02-11T12:34:56.123456',
+            'updated_at': '2024-02-11T12:45:00',
+            'name': 'Loft',
+            'amenity_ids': ['a', 'b'],
+            'price_by_night': 10,
+            '__class__': 'Place'
+        }
+
+    def tearDown(self):
+        for path in ("test.json", "test.bin", "back.json"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def test_encode_decode(self):
+        """Test that a record survives encode() and decode()."""
+        record = binary_format.decode("Place",
+                                      binary_format.encode(self.record))
+        self.assertEqual(record["created_at"],
+                         datetime(2024, 2, 11, 12, 34, 56, 123456))
+        self.assertEqual(record["updated_at"].isoformat(),
+                         self.record["updated_at"])
+        del record["created_at"], record["updated_at"]
+        expected = dict(self.record)
+        del expected["created_at"], expected["updated_at"]
+        self.assertEqual(record, expected)
+
+    def test_encode_keeps_odd_values(self):
+        """Test that values without a native layout are kept as is."""
+        self.record["created_at"] = "2024-02-11T12:34:56+01:00"
+        self.record["id"] = 42
+        record = binary_format.decode("Place",
+                                      binary_format.encode(self.record))
+        self.assertEqual(record["created_at"], "2024-02-11T12:34:56+01:00")
+        self.assertEqual(record["id"], 42)
+
+    def test_encode_is_compact(self):
+        """Test that a body is smaller than the JSON record."""
+        self.assertLess(len(binary_format.encode(self.record)),
+                        len(json.dumps(self.record)))
+
+    def test_write_read(self):
+        """Test that write() and read() keep the items and their order."""
+        items = [("Place", binary_format.encode(self.record)),
+                 ("User", b"x" * 30), ("Place", b"")]
+        f = io.BytesIO()
+        binary_format.write(f, items, index=False)
+        f.seek(0)
+        self.assertEqual(list(binary_format.read(f)), items)
+
+    def test_read_indexed(self):
+        """Test that read() stops at the index of an indexed file."""
+        items = [("Place", binary_format.encode(self.record))]
+        f = io.BytesIO()
+        binary_format.write(f, items)
+        f.seek(0)
+        self.assertEqual(list(binary_format.read(f)), items)
+
+    def test_read_rejects_other_files(self):
+        """Test that read() refuses a file without the magic number."""
+        with self.assertRaises(ValueError):
+            list(binary_format.read(io.BytesIO(b"{}")))
+
+    def test_record_id(self):
+        """Test that record_id() reads the id of a body."""
+        body = binary_format.encode(self.record)
+        self.assertEqual(binary_format.record_id("Place", body), "test_id")
+
+    def test_conversion_is_lossless(self):
+        """Test a JSON to binary to JSON round trip."""
+        place = Place()
+        objects = {"Place.test_id": self.record,
+                   "Place.{}".format(place.id): place.to_dict()}
+        with open("test.json", "w") as f:
+            json.dump(objects, f)
+        binary_format.json_to_binary("test.json", "test.bin")
+        binary_format.binary_to_json("test.bin", "back.json")
+        with open("back.json") as f:
+            self.assertEqual(json.load(f), objects)
+
+    def test_convert_script(self):
+        """Test that convert_snapshot.py converts without reloading the
+        store of the current directory."""
+        with open("test.json", "w") as f:
+            json.dump({"Place.test_id": self.record}, f)
+        script = os.path.abspath("convert_snapshot.py")
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "file.json"), "w") as f:
+                f.write("not a store")
+            for args in (("to-binary", os.path.abspath("test.json"),
+                          os.path.abspath("test.bin")),
+                         ("to-json", os.path.abspath("test.bin"),
+                          os.path.abspath("back.json"))):
+                out = subprocess.run([sys.executable, "-W", "error", script,
+                                      *args], cwd=tmp, capture_output=True,
+                                     universal_newlines=True)
+                self.assertEqual((out.returncode, out.stderr), (0, ""))
+        with open("back.json") as f:
+            self.assertEqual(json.load(f), {"Place.test_id": self.record})
+
+
+class TestMappedSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.records = {}
+        items = []
+        for i in range(200):
+            record = {'id': 'id{}'.format(i),
+                      'created_at': '2024-02-11T12:34:56',
+                      'updated_at': '2024-02-11T12:45:00',
+                      'number': i,
+                      '__class__': 'Place' if i % 2 else 'User'}
+            self.records["{}.id{}".format(record['__class__'], i)] = record
+            items.append((record['__class__'], binary_format.encode(record)))
+        with open("test.bin", "wb") as f:
+            binary_format.write(f, items)
+        self.snapshot = binary_format.MappedSnapshot("test.bin")
+
+    def tearDown(self):
+        self.snapshot.close()
+        os.remove("test.bin")
+
+    def test_len(self):
+        """Test that the snapshot knows its object count."""
+        self.assertEqual(len(self.snapshot), 200)
+
+    def test_get(self):
+        """Test that get() finds every object by key."""
+        for key, record in self.records.items():
+            class_name, body = self.snapshot.get(key)
+            self.assertEqual(class_name, record['__class__'])
+            self.assertEqual(binary_format.decode(class_name,
+                                                  body)['number'],
+                             record['number'])
+
+    def test_get_missing(self):
+        """Test that get() returns None for unknown keys."""
+        self.assertIsNone(self.snapshot.get("Place.id0"))
+        self.assertIsNone(self.snapshot.get("Place.nope"))
+
+    def test_iter(self):
+        """Test that iterating yields every object in file order."""
+        keys = ["{}.{}".format(name, binary_format.record_id(name, body))
+                for name, body in self.snapshot]
+        self.assertEqual(keys, list(self.records))
+
+    def test_unindexed_file(self):
+        """Test that a file without an index is refused."""
+        with open("test.bin", "wb") as f:
+            binary_format.write(f, [], index=False)
+        with self.assertRaises(ValueError):
+            binary_format.MappedSnapshot("test.bin")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+""" Defines unittests for models/engine/columns.py. """
+import random
+import unittest
+from types import SimpleNamespace
+from models.engine import columns
+from models.engine.columns import ColumnStore, aggregate, covers
+
+ATTRS = (("price", "rooms"), ("city_id",))
+
+
+def places():
+    """Returns a dict of test places by key."""
+    return {"Place.1": SimpleNamespace(price=10, rooms=1, city_id="a"),
+            "Place.2": SimpleNamespace(price=30, rooms=2, city_id="a"),
+            "Place.3": SimpleNamespace(price=50.5, rooms=2, city_id="b"),
+            "Place.4": SimpleNamespace(price="?", rooms=3, city_id="b"),
+            "Place.5": SimpleNamespace(price=True, rooms=4, city_id=[]),
+            "Place.6": SimpleNamespace(price=70, rooms=3)}
+
+
+class TestAggregate(unittest.TestCase):
+    def setUp(self):
+        self.objs = places().values()
+
+    def test_functions(self):
+        """Test that only the numbers of the column are aggregated."""
+        self.assertEqual(aggregate(self.objs, "price", "count"), 4)
+        self.assertEqual(aggregate(self.objs, "price", "sum"), 160.5)
+        self.assertEqual(aggregate(self.objs, "price"), 40.125)
+        self.assertEqual(aggregate(self.objs, "price", "min"), 10)
+        self.assertEqual(aggregate(self.objs, "price", "max"), 70)
+        with self.assertRaises(ValueError):
+            aggregate(self.objs, "price", "median")
+
+    def test_by_where(self):
+        """Test grouping, ranges, equality and empty results."""
+        self.assertEqual(aggregate(self.objs, "price", by="city_id"),
+                         {"a": 20, "b": 50.5, None: 70})
+        self.assertEqual(aggregate(self.objs, "price", "sum",
+                                   where={"rooms": (2, None)}), 150.5)
+        self.assertEqual(aggregate(self.objs, "rooms", "count", "city_id",
+                                   {"city_id": "b", "rooms": (None, 2)}),
+                         {"b": 1})
+        self.assertIsNone(aggregate(self.objs, "price",
+                                    where={"rooms": (9, 9)}))
+        self.assertEqual(aggregate(self.objs, "price", "count",
+                                   where={"rooms": (9, 9)}), 0)
+
+    def test_covers(self):
+        """Test that covers() needs every attribute in the store."""
+        self.assertTrue(covers(ATTRS, "price", "city_id", {"rooms": 1}))
+        self.assertTrue(covers(ATTRS, "rooms", where={"city_id": "a"}))
+        self.assertFalse(covers(ATTRS, "city_id"))
+        self.assertFalse(covers(ATTRS, "price", by="rooms"))
+        self.assertFalse(covers(ATTRS, "price", where={"name": "x"}))
+
+
+@unittest.skipIf(columns.np is None, "needs numpy")
+class TestColumnStore(unittest.TestCase):
+    def setUp(self):
+        self.objs = places()
+        self.store = ColumnStore(ATTRS)
+        self.store.rebuild(self.objs)
+
+    def assertSame(self, *query):
+        """Checks the store against aggregate() for a query."""
+        self.assertEqual(self.store.aggregate(*query),
+                         aggregate(self.objs.values(), *query))
+
+    def test_aggregate(self):
+        """Test that the store gives the results of aggregate()."""
+        for func in columns.FUNCTIONS:
+            self.assertSame("price", func)
+            self.assertSame("price", func, "city_id")
+            self.assertSame("rooms", func, "city_id", {"price": (20, 60)})
+            self.assertSame("price", func, None, {"city_id": "a"})
+            self.assertSame("price", func, None, {"rooms": 9})
+        self.assertEqual(len(self.store), 6)
+        with self.assertRaises(ValueError):
+            self.store.aggregate("price", "median")
+
+    def test_update_discard(self):
+        """Test that rows follow updates and are freed and reused."""
+        self.objs["Place.1"].price = 20
+        self.store.update("Place.1", self.objs["Place.1"])
+        del self.objs["Place.2"]
+        self.store.discard("Place.2")
+        self.store.discard("Place.9")
+        self.objs["Place.7"] = SimpleNamespace(price=5, city_id="c")
+        self.store.update("Place.7", self.objs["Place.7"])
+        self.assertEqual(len(self.store), 6)
+        self.assertSame("price", "sum", "city_id")
+        self.assertSame("price", "min")
+
+    def test_growth(self):
+        """Test that the arrays grow and match over many random rows."""
+        rand = random.Random(0)
+        for i in range(3000):
+            k = "Place.{}".format(rand.randrange(2000))
+            if rand.random() < 0.2:
+                self.objs.pop(k, None)
+                self.store.discard(k)
+            else:
+                self.objs[k] = SimpleNamespace(
+                    price=rand.randrange(100), rooms=rand.randrange(5),
+                    city_id=rand.choice("abcd"))
+                self.store.update(k, self.objs[k])
+        self.assertEqual(len(self.store), len(self.objs))
+        for func in ("count", "min", "max"):
+            self.assertSame("price", func, "city_id", {"rooms": (1, 3)})
+        for city, total in self.store.aggregate("price", "sum",
+                                                "city_id").items():
+            self.assertAlmostEqual(total, aggregate(
+                self.objs.values(), "price", "sum", "city_id")[city])
+
+
+if __name__ == "__main__":
+    unittest.main()
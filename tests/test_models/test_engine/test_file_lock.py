@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+""" Defines unittests for models/engine/file_lock.py. """
+import os
+import subprocess
+import sys
+import unittest
+from models.engine import file_lock
+from models.engine.file_lock import FileLock
+
+
+class TestFileLock(unittest.TestCase):
+    def setUp(self):
+        self.lock = FileLock("test.lock")
+
+    def tearDown(self):
+        try:
+            os.remove("test.lock")
+        except FileNotFoundError:
+            pass
+
+    def test_generation(self):
+        """Test that bump() increments the generation counter."""
+        self.assertEqual(self.lock.generation(), 0)
+        with self.lock:
+            self.assertEqual(self.lock.bump(), 1)
+            self.assertEqual(self.lock.bump(), 2)
+        self.assertEqual(FileLock("test.lock").generation(), 2)
+
+    def test_reentrant_in_process(self):
+        """Test that the process can take the lock while holding it."""
+        with self.lock:
+            with self.lock:
+                pass
+            self.lock.bump()
+        self.assertEqual(self.lock.generation(), 1)
+
+    @unittest.skipIf(file_lock.fcntl is None, "needs fcntl")
+    def test_excludes_other_processes(self):
+        """Test that another process can't lock the file meanwhile."""
+        code = ("import fcntl; f = open('test.lock', 'a+'); "
+                "fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)")
+        with self.lock:
+            self.assertNotEqual(subprocess.call(
+                [sys.executable, "-c", code],
+                stderr=subprocess.DEVNULL), 0)
+        self.assertEqual(subprocess.call([sys.executable, "-c", code]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
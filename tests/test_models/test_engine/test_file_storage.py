@@ -1,15 +1,26 @@
 #!/usr/bin/python3
 """ Defines unittests for models/enfine/file_storage.py. """
 import unittest
+import glob
 import json
 import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from unittest.mock import patch
 from models.user import User
 from models.state import State
 from models.city import City
 from models.amenity import Amenity
 from models.place import Place
 from models.review import Review
+from models.engine import binary_format, columns
 from models.engine.file_storage import FileStorage
+from models.engine.indexes import HashIndex
+from models.engine.lazy_model import LazyModel
 from models.base_model import BaseModel
 
 
@@ -18,10 +29,12 @@ class TestFileStorage(unittest.TestCase):
         self.storage = FileStorage()
 
     def tearDown(self):
-        try:
-            os.remove(FileStorage._FileStorage__file_path)
-        except FileNotFoundError:
-            pass
+        for path in (FileStorage._FileStorage__file_path,
+                     FileStorage._FileStorage__file_path + ".tmp"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
 
     def test_all(self):
         """Test the all() method of FileStorage."""
@@ -69,6 +82,1374 @@ class TestFileStorage(unittest.TestCase):
         self.assertIn("BaseModel.{}".format(bm2.id), new_storage.all())
         self.assertIn("BaseModel.{}".format(bm3.id), new_storage.all())
 
+    def test_save_reencodes_only_changed(self):
+        """Test that save() only calls to_dict() on changed objects."""
+        bm1 = BaseModel()
+        bm2 = BaseModel()
+        self.storage.save()
+        bm1.name = "changed"
+        with patch.object(BaseModel, "to_dict", autospec=True,
+                          side_effect=BaseModel.to_dict) as to_dict:
+            self.storage.save()
+        to_dict.assert_called_once_with(bm1)
+        with open(FileStorage._FileStorage__file_path) as f:
+            objs = json.load(f)
+        self.assertEqual(objs["BaseModel.{}".format(bm1.id)]["name"],
+                         "changed")
+        self.assertIn("BaseModel.{}".format(bm2.id), objs)
+
+    def test_save_is_atomic(self):
+        """Test that a failed save leaves the previous file intact."""
+        bm = BaseModel()
+        self.storage.save()
+        with open(FileStorage._FileStorage__file_path) as f:
+            before = f.read()
+        bm.name = "lost"
+        with patch.object(BaseModel, "to_dict", side_effect=OSError):
+            with self.assertRaises(OSError):
+                self.storage.save()
+        with open(FileStorage._FileStorage__file_path) as f:
+            self.assertEqual(f.read(), before)
+
+    def test_fsync_policies(self):
+        """Test when each fsync policy forces data to disk."""
+        with patch("os.fsync") as fsync:
+            FileStorage(fsync="never").save()
+            fsync.assert_not_called()
+            FileStorage(fsync="always").save()
+            self.assertTrue(fsync.called)
+            fsync.reset_mock()
+            batched = FileStorage(fsync="batched", fsync_interval=60000)
+            batched.save()
+            calls = fsync.call_count
+            batched.save()
+            self.assertEqual(fsync.call_count, calls)
+
+    def test_batched_fsync_deferred(self):
+        """Test that a batched fsync skipped by a burst comes later."""
+        with patch("os.fsync") as fsync:
+            batched = FileStorage(fsync="batched", fsync_interval=200)
+            batched.save()
+            BaseModel()
+            batched.save()
+            calls = fsync.call_count
+            time.sleep(0.5)
+            self.assertGreater(fsync.call_count, calls)
+
+    def test_invalid_fsync_policy(self):
+        """Test that an unknown fsync policy is rejected."""
+        with self.assertRaises(ValueError):
+            FileStorage(fsync="sometimes")
+
+    def test_save_one_object_per_line(self):
+        """Test that the saved file is valid JSON with a line per object."""
+        bm1 = BaseModel()
+        bm2 = BaseModel()
+        self.storage.save()
+        with open(FileStorage._FileStorage__file_path) as f:
+            lines = f.read().splitlines()
+            f.seek(0)
+            objs = json.load(f)
+        self.assertEqual(len(lines), len(objs) + 2)
+        self.assertIn("BaseModel.{}".format(bm1.id), objs)
+        self.assertIn("BaseModel.{}".format(bm2.id), objs)
+
+    def test_reload_streams(self):
+        """Test that reload() never decodes the whole document."""
+        bm = BaseModel()
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        with patch("json.load", side_effect=AssertionError):
+            self.storage.reload()
+        self.assertIn("BaseModel.{}".format(bm.id), self.storage.all())
+
+    def test_reload_single_line_file(self):
+        """Test that files written on a single line still load."""
+        bm = BaseModel()
+        with open(FileStorage._FileStorage__file_path, "w") as f:
+            json.dump({"BaseModel.{}".format(bm.id): bm.to_dict()}, f)
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertIn("BaseModel.{}".format(bm.id), self.storage.all())
+
+    def test_reload_indented_file(self):
+        """Test that indented files are not read one line per object."""
+        bm = BaseModel()
+        with open(FileStorage._FileStorage__file_path, "w") as f:
+            json.dump({"BaseModel.{}".format(bm.id): bm.to_dict()}, f,
+                      indent=4)
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertIn("BaseModel.{}".format(bm.id), self.storage.all())
+
+    def test_all_cls(self):
+        """Test that all(cls) only returns the objects of cls."""
+        user = User()
+        state = State()
+        users = self.storage.all(User)
+        self.assertIn("User.{}".format(user.id), users)
+        self.assertNotIn("State.{}".format(state.id), users)
+        self.assertEqual(users, self.storage.all("User"))
+        self.assertEqual(self.storage.all("MyModel"), {})
+
+    def test_get(self):
+        """Test that get() finds an object by class and id."""
+        city = City()
+        self.assertIs(self.storage.get(City, city.id), city)
+        self.assertIs(self.storage.get("City", city.id), city)
+        self.assertIsNone(self.storage.get(State, city.id))
+        self.assertIsNone(self.storage.get(City, "nope"))
+
+    def test_count(self):
+        """Test that count() follows new() and delete()."""
+        total = self.storage.count()
+        places = self.storage.count(Place)
+        place = Place()
+        self.assertEqual(self.storage.count(Place), places + 1)
+        self.assertEqual(self.storage.count(), total + 1)
+        self.storage.delete(place)
+        self.assertEqual(self.storage.count("Place"), places)
+        self.assertEqual(self.storage.count(), total)
+
+    def test_class_index_follows_reload(self):
+        """Test that the class index matches __objects after a reload."""
+        review = Review()
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.assertEqual(self.storage.count(Review), 0)
+        self.storage.reload()
+        self.assertIn("Review.{}".format(review.id),
+                      self.storage.all(Review))
+
+    def test_engine_package(self):
+        """Test that models.engine is still the engine package."""
+        import models
+        import models.engine.file_storage as file_storage
+        self.assertIs(file_storage.FileStorage, FileStorage)
+        self.assertEqual(models.engine.__name__, "models.engine")
+
+
+class TestFileStorageLazy(unittest.TestCase):
+    """Unittests for the lazy reload of FileStorage."""
+
+    def setUp(self):
+        self.storage = FileStorage(lazy=True)
+        self.place = Place()
+        self.place.name = "Loft"
+        self.key = "Place.{}".format(self.place.id)
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+
+    def tearDown(self):
+        try:
+            os.remove(FileStorage._FileStorage__file_path)
+        except FileNotFoundError:
+            pass
+
+    def test_reload_stores_lazy_models(self):
+        """Test that reload() builds no model instance."""
+        obj = self.storage.all()[self.key]
+        self.assertIs(type(obj), LazyModel)
+        self.assertIsInstance(obj, Place)
+        self.assertIsNone(obj._obj)
+
+    def test_first_use_builds_model(self):
+        """Test that reading an attribute builds and stores the model."""
+        obj = self.storage.all()[self.key]
+        self.assertEqual(obj.name, "Loft")
+        real = self.storage.all()[self.key]
+        self.assertIs(type(real), Place)
+        self.assertEqual(real.created_at, self.place.created_at)
+        self.assertIn(real, self.storage.all(Place).values())
+
+    def test_update_through_lazy_model(self):
+        """Test that a change made through a LazyModel is saved."""
+        self.storage.all()[self.key].name = "Studio"
+        self.storage.save()
+        with open(FileStorage._FileStorage__file_path) as f:
+            self.assertEqual(json.load(f)[self.key]["name"], "Studio")
+
+    def test_save_keeps_unused_objects_lazy(self):
+        """Test that saving doesn't build the objects never used."""
+        User()
+        self.storage.save()
+        self.assertIsNone(self.storage.all()[self.key]._obj)
+        with open(FileStorage._FileStorage__file_path) as f:
+            self.assertEqual(json.load(f)[self.key]["name"], "Loft")
+
+
+class TestFileStorageBinary(unittest.TestCase):
+    """Unittests for the binary snapshot format of FileStorage."""
+
+    def setUp(self):
+        self.storage = FileStorage(format="binary")
+
+    def tearDown(self):
+        for path in glob.glob("file*.bin"):
+            os.remove(path)
+
+    def test_save_reload(self):
+        """Test that objects survive a binary save and reload."""
+        place = Place()
+        place.name = "Loft"
+        place.amenity_ids = ["a"]
+        self.storage.save()
+        self.assertFalse(os.path.exists(FileStorage._FileStorage__file_path))
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        loaded = self.storage.all()["Place.{}".format(place.id)]
+        self.assertEqual(loaded.to_dict(), place.to_dict())
+
+    def test_lazy_reload(self):
+        """Test that a lazy binary reload builds objects on first use."""
+        user = User()
+        user.email = "a@b.c"
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        FileStorage(format="binary", lazy=True).reload()
+        obj = self.storage.all()["User.{}".format(user.id)]
+        self.assertIs(type(obj), LazyModel)
+        self.assertEqual(obj.email, "a@b.c")
+        self.assertEqual(obj.updated_at, user.updated_at)
+
+    def test_sharded(self):
+        """Test that binary snapshots can be sharded."""
+        state = State()
+        FileStorage(format="binary", sharded=True).save()
+        self.assertTrue(os.path.exists("file.State.bin"))
+
+    def test_invalid_format(self):
+        """Test that an unknown format is rejected."""
+        with self.assertRaises(ValueError):
+            FileStorage(format="xml")
+
+
+class TestFileStorageMapped(unittest.TestCase):
+    """Unittests for the memory-mapped read path of FileStorage."""
+
+    def setUp(self):
+        self.storage = FileStorage(format="binary", mmap=True)
+        self.users = [User() for i in range(20)]
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+
+    def tearDown(self):
+        mapped = FileStorage._FileStorage__mapped
+        if mapped is not None:
+            mapped.close()
+            FileStorage._FileStorage__mapped = None
+        for path in glob.glob("file*.bin"):
+            os.remove(path)
+
+    def test_reload_reads_nothing(self):
+        """Test that reload() only maps the snapshot."""
+        self.assertEqual(FileStorage._FileStorage__objects, {})
+
+    def test_get_reads_one_object(self):
+        """Test that get() loads only the object asked for."""
+        user = self.users[3]
+        with patch("models.engine.binary_format.decode",
+                   wraps=binary_format.decode) as decode:
+            obj = self.storage.get(User, user.id)
+            self.assertEqual(obj.to_dict(), user.to_dict())
+        decode.assert_called_once()
+        self.assertEqual(len(FileStorage._FileStorage__objects), 1)
+        self.assertIsNone(self.storage.get("User", "nope"))
+
+    def test_all_loads_everything(self):
+        """Test that all() and count() see every mapped object."""
+        self.assertGreaterEqual(self.storage.count(User), 20)
+        for user in self.users:
+            self.assertIn("User.{}".format(user.id), self.storage.all())
+
+    def test_delete_then_save(self):
+        """Test that a deleted mapped object stays deleted."""
+        gone = self.users[0]
+        self.storage.delete(self.storage.get(User, gone.id))
+        self.assertIsNone(self.storage.get(User, gone.id))
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertIsNone(self.storage.get(User, gone.id))
+        self.assertIsNotNone(self.storage.get(User, self.users[1].id))
+
+    def test_invalid_options(self):
+        """Test that mmap needs the binary format."""
+        with self.assertRaises(ValueError):
+            FileStorage(mmap=True)
+
+
+class TestFileStorageJournal(unittest.TestCase):
+    """Unittests for the journal mode of FileStorage."""
+
+    def setUp(self):
+        self.storage = FileStorage(journal=True)
+
+    def tearDown(self):
+        for path in (FileStorage._FileStorage__file_path,
+                     FileStorage._FileStorage__log_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def test_save_appends_to_log(self):
+        """Test that save() appends records instead of rewriting."""
+        bm = BaseModel()
+        self.storage.save()
+        self.assertFalse(os.path.exists(FileStorage._FileStorage__file_path))
+        with open(FileStorage._FileStorage__log_path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(records[-1]["op"], "set")
+        self.assertEqual(records[-1]["key"], "BaseModel.{}".format(bm.id))
+
+    def test_save_only_changed(self):
+        """Test that a second save() only logs the new changes."""
+        BaseModel()
+        self.storage.save()
+        with open(FileStorage._FileStorage__log_path) as f:
+            before = len(f.readlines())
+        BaseModel()
+        self.storage.save()
+        with open(FileStorage._FileStorage__log_path) as f:
+            self.assertEqual(len(f.readlines()), before + 1)
+
+    def test_reload_replays_log(self):
+        """Test that reload() replays updates and deletes."""
+        kept = User()
+        gone = User()
+        self.storage.checkpoint()
+        kept.first_name = "Betty"
+        kept.save()
+        self.storage.delete(gone)
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        objs = self.storage.all()
+        self.assertEqual(objs["User.{}".format(kept.id)].first_name, "Betty")
+        self.assertNotIn("User.{}".format(gone.id), objs)
+
+    def test_torn_tail(self):
+        """Test that saves after a torn last record are kept."""
+        kept = User()
+        self.storage.save()
+        with open(FileStorage._FileStorage__log_path, 'a') as f:
+            f.write('{"op": "set", "key": "User.torn", "va')
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        after = User()
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual(set(self.storage.all(User)),
+                         {"User.{}".format(kept.id),
+                          "User.{}".format(after.id)})
+
+    def test_partial_line_backstop(self):
+        """Test that a save never appends to a partial line."""
+        with open(FileStorage._FileStorage__log_path, 'w') as f:
+            f.write('{"op": "del", "key": "User.torn"')
+        user = User()
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertIn("User.{}".format(user.id), self.storage.all())
+
+    def test_readers_not_blocked(self):
+        """Test that readers don't wait for the log to reach the disk."""
+        self.storage = FileStorage(journal=True, fsync="always")
+        synced = threading.Event()
+
+        def slow_fsync(fd):
+            synced.set()
+            time.sleep(0.5)
+
+        User()
+        with patch("os.fsync", side_effect=slow_fsync):
+            writer = threading.Thread(target=self.storage.save)
+            writer.start()
+            self.assertTrue(synced.wait(2))
+            start = time.monotonic()
+            self.storage.count(User)
+            self.assertLess(time.monotonic() - start, 0.3)
+            writer.join()
+
+    def test_checkpoint_empties_log(self):
+        """Test that checkpoint() writes a snapshot and drops the log."""
+        bm = BaseModel()
+        self.storage.save()
+        self.storage.checkpoint()
+        self.assertFalse(os.path.exists(FileStorage._FileStorage__log_path))
+        with open(FileStorage._FileStorage__file_path) as f:
+            self.assertIn("BaseModel.{}".format(bm.id), json.load(f))
+
+
+class TestFileStorageCompaction(unittest.TestCase):
+    """Unittests for the log compaction of FileStorage."""
+
+    def setUp(self):
+        self.storage = FileStorage(journal=True, compact_log_size=0,
+                                   compact_ratio=0)
+
+    def tearDown(self):
+        for path in (FileStorage._FileStorage__file_path,
+                     FileStorage._FileStorage__log_path,
+                     FileStorage._FileStorage__old_log_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def test_compact_drops_garbage(self):
+        """Test that compact() keeps only the live objects."""
+        kept = User()
+        gone = User()
+        self.storage.save()
+        for i in range(5):
+            kept.first_name = "name{}".format(i)
+            self.storage.save()
+        self.storage.delete(gone)
+        self.storage.save()
+        before = self.storage.compaction_stats()
+        self.assertGreater(before["garbage_ratio"], 0)
+        self.assertTrue(self.storage.compact(wait=True))
+        self.assertFalse(os.path.exists(FileStorage._FileStorage__log_path))
+        self.assertFalse(
+            os.path.exists(FileStorage._FileStorage__old_log_path))
+        with open(FileStorage._FileStorage__file_path) as f:
+            objs = json.load(f)
+        self.assertEqual(objs["User.{}".format(kept.id)]["first_name"],
+                         "name4")
+        self.assertNotIn("User.{}".format(gone.id), objs)
+        stats = self.storage.compaction_stats()
+        self.assertEqual(stats["runs"], before["runs"] + 1)
+        self.assertEqual(stats["log_records"], 0)
+        self.assertGreaterEqual(stats["last_duration"],
+                                stats["last_pause"])
+
+    def test_writers_not_blocked(self):
+        """Test that saves go on while the snapshot is being written."""
+        old = User()
+        self.storage.save()
+        started = threading.Event()
+        release = threading.Event()
+        write = FileStorage._FileStorage__write_snapshot
+
+        def slow_write(storage, path, records):
+            started.set()
+            release.wait(5)
+            write(storage, path, records)
+
+        with patch.object(FileStorage, "_FileStorage__write_snapshot",
+                          slow_write):
+            self.storage.compact()
+            self.assertTrue(started.wait(5))
+            new = User()
+            self.storage.save()
+            self.assertFalse(self.storage.compact())
+            release.set()
+            FileStorage._FileStorage__objects = {}
+            self.storage.reload()
+        objs = self.storage.all()
+        self.assertIn("User.{}".format(old.id), objs)
+        self.assertIn("User.{}".format(new.id), objs)
+        self.assertFalse(
+            os.path.exists(FileStorage._FileStorage__old_log_path))
+
+    def test_size_threshold(self):
+        """Test that a log reaching compact_log_size is compacted."""
+        self.storage = FileStorage(journal=True, compact_log_size=1,
+                                   compact_ratio=0)
+        with patch.object(FileStorage, "compact") as compact:
+            BaseModel()
+            self.storage.save()
+        compact.assert_called_once()
+
+    def test_ratio_threshold(self):
+        """Test that a log with compact_ratio garbage is compacted."""
+        self.storage = FileStorage(journal=True, compact_log_size=0,
+                                   compact_ratio=0.5)
+        self.storage.checkpoint()
+        with patch.object(FileStorage, "compact") as compact, \
+                patch.object(FileStorage,
+                             "_FileStorage__compact_min_records", 2):
+            user = User()
+            self.storage.save()
+            compact.reset_mock()
+            user.first_name = "Betty"
+            self.storage.save()
+        compact.assert_called_once()
+
+    def test_interrupted_compaction(self):
+        """Test that reload() replays and folds a rotated log."""
+        user = User()
+        user.first_name = "Betty"
+        self.storage.save()
+        os.replace(FileStorage._FileStorage__log_path,
+                   FileStorage._FileStorage__old_log_path)
+        user.last_name = "Holberton"
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        obj = self.storage.get(User, user.id)
+        self.assertEqual(obj.first_name, "Betty")
+        self.assertEqual(obj.last_name, "Holberton")
+        self.assertFalse(
+            os.path.exists(FileStorage._FileStorage__old_log_path))
+        self.assertFalse(os.path.exists(FileStorage._FileStorage__log_path))
+
+    def test_invalid_ratio(self):
+        """Test that compact_ratio must be between 0 and 1."""
+        with self.assertRaises(ValueError):
+            FileStorage(compact_ratio=2)
+
+
+class TestFileStorageThreads(unittest.TestCase):
+    """Stress tests FileStorage with concurrent readers and writers."""
+
+    def setUp(self):
+        FileStorage._FileStorage__objects = {}
+        self.storage = FileStorage()
+
+    def tearDown(self):
+        try:
+            os.remove(FileStorage._FileStorage__file_path)
+        except FileNotFoundError:
+            pass
+
+    def test_concurrent_access(self):
+        """Test that readers see no torn state while writers save."""
+        errors = []
+        done = threading.Event()
+
+        def writer(n):
+            try:
+                users = []
+                for i in range(100):
+                    user = User()
+                    user.first_name = "w{}".format(n)
+                    users.append(user)
+                    if i % 3 == 0:
+                        self.storage.delete(users.pop(0))
+                    if i % 10 == 0:
+                        self.storage.save()
+                self.storage.save()
+            except Exception as e:
+                errors.append(e)
+
+        def reader():
+            try:
+                while not done.is_set():
+                    for k, obj in self.storage.all(User).items():
+                        self.assertEqual(k, "User.{}".format(obj.id))
+                    self.storage.count()
+                    for obj in self.storage.all().values():
+                        self.storage.get(type(obj), obj.id)
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=reader) for i in range(4)]
+        writers = [threading.Thread(target=writer, args=(n,))
+                   for n in range(4)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join(30)
+        done.set()
+        for thread in readers:
+            thread.join(30)
+        self.assertEqual(errors, [])
+        expected = set(self.storage.all())
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual(set(self.storage.all()), expected)
+        self.assertEqual(self.storage.count(User), 4 * 66)
+
+    def test_queries_share_the_lock(self):
+        """Test that indexed queries run while another reader holds on."""
+        place = Place()
+        place.city_id = "c"
+        place.max_guest = 4
+        place.name = "Loft"
+        place.latitude, place.longitude = 1.0, 2.0
+        place.amenity_ids = ["wifi"]
+
+        def queries():
+            return [self.storage.find(Place, city_id="c"),
+                    self.storage.group(Place, "city_id", ["c"])["c"],
+                    self.storage.find_range(Place, "max_guest", 4, 4),
+                    self.storage.find_within(Place, 0, 1, 2, 3),
+                    self.storage.find_near(Place, 1.0, 2.0, limit=1),
+                    self.storage.search(Place, "loft"),
+                    self.storage.find_containing(Place, "amenity_ids",
+                                                 ["wifi"])]
+
+        self.assertEqual(queries(), [[place]] * 7)
+        reading = threading.Event()
+        release = threading.Event()
+
+        def reader():
+            with self.storage._FileStorage__lock.read():
+                reading.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        try:
+            self.assertTrue(reading.wait(2))
+            start = time.monotonic()
+            self.assertEqual(queries(), [[place]] * 7)
+            self.assertLess(time.monotonic() - start, 1)
+        finally:
+            release.set()
+            thread.join()
+
+    def test_all_is_a_copy(self):
+        """Test that all() isn't changed by later writes."""
+        objs = self.storage.all()
+        BaseModel()
+        self.assertEqual(objs, {})
+
+
+class TestFileStorageProcesses(unittest.TestCase):
+    """Unittests for FileStorage shared by several processes."""
+
+    def setUp(self):
+        self.storage = FileStorage()
+        self.storage.reload()
+
+    def tearDown(self):
+        for path in (FileStorage._FileStorage__file_path,
+                     FileStorage._FileStorage__log_path,
+                     FileStorage._FileStorage__file_path + ".lock"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def other_process(self, journal=False):
+        """Creates and saves a User from another process; returns its id."""
+        env = dict(os.environ, HBNB_STORAGE_JOURNAL="1" if journal else "0")
+        return subprocess.check_output(
+            [sys.executable, "-c", "from models.user import User; "
+             "u = User(); u.save(); print(u.id)"],
+            env=env, universal_newlines=True).strip()
+
+    def test_lock_next_to_file(self):
+        """Test that the lock file follows the path of the JSON file."""
+        os.remove("file.json.lock")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "other.json")
+            with patch.object(FileStorage, "_FileStorage__file_path", path):
+                User()
+                self.storage.save()
+                self.assertTrue(os.path.exists(path + ".lock"))
+            self.assertFalse(os.path.exists("file.json.lock"))
+
+    def test_save_merges(self):
+        """Test that a save keeps what another process saved."""
+        mine = User()
+        self.storage.save()
+        theirs = self.other_process()
+        later = User()
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        for obj_id in (mine.id, theirs, later.id):
+            self.assertIsNotNone(self.storage.get(User, obj_id))
+
+    def test_save_merges_journal(self):
+        """Test that a journal save keeps what another process logged."""
+        self.storage = FileStorage(journal=True)
+        self.storage.checkpoint()
+        theirs = self.other_process(journal=True)
+        mine = User()
+        self.storage.save()
+        self.storage.checkpoint()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertIsNotNone(self.storage.get(User, theirs))
+        self.assertIsNotNone(self.storage.get(User, mine.id))
+
+    def test_refresh(self):
+        """Test that refresh() only reloads after another process saved."""
+        user = User()
+        self.storage.save()
+        self.assertFalse(self.storage.refresh())
+        user.first_name = "Betty"
+        theirs = self.other_process()
+        self.assertTrue(self.storage.refresh())
+        self.assertFalse(self.storage.refresh())
+        self.assertIsNotNone(self.storage.get(User, theirs))
+        self.assertEqual(self.storage.get(User, user.id).first_name, "Betty")
+
+
+class TestFileStorageBulk(unittest.TestCase):
+    """Unittests for bulk_new() and bulk_load() of FileStorage."""
+
+    def setUp(self):
+        FileStorage._FileStorage__objects = {}
+        self.storage = FileStorage()
+
+    def tearDown(self):
+        try:
+            os.remove(FileStorage._FileStorage__file_path)
+        except FileNotFoundError:
+            pass
+
+    def test_bulk_new(self):
+        """Test that dicts and instances are stored without a save."""
+        user = User()
+        objs = self.storage.bulk_new(
+            [{"__class__": "Place", "id": "p1", "name": "Loft"},
+             {"name": "Studio"}, user], cls="Place")
+        self.assertEqual(objs[0].name, "Loft")
+        self.assertIsInstance(objs[1], Place)
+        self.assertIsInstance(objs[1].created_at, datetime)
+        self.assertIs(objs[2], user)
+        self.assertIs(self.storage.get(Place, "p1"), objs[0])
+        self.assertEqual(self.storage.count(Place), 2)
+        self.assertFalse(os.path.exists(FileStorage._FileStorage__file_path))
+
+    def test_deferred_index(self):
+        """Test that index=False still lets all(cls) see the objects."""
+        self.storage.all(Place)
+        self.storage.bulk_new(({"name": str(i)} for i in range(10)),
+                              cls=Place, index=False)
+        self.assertEqual(len(self.storage.all(Place)), 10)
+
+    def test_bulk_load_saves_once(self):
+        """Test that bulk_load() writes the objects in a single save."""
+        with patch.object(FileStorage, "save", autospec=True,
+                          side_effect=FileStorage.save) as save:
+            objs = self.storage.bulk_load(({"name": str(i)}
+                                           for i in range(100)),
+                                          cls=BaseModel)
+        save.assert_called_once()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual(self.storage.count(Place), 0)
+        self.assertEqual(self.storage.count(BaseModel), 100)
+        self.assertIn("BaseModel.{}".format(objs[0].id), self.storage.all())
+
+
+class TestFileStorageTransaction(unittest.TestCase):
+    """Unittests for transaction() of FileStorage."""
+
+    def setUp(self):
+        FileStorage._FileStorage__objects = {}
+        self.storage = FileStorage()
+
+    def tearDown(self):
+        for path in (FileStorage._FileStorage__file_path,
+                     FileStorage._FileStorage__log_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def test_saves_deferred(self):
+        """Test that the saves of a block end in a single write."""
+        with patch.object(FileStorage, "checkpoint", autospec=True,
+                          side_effect=FileStorage.checkpoint) as checkpoint:
+            with self.storage.transaction():
+                place = Place()
+                place.save()
+                with self.storage.transaction():
+                    Review().save()
+                self.assertFalse(
+                    os.path.exists(FileStorage._FileStorage__file_path))
+                place.amenity_ids = ["a"]
+                place.save()
+        checkpoint.assert_called_once()
+        with open(FileStorage._FileStorage__file_path) as f:
+            objs = json.load(f)
+        self.assertEqual(objs["Place.{}".format(place.id)]["amenity_ids"],
+                         ["a"])
+
+    def test_rollback(self):
+        """Test that an exception puts every object back unsaved."""
+        kept = User()
+        kept.first_name = "Betty"
+        gone = User()
+        self.storage.save()
+        with self.assertRaises(RuntimeError):
+            with self.storage.transaction():
+                kept.first_name = "Holberton"
+                kept.save()
+                self.storage.delete(gone)
+                place = Place()
+                raise RuntimeError
+        self.assertEqual(self.storage.get(User, kept.id).first_name, "Betty")
+        self.assertIsNotNone(self.storage.get(User, gone.id))
+        self.assertIsNone(self.storage.get(Place, place.id))
+        self.assertEqual(self.storage.count(User), 2)
+        with open(FileStorage._FileStorage__file_path) as f:
+            objs = json.load(f)
+        self.assertEqual(objs["User.{}".format(kept.id)]["first_name"],
+                         "Betty")
+        self.storage.save()
+        self.storage.reload()
+        self.assertEqual(self.storage.get(User, kept.id).first_name, "Betty")
+
+    def test_rollback_in_place(self):
+        """Test that a rollback puts back the instances callers hold."""
+        kept = User()
+        kept.first_name = "Betty"
+        gone = User()
+        self.storage.save()
+        with self.assertRaises(RuntimeError):
+            with self.storage.transaction():
+                kept.first_name = "Holberton"
+                kept.last_name = "School"
+                self.storage.delete(gone)
+                raise RuntimeError
+        self.assertIs(self.storage.get(User, kept.id), kept)
+        self.assertIs(self.storage.get(User, gone.id), gone)
+        self.assertEqual(kept.first_name, "Betty")
+        self.assertEqual(kept.last_name, "")
+        kept.save()
+        self.storage.reload()
+        self.assertEqual(self.storage.get(User, kept.id).first_name, "Betty")
+
+    def test_other_thread(self):
+        """Test that another thread's changes stay out of a block."""
+        mine, theirs = User(), User()
+        self.storage.save()
+
+        def change():
+            theirs.first_name = "Betty"
+            theirs.save()
+
+        with self.assertRaises(RuntimeError):
+            with self.storage.transaction():
+                mine.first_name = "Holberton"
+                thread = threading.Thread(target=change)
+                thread.start()
+                thread.join()
+                with open(FileStorage._FileStorage__file_path) as f:
+                    objs = json.load(f)
+                self.assertEqual(
+                    objs["User.{}".format(theirs.id)]["first_name"], "Betty")
+                raise RuntimeError
+        self.assertEqual(theirs.first_name, "Betty")
+        self.assertNotIn("first_name", mine.to_dict())
+        with open(FileStorage._FileStorage__file_path) as f:
+            objs = json.load(f)
+        self.assertNotIn("first_name", objs["User.{}".format(mine.id)])
+        self.assertEqual(objs["User.{}".format(theirs.id)]["first_name"],
+                         "Betty")
+
+    def test_journal_batch(self):
+        """Test that a transaction is one log record, dropped if torn."""
+        self.storage = FileStorage(journal=True, compact_log_size=0)
+        self.storage.checkpoint()
+        with self.storage.transaction():
+            users = [User() for i in range(3)]
+            self.storage.save()
+        with open(FileStorage._FileStorage__log_path) as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])["op"], "batch")
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual(self.storage.count(User), 3)
+        with open(FileStorage._FileStorage__log_path, "w") as f:
+            f.write(lines[0][:-10])
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual(self.storage.count(User), 0)
+
+
+class TestFileStorageFind(unittest.TestCase):
+    """Unittests for find() and the attribute indexes of FileStorage."""
+
+    def setUp(self):
+        FileStorage._FileStorage__objects = {}
+        self.storage = FileStorage()
+        self.states = [State() for i in range(3)]
+        self.cities = []
+        for state in self.states:
+            for i in range(4):
+                city = City()
+                city.state_id = state.id
+                self.cities.append(city)
+
+    def tearDown(self):
+        try:
+            os.remove(FileStorage._FileStorage__file_path)
+        except FileNotFoundError:
+            pass
+
+    def test_find(self):
+        """Test that find() returns the objects with the given values."""
+        found = self.storage.find(City, state_id=self.states[0].id)
+        self.assertCountEqual(found, self.cities[:4])
+        self.cities[0].name = "Lagos"
+        self.assertEqual(self.storage.find("City", name="Lagos",
+                                           state_id=self.states[0].id),
+                         [self.cities[0]])
+        self.assertEqual(self.storage.find(City, state_id="nope"), [])
+
+    def test_find_uses_index(self):
+        """Test that find() on a declared attribute reads the index."""
+        with patch.object(HashIndex, "get", autospec=True,
+                          side_effect=HashIndex.get) as get:
+            self.storage.find(City, state_id=self.states[1].id)
+        get.assert_called_once()
+        with patch.object(HashIndex, "get") as get:
+            self.storage.find(City, name="x")
+        get.assert_not_called()
+
+    def test_index_maintained(self):
+        """Test that new(), attribute sets and delete() update indexes."""
+        state = self.states[0]
+        self.storage.find(City, state_id=state.id)
+        moved = self.cities[4]
+        moved.state_id = state.id
+        added = City()
+        added.state_id = state.id
+        self.storage.delete(self.cities[0])
+        self.assertCountEqual(self.storage.find(City, state_id=state.id),
+                              self.cities[1:5] + [added])
+
+    def test_group(self):
+        """Test that group() finds the objects of many values at once."""
+        groups = self.storage.group(City, "state_id",
+                                    [self.states[0].id, "nope"])
+        self.assertCountEqual(groups[self.states[0].id], self.cities[:4])
+        self.assertEqual(groups["nope"], [])
+        self.cities[0].name = "Lagos"
+        self.assertEqual(self.storage.group("City", "name", ["Lagos"]),
+                         {"Lagos": [self.cities[0]]})
+
+    def test_index_after_reload(self):
+        """Test that find() sees the objects loaded by reload()."""
+        self.storage.find(City, state_id=self.states[2].id)
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        found = self.storage.find(City, state_id=self.states[2].id)
+        self.assertCountEqual([city.id for city in found],
+                              [city.id for city in self.cities[8:]])
+
+
+class TestFileStorageRange(unittest.TestCase):
+    """Unittests for find_range() and the sorted indexes of FileStorage."""
+
+    def setUp(self):
+        FileStorage._FileStorage__objects = {}
+        self.storage = FileStorage()
+        self.places = []
+        for i in range(20):
+            place = Place()
+            place.price_by_night = i * 10
+            self.places.append(place)
+
+    def tearDown(self):
+        try:
+            os.remove(FileStorage._FileStorage__file_path)
+        except FileNotFoundError:
+            pass
+
+    def test_find_range(self):
+        """Test that find_range() returns the objects in range, ordered."""
+        self.assertEqual(self.storage.find_range(Place, "price_by_night",
+                                                 45, 90),
+                         self.places[5:10])
+        self.assertEqual(self.storage.find_range("Place", "price_by_night",
+                                                 hi=20), self.places[:3])
+        self.assertEqual(self.storage.find_range(Place, "price_by_night",
+                                                 reverse=True, limit=3),
+                         self.places[:-4:-1])
+        self.assertEqual(self.storage.find_range(Place, "price_by_night",
+                                                 500), [])
+
+    def test_index_maintained(self):
+        """Test that new(), attribute sets and delete() move objects."""
+        self.storage.find_range(Place, "price_by_night")
+        self.places[0].price_by_night = 1000
+        added = Place()
+        added.price_by_night = 55
+        self.storage.delete(self.places[6])
+        self.assertEqual(self.storage.find_range(Place, "price_by_night",
+                                                 50, 70),
+                         [self.places[5], added, self.places[7]])
+        self.assertEqual(self.storage.find_range(Place, "price_by_night",
+                                                 reverse=True, limit=1),
+                         [self.places[0]])
+
+    def test_undeclared_attribute(self):
+        """Test that an attribute outside _ranges is sorted on the fly."""
+        for i, place in enumerate(self.places):
+            place.rating = -i
+        found = self.storage.find_range(Place, "rating", -2)
+        self.assertEqual(found, self.places[2::-1])
+
+
+class TestFileStorageSpatial(unittest.TestCase):
+    """Unittests for find_within(), find_near() and the spatial index."""
+
+    def setUp(self):
+        FileStorage._FileStorage__objects = {}
+        self.storage = FileStorage()
+        self.places = []
+        for i in range(10):
+            place = Place()
+            place.latitude = float(i)
+            place.longitude = float(i)
+            self.places.append(place)
+
+    def tearDown(self):
+        try:
+            os.remove(FileStorage._FileStorage__file_path)
+        except FileNotFoundError:
+            pass
+
+    def test_find_within(self):
+        """Test that find_within() returns the objects in a box."""
+        self.assertCountEqual(self.storage.find_within(Place, 2, 2, 4.5, 9),
+                              self.places[2:5])
+        self.assertEqual(self.storage.find_within("Place", 20, 0, 30, 9), [])
+
+    def test_find_near(self):
+        """Test radius and k-nearest queries, nearest first."""
+        self.assertEqual(self.storage.find_near(Place, 5.1, 5.1, km=200),
+                         [self.places[5], self.places[6], self.places[4]])
+        self.assertEqual(self.storage.find_near(Place, 0, 0, limit=2),
+                         self.places[:2])
+
+    def test_index_maintained(self):
+        """Test that new(), attribute sets and delete() move objects."""
+        self.storage.find_near(Place, 0, 0, limit=1)
+        self.places[9].latitude = 0.01
+        self.places[9].longitude = 0.0
+        self.storage.delete(self.places[0])
+        added = Place()
+        added.latitude = -0.5
+        added.longitude = 0.0
+        self.assertEqual(self.storage.find_near(Place, 0, 0, limit=3),
+                         [self.places[9], added, self.places[1]])
+
+    def test_other_classes(self):
+        """Test that a class without _geo is searched on the fly."""
+        user = User()
+        user.latitude = 1.0
+        user.longitude = 1.0
+        User()
+        self.assertEqual(self.storage.find_near(User, 0, 0), [user])
+
+
+class TestFileStorageSearch(unittest.TestCase):
+    """Unittests for search() and the text indexes of FileStorage."""
+
+    def setUp(self):
+        FileStorage._FileStorage__objects = {}
+        self.storage = FileStorage()
+        self.reviews = []
+        for text in ("Great view, great host", "Noisy street, great food",
+                     "Quiet and close to the sea"):
+            review = Review()
+            review.text = text
+            self.reviews.append(review)
+
+    def tearDown(self):
+        try:
+            os.remove(FileStorage._FileStorage__file_path)
+        except FileNotFoundError:
+            pass
+
+    def test_search(self):
+        """Test that search() ranks the objects holding the words."""
+        self.assertEqual(self.storage.search(Review, "great"),
+                         self.reviews[:2])
+        self.assertEqual(self.storage.search("Review", "great food"),
+                         [self.reviews[1]])
+        self.assertEqual(self.storage.search(Review, "sea noisy", any=True,
+                                             limit=1), [self.reviews[1]])
+
+    def test_index_maintained(self):
+        """Test that new(), attribute sets and delete() update the words."""
+        self.storage.search(Review, "great")
+        self.reviews[2].text = "great"
+        self.storage.delete(self.reviews[0])
+        place = Place()
+        place.description = "A great flat"
+        self.assertEqual(self.storage.search(Review, "great"),
+                         [self.reviews[2], self.reviews[1]])
+        self.assertEqual(self.storage.search(Place, "flat"), [place])
+
+    def test_index_after_reload(self):
+        """Test that search() sees the objects loaded by reload()."""
+        self.storage.search(Review, "great")
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual([review.id for review in
+                          self.storage.search(Review, "quiet")],
+                         [self.reviews[2].id])
+
+    def test_other_classes(self):
+        """Test that a class without _text is searched in its strings."""
+        user = User()
+        user.first_name = "Betty"
+        User()
+        self.assertEqual(self.storage.search(User, "betty"), [user])
+
+
+class TestFileStorageContaining(unittest.TestCase):
+    """Unittests for find_containing() and the list indexes."""
+
+    def setUp(self):
+        FileStorage._FileStorage__objects = {}
+        self.storage = FileStorage()
+        self.wifi, self.tv = Amenity(), Amenity()
+        self.places = [Place() for i in range(3)]
+        self.places[0].amenity_ids = [self.wifi.id, self.tv.id]
+        self.places[1].amenity_ids = [self.wifi.id]
+
+    def tearDown(self):
+        try:
+            os.remove(FileStorage._FileStorage__file_path)
+        except FileNotFoundError:
+            pass
+
+    def test_find_containing(self):
+        """Test that find_containing() matches every amenity asked."""
+        self.assertCountEqual(self.storage.find_containing(
+            Place, "amenity_ids", [self.wifi.id]), self.places[:2])
+        self.assertEqual(self.storage.find_containing(
+            "Place", "amenity_ids", [self.tv.id, self.wifi.id]),
+            [self.places[0]])
+        self.assertCountEqual(self.storage.find_containing(
+            Place, "amenity_ids", []), self.places)
+
+    def test_index_maintained(self):
+        """Test that attribute sets, even as strings, and delete() count."""
+        self.storage.find_containing(Place, "amenity_ids", [self.tv.id])
+        self.places[2].amenity_ids = '["{}", "{}"]'.format(self.tv.id,
+                                                           self.wifi.id)
+        self.places[0].amenity_ids = [self.tv.id]
+        self.storage.delete(self.places[1])
+        self.assertEqual(self.storage.find_containing(
+            Place, "amenity_ids", [self.wifi.id]), [self.places[2]])
+
+    def test_index_after_reload(self):
+        """Test that find_containing() sees the objects of reload()."""
+        self.storage.find_containing(Place, "amenity_ids", [self.tv.id])
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual([place.id for place in self.storage.find_containing(
+            Place, "amenity_ids", [self.tv.id])], [self.places[0].id])
+
+
+class TestFileStorageAggregate(unittest.TestCase):
+    """Unittests for aggregate() and the column stores."""
+
+    def setUp(self):
+        FileStorage._FileStorage__objects = {}
+        self.storage = FileStorage()
+        self.places = [Place() for i in range(4)]
+        for place, city, price in zip(self.places, "aabb", (10, 30, 50, 70)):
+            place.city_id = city
+            place.price_by_night = price
+            place.max_guest = price // 10
+
+    def tearDown(self):
+        try:
+            os.remove(FileStorage._FileStorage__file_path)
+        except FileNotFoundError:
+            pass
+
+    def aggregate(self, *query, **where):
+        """Returns the results of a query with and without NumPy."""
+        found = self.storage.aggregate(Place, *query, where=where)
+        with patch.object(columns, "np", None):
+            self.assertEqual(self.storage.aggregate(
+                Place, *query, where=where), found)
+        return found
+
+    def test_aggregate(self):
+        """Test that aggregate() groups and filters the places."""
+        self.assertEqual(self.aggregate("price_by_night"), 40)
+        self.assertEqual(self.aggregate("price_by_night", "mean", "city_id"),
+                         {"a": 20, "b": 60})
+        self.assertEqual(self.aggregate("max_guest", "sum", "city_id",
+                                        price_by_night=(20, 60)),
+                         {"a": 3, "b": 5})
+        self.assertEqual(self.aggregate("price_by_night", "max",
+                                        city_id="a"), 30)
+        self.assertEqual(self.storage.aggregate(
+            "Place", "price_by_night", "count", by="name"), {"": 4})
+        self.assertEqual(self.storage.aggregate(User, "id", "count"), 0)
+
+    def test_store_maintained(self):
+        """Test that attribute sets, delete() and reload() count."""
+        self.storage.aggregate(Place, "price_by_night")
+        self.places[0].price_by_night = 90
+        self.places[1].city_id = "c"
+        self.storage.delete(self.places[3])
+        self.assertEqual(self.aggregate("price_by_night", "sum", "city_id"),
+                         {"a": 90, "b": 50, "c": 30})
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual(self.aggregate("price_by_night", "min", "city_id"),
+                         {"a": 90, "b": 50, "c": 30})
+
+
+class TestFileStorageGroupCommit(unittest.TestCase):
+    """Unittests for the background writer of FileStorage."""
+
+    def setUp(self):
+        self.storage = FileStorage(commit_delay=0.1)
+
+    def tearDown(self):
+        try:
+            os.remove(FileStorage._FileStorage__file_path)
+        except FileNotFoundError:
+            pass
+
+    def test_save_is_deferred(self):
+        """Test that save() returns before anything is written."""
+        BaseModel()
+        self.storage.save()
+        self.assertFalse(os.path.exists(FileStorage._FileStorage__file_path))
+        self.storage.flush()
+        self.assertTrue(os.path.exists(FileStorage._FileStorage__file_path))
+
+    def test_saves_are_grouped(self):
+        """Test that many save() calls end in a single write."""
+        self.storage = FileStorage(commit_delay=10)
+        with patch.object(FileStorage, "checkpoint", autospec=True,
+                          side_effect=FileStorage.checkpoint) as checkpoint:
+            for i in range(50):
+                BaseModel()
+                self.storage.save()
+            self.storage.flush()
+        checkpoint.assert_called_once()
+
+    def test_background_write(self):
+        """Test that the writer thread saves without an explicit flush."""
+        bm = BaseModel()
+        self.storage.save()
+        time.sleep(0.5)
+        with open(FileStorage._FileStorage__file_path) as f:
+            self.assertIn("BaseModel.{}".format(bm.id), json.load(f))
+
+    def test_flush_without_save(self):
+        """Test that flush() does nothing when no save is scheduled."""
+        self.storage.flush()
+        self.assertFalse(os.path.exists(FileStorage._FileStorage__file_path))
+
+    def test_flush_waits_for_writer(self):
+        """Test that flush() returns after a write already under way."""
+        checkpoint = FileStorage.checkpoint
+        started = threading.Event()
+
+        def slow_checkpoint(storage):
+            started.set()
+            time.sleep(0.3)
+            checkpoint(storage)
+
+        bm = BaseModel()
+        with patch.object(FileStorage, "checkpoint", autospec=True,
+                          side_effect=slow_checkpoint):
+            self.storage.save()
+            self.assertTrue(started.wait(2))
+            self.storage.flush()
+            with open(FileStorage._FileStorage__file_path) as f:
+                self.assertIn("BaseModel.{}".format(bm.id), json.load(f))
+
+    def test_write_waits_for_transaction(self):
+        """Test that no scheduled write holds part of an open block."""
+        user = User()
+        self.storage.save()
+        self.storage.flush()
+        bm = BaseModel()
+        self.storage.save()
+        with self.storage.transaction():
+            user.first_name = "Betty"
+            time.sleep(0.4)
+            self.storage.flush()
+            with open(FileStorage._FileStorage__file_path) as f:
+                objs = json.load(f)
+            self.assertNotIn("BaseModel.{}".format(bm.id), objs)
+            self.assertNotIn("first_name", objs["User.{}".format(user.id)])
+        time.sleep(0.4)
+        with open(FileStorage._FileStorage__file_path) as f:
+            objs = json.load(f)
+        self.assertIn("BaseModel.{}".format(bm.id), objs)
+        self.assertEqual(objs["User.{}".format(user.id)]["first_name"],
+                         "Betty")
+
+
+class TestFileStorageSharded(unittest.TestCase):
+    """Unittests for the one-file-per-class mode of FileStorage."""
+
+    def setUp(self):
+        self.storage = FileStorage(sharded=True)
+
+    def tearDown(self):
+        for path in glob.glob("file.*.json"):
+            os.remove(path)
+
+    def test_save_one_file_per_class(self):
+        """Test that each class is saved to its own file."""
+        user = User()
+        state = State()
+        self.storage.save()
+        with open("file.User.json") as f:
+            self.assertIn("User.{}".format(user.id), json.load(f))
+        with open("file.State.json") as f:
+            objs = json.load(f)
+        self.assertIn("State.{}".format(state.id), objs)
+        self.assertNotIn("User.{}".format(user.id), objs)
+
+    def test_save_only_changed_classes(self):
+        """Test that a save only rewrites the files that changed."""
+        User()
+        State()
+        self.storage.save()
+        os.remove("file.User.json")
+        State().name = "Lagos"
+        self.storage.save()
+        self.assertTrue(os.path.exists("file.State.json"))
+        self.assertFalse(os.path.exists("file.User.json"))
+
+    def test_reload_is_lazy(self):
+        """Test that a class file is read on first use only."""
+        user = User()
+        state = State()
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertIn("State.{}".format(state.id), self.storage.all(State))
+        self.assertNotIn("User.{}".format(user.id),
+                         FileStorage._FileStorage__objects)
+        self.assertIn("User.{}".format(user.id), self.storage.all("User"))
+
+    def test_save_keeps_unloaded_objects(self):
+        """Test that saving a class never drops objects not loaded yet."""
+        first = City()
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        second = City()
+        self.storage.save()
+        with open("file.City.json") as f:
+            objs = json.load(f)
+        self.assertIn("City.{}".format(first.id), objs)
+        self.assertIn("City.{}".format(second.id), objs)
+
+    def test_journal_not_supported(self):
+        """Test that sharding cannot be combined with journal mode."""
+        with self.assertRaises(ValueError):
+            FileStorage(journal=True, sharded=True)
+
 
 if __name__ == "__main__":
     unittest.main()
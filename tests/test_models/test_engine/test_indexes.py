@@ -0,0 +1,285 @@
+#!/usr/bin/python3
+""" Defines unittests for models/engine/indexes.py. """
+import random
+import unittest
+from itertools import islice
+from types import SimpleNamespace
+from models.engine.indexes import HashIndex, SortedIndex, SpatialIndex
+from models.engine.indexes import ListIndex, TextIndex, distance_km
+from models.engine.indexes import list_items, tokenize
+
+
+class TestHashIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = HashIndex("state_id")
+        self.index.rebuild({"City.1": SimpleNamespace(state_id="a"),
+                            "City.2": SimpleNamespace(state_id="a"),
+                            "City.3": SimpleNamespace(state_id="b")})
+
+    def test_get(self):
+        """Test that get() returns the keys holding a value."""
+        self.assertEqual(self.index.get("a"), {"City.1", "City.2"})
+        self.assertEqual(self.index.get("c"), set())
+
+    def test_update(self):
+        """Test that update() moves a key to its new value."""
+        self.index.update("City.1", SimpleNamespace(state_id="b"))
+        self.assertEqual(self.index.get("a"), {"City.2"})
+        self.assertEqual(self.index.get("b"), {"City.1", "City.3"})
+        self.index.update("City.4", SimpleNamespace())
+        self.assertEqual(self.index.get(None), {"City.4"})
+
+    def test_discard(self):
+        """Test that discard() forgets a key."""
+        self.index.discard("City.3")
+        self.index.discard("City.9")
+        self.assertEqual(self.index.get("b"), set())
+
+    def test_unhashable(self):
+        """Test that unhashable values are returned by every lookup."""
+        self.index.update("City.1", SimpleNamespace(state_id=["a"]))
+        self.assertEqual(self.index.get("a"), {"City.1", "City.2"})
+        self.assertEqual(self.index.get("b"), {"City.1", "City.3"})
+        self.index.discard("City.1")
+        self.assertEqual(self.index.get("b"), {"City.3"})
+
+
+class TestSortedIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = SortedIndex("price_by_night")
+        self.index.rebuild({"Place.{}".format(i): SimpleNamespace(
+            price_by_night=i % 10) for i in range(100)})
+
+    def test_range(self):
+        """Test that range() yields the keys in range in value order."""
+        keys = list(self.index.range(3, 4))
+        self.assertEqual(len(keys), 20)
+        self.assertEqual(keys[:2], ["Place.13", "Place.23"])
+        self.assertEqual(keys[-1], "Place.94")
+        self.assertEqual(len(list(self.index.range(lo=8))), 20)
+        self.assertEqual(len(list(self.index.range(hi=0))), 10)
+        self.assertEqual(list(self.index.range(3.5, 3.9)), [])
+        self.assertEqual(len(list(self.index.range())), 100)
+
+    def test_reverse(self):
+        """Test that range() can yield the highest values first."""
+        keys = list(self.index.range(hi=8, reverse=True))
+        self.assertEqual(keys[0], "Place.98")
+        self.assertEqual(len(keys), 90)
+        self.assertEqual(list(self.index.range(8, 8, True))[-1], "Place.18")
+
+    def test_update_discard(self):
+        """Test that update() and discard() keep the order."""
+        self.index.update("Place.5", SimpleNamespace(price_by_night=42))
+        self.index.update("Place.6", SimpleNamespace(price_by_night="6"))
+        self.index.update("Place.7", SimpleNamespace(price_by_night=None))
+        self.index.discard("Place.18")
+        self.index.discard("Place.nope")
+        self.assertEqual(len(self.index), 97)
+        self.assertEqual(list(self.index.range(10, reverse=True)),
+                         ["Place.5"])
+        self.assertNotIn("Place.6", self.index.range())
+
+    def test_many_chunks(self):
+        """Test the order when updates split and empty chunks."""
+        self.index = SortedIndex("price_by_night")
+        objs = {}
+        for i in range(5000):
+            k = "Place.{:04d}".format(i)
+            objs[k] = SimpleNamespace(price_by_night=(i * 7919) % 5000)
+            self.index.update(k, objs[k])
+        for i in range(0, 5000, 3):
+            self.index.discard("Place.{:04d}".format(i))
+            del objs["Place.{:04d}".format(i)]
+        expected = sorted(objs, key=lambda k: objs[k].price_by_night)
+        self.assertEqual(list(self.index.range(hi=9)),
+                         [k for k in expected
+                          if objs[k].price_by_night <= 9])
+        self.assertEqual(list(self.index.range(1000, 1200)),
+                         [k for k in expected
+                          if 1000 <= objs[k].price_by_night <= 1200])
+        self.assertEqual(list(self.index.range(reverse=True))[:50],
+                         expected[::-1][:50])
+
+
+class TestSpatialIndex(unittest.TestCase):
+    def setUp(self):
+        rand = random.Random(0)
+        self.objs = {"Place.{}".format(i): SimpleNamespace(
+            latitude=rand.uniform(-90, 90), longitude=rand.uniform(-180, 180))
+            for i in range(3000)}
+        self.index = SpatialIndex()
+        self.index.rebuild(self.objs)
+
+    def expected(self, latitude, longitude):
+        """Returns the keys of self.objs by distance from a point."""
+        return sorted(self.objs, key=lambda k: distance_km(
+            latitude, longitude, self.objs[k].latitude,
+            self.objs[k].longitude))
+
+    def test_distance_km(self):
+        """Test the great-circle distance of known points."""
+        self.assertAlmostEqual(distance_km(48.8566, 2.3522, 51.5074, -0.1278),
+                               343.5, delta=1)
+        self.assertAlmostEqual(distance_km(0, 179.5, 0, -179.5), 111.2,
+                               delta=0.1)
+
+    def test_nearest(self):
+        """Test that nearest() yields the points by distance."""
+        for latitude, longitude in ((0, 0), (89, 179), (-45, -179.9)):
+            found = list(islice(self.index.nearest(latitude, longitude), 20))
+            self.assertEqual([k for km, k in found],
+                             self.expected(latitude, longitude)[:20])
+            self.assertEqual([km for km, k in found],
+                             sorted(km for km, k in found))
+
+    def test_within(self):
+        """Test bounding boxes, including one across the 180th meridian."""
+        for box in ((10, 20, 40, 60), (-30, 170, 30, -170)):
+            south, west, north, east = box
+            self.assertCountEqual(self.index.within(*box), [
+                k for k, obj in self.objs.items()
+                if south <= obj.latitude <= north and
+                (west <= obj.longitude <= east if west <= east else
+                 obj.longitude >= west or obj.longitude <= east)])
+
+    def test_update_discard(self):
+        """Test that moved, invalid and discarded points are followed."""
+        for i in range(0, 3000, 2):
+            k = "Place.{}".format(i)
+            if i % 4:
+                self.objs[k].latitude = -self.objs[k].latitude
+                self.index.update(k, self.objs[k])
+            else:
+                self.index.discard(k)
+                del self.objs[k]
+        self.index.update("Place.1", SimpleNamespace(latitude="1",
+                                                     longitude=2))
+        self.index.update("Place.3", SimpleNamespace(latitude=91,
+                                                     longitude=2))
+        del self.objs["Place.1"], self.objs["Place.3"]
+        self.assertEqual(len(self.index), len(self.objs))
+        self.assertEqual([k for km, k in islice(self.index.nearest(10, 10),
+                                                50)],
+                         self.expected(10, 10)[:50])
+
+    def test_same_point(self):
+        """Test that many objects on one point don't split forever."""
+        index = SpatialIndex()
+        for i in range(500):
+            index.update(str(i), SimpleNamespace(latitude=0.0,
+                                                 longitude=0.0))
+        self.assertEqual(len(list(index.within(-1, -1, 1, 1))), 500)
+
+
+class TestTextIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = TextIndex(("text",))
+        self.index.rebuild({
+            "Review.1": SimpleNamespace(text="Great view, great host!"),
+            "Review.2": SimpleNamespace(text="Noisy street, great food"),
+            "Review.3": SimpleNamespace(text="Quiet and close to the sea"),
+            "Review.4": SimpleNamespace(text=None)})
+
+    def keys(self, query, any=False):
+        """Returns the keys search() finds, best first."""
+        return [k for score, k in self.index.search(query, any)]
+
+    def test_tokenize(self):
+        """Test that tokenize() lowercases words and drops punctuation."""
+        self.assertEqual(tokenize("Great view, CAFÉ-bar!"),
+                         ["great", "view", "café", "bar"])
+
+    def test_search_all_words(self):
+        """Test that search() matches every word, ranking by frequency."""
+        self.assertEqual(self.keys("great"), ["Review.1", "Review.2"])
+        self.assertEqual(self.keys("GREAT food"), ["Review.2"])
+        self.assertEqual(self.keys("great sea"), [])
+        self.assertEqual(self.keys("unknown"), [])
+        self.assertEqual(self.keys(""), [])
+        self.assertEqual(len(self.index), 3)
+
+    def test_search_any_word(self):
+        """Test that any=True matches any word, rare words ranking first."""
+        self.assertEqual(self.keys("sea great", any=True),
+                         ["Review.3", "Review.1", "Review.2"])
+
+    def test_update_discard(self):
+        """Test that update() and discard() follow the text."""
+        self.index.update("Review.3", SimpleNamespace(text="great"))
+        self.index.update("Review.4", SimpleNamespace(text="a great sea"))
+        self.index.discard("Review.1")
+        self.assertEqual(self.keys("great"),
+                         ["Review.3", "Review.4", "Review.2"])
+        self.assertEqual(self.keys("quiet"), [])
+        self.index.discard("Review.9")
+
+    def test_all_string_attributes(self):
+        """Test that attrs None indexes every string of to_dict()."""
+        index = TextIndex()
+        obj = SimpleNamespace(to_dict=lambda: {
+            "id": "great", "__class__": "User", "first_name": "Betty",
+            "last_name": "Great", "number": 3})
+        index.update("User.1", obj)
+        self.assertEqual(index.search("great betty"), [(index.search(
+            "great betty")[0][0], "User.1")])
+        self.assertEqual(index.search("user"), [])
+
+
+class TestListIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = ListIndex("amenity_ids")
+        self.index.rebuild({
+            "Place.1": SimpleNamespace(amenity_ids=["wifi", "tv"]),
+            "Place.2": SimpleNamespace(amenity_ids=["wifi"]),
+            "Place.3": SimpleNamespace(amenity_ids=["tv", "pool", "wifi"]),
+            "Place.4": SimpleNamespace(amenity_ids=[])})
+
+    def test_list_items(self):
+        """Test that list_items() reads lists and the strings of update."""
+        self.assertEqual(list_items(["b", "a", "b"]), ("b", "a"))
+        self.assertEqual(list_items('["a", "b"]'), ("a", "b"))
+        self.assertEqual(list_items("[a, 'b']"), ("a", "b"))
+        self.assertEqual(list_items("a"), ("a",))
+        self.assertEqual(list_items(None), ())
+        self.assertEqual(list_items(3), ())
+
+    def test_having(self):
+        """Test that having() returns the keys holding every item."""
+        self.assertCountEqual(self.index.having(["wifi"]),
+                              ["Place.1", "Place.2", "Place.3"])
+        self.assertCountEqual(self.index.having(["tv", "wifi"]),
+                              ["Place.1", "Place.3"])
+        self.assertEqual(self.index.having(["pool", "tv", "wifi"]),
+                         ["Place.3"])
+        self.assertEqual(self.index.having(["pool", "gym"]), [])
+        self.assertEqual(len(self.index), 3)
+
+    def test_update_discard(self):
+        """Test that slots are moved, freed and reused."""
+        self.index.update("Place.2", SimpleNamespace(amenity_ids='["tv"]'))
+        self.index.discard("Place.1")
+        self.index.update("Place.5", SimpleNamespace(amenity_ids=["tv",
+                                                                  "gym"]))
+        self.index.update("Place.3", SimpleNamespace(amenity_ids=None))
+        self.index.discard("Place.9")
+        self.assertCountEqual(self.index.having(["tv"]),
+                              ["Place.2", "Place.5"])
+        self.assertEqual(self.index.having(["wifi"]), [])
+        self.assertEqual(self.index.having(["gym", "tv"]), ["Place.5"])
+
+    def test_large_intersection(self):
+        """Test intersections of short and long slot arrays."""
+        objs = {"Place.{}".format(i): SimpleNamespace(amenity_ids=[
+            a for a, n in (("a", 2), ("b", 3), ("c", 500)) if i % n == 0])
+            for i in range(3000)}
+        self.index.rebuild(objs)
+        self.assertEqual(sorted(self.index.having(["a", "b"]), key=lambda k:
+                                int(k.split(".")[1])),
+                         ["Place.{}".format(i) for i in range(0, 3000, 6)])
+        self.assertCountEqual(self.index.having(["c", "b", "a"]),
+                              ["Place.0", "Place.1500"])
+
+
+if __name__ == "__main__":
+    unittest.main()
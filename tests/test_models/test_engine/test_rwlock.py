@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+""" Defines unittests for models/engine/rwlock.py. """
+import threading
+import time
+import unittest
+from models.engine.rwlock import RWLock
+
+
+class TestRWLock(unittest.TestCase):
+    def setUp(self):
+        self.lock = RWLock()
+
+    def test_readers_share(self):
+        """Test that two threads can hold the read side at once."""
+        inside = threading.Barrier(2, timeout=5)
+
+        def read():
+            with self.lock.read():
+                inside.wait()
+
+        threads = [threading.Thread(target=read) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertFalse(inside.broken)
+
+    def test_writer_excludes_readers(self):
+        """Test that a reader waits while the lock is held exclusively."""
+        events = []
+
+        def read():
+            with self.lock.read():
+                events.append("read")
+
+        with self.lock:
+            thread = threading.Thread(target=read)
+            thread.start()
+            time.sleep(0.1)
+            events.append("write")
+        thread.join(5)
+        self.assertEqual(events, ["write", "read"])
+
+    def test_writer_reentrant(self):
+        """Test that the writer can re-enter and read."""
+        with self.lock:
+            with self.lock:
+                with self.lock.read():
+                    pass
+        with self.lock.read():
+            pass
+
+    def test_waiting_writer_goes_first(self):
+        """Test that new readers queue behind a waiting writer."""
+        events = []
+        reading = threading.Event()
+        release = threading.Event()
+
+        def first_reader():
+            with self.lock.read():
+                reading.set()
+                release.wait(5)
+
+        def writer():
+            with self.lock:
+                events.append("write")
+
+        def late_reader():
+            with self.lock.read():
+                events.append("read")
+
+        threads = [threading.Thread(target=first_reader)]
+        threads[0].start()
+        reading.wait(5)
+        threads.append(threading.Thread(target=writer))
+        threads[1].start()
+        time.sleep(0.1)
+        threads.append(threading.Thread(target=late_reader))
+        threads[2].start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(events, ["write", "read"])
+
+
+if __name__ == "__main__":
+    unittest.main()
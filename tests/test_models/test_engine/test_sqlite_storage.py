@@ -0,0 +1,376 @@
+#!/usr/bin/python3
+""" Defines unittests for models/engine/sqlite_storage.py. """
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+import models
+from models.engine import columns
+from models.engine.sqlite_storage import SQLiteStorage
+from models.city import City
+from models.place import Place
+from models.review import Review
+from models.state import State
+from models.user import User
+
+
+class TestSQLiteStorage(unittest.TestCase):
+    def setUp(self):
+        self.storage = SQLiteStorage("test.db")
+        self.storage.reload()
+        self.patch = patch.object(models, "storage", self.storage)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        self.storage.close()
+        for path in ("test.db", "test.db-wal", "test.db-shm"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def rows(self, query, *args):
+        """Runs query on a separate connection and returns its rows."""
+        db = sqlite3.connect("test.db")
+        try:
+            return db.execute(query, args).fetchall()
+        finally:
+            db.close()
+
+    def test_save_reload(self):
+        """Test that saved objects come back from a new storage."""
+        user = User()
+        user.first_name = "Betty"
+        place = Place()
+        place.amenity_ids = ["a", "b"]
+        self.storage.save()
+        other = SQLiteStorage("test.db")
+        other.reload()
+        loaded = other.get(User, user.id)
+        self.assertEqual(loaded.first_name, "Betty")
+        self.assertIsInstance(loaded.created_at, datetime)
+        self.assertEqual(loaded.to_dict(), user.to_dict())
+        self.assertEqual(other.get("Place", place.id).amenity_ids,
+                         ["a", "b"])
+        other.close()
+
+    def test_all_count(self):
+        """Test all() and count() with and without a class."""
+        user = User()
+        state = State()
+        self.assertEqual(self.storage.all(User),
+                         {"User.{}".format(user.id): user})
+        self.assertEqual(self.storage.count("State"), 1)
+        self.assertEqual(self.storage.count(), 2)
+        self.assertIn("State.{}".format(state.id), self.storage.all())
+
+    def test_save_only_changed(self):
+        """Test that save() only writes the rows that changed."""
+        users = [User() for i in range(3)]
+        self.storage.save()
+        with patch.object(User, "to_dict", autospec=True,
+                          side_effect=User.to_dict) as to_dict:
+            users[1].first_name = "Betty"
+            self.storage.save()
+        to_dict.assert_called_once_with(users[1])
+        data = self.rows('SELECT data FROM "User" WHERE id = ?',
+                         users[1].id)[0][0]
+        self.assertEqual(json.loads(data)["first_name"], "Betty")
+
+    def test_delete(self):
+        """Test that a deleted object's row is removed on save()."""
+        user = User()
+        self.storage.save()
+        self.storage.delete(user)
+        self.assertIsNone(self.storage.get(User, user.id))
+        self.storage.save()
+        self.assertEqual(self.rows('SELECT id FROM "User"'), [])
+
+    def test_bulk_load(self):
+        """Test that bulk_load() stores and saves dicts and instances."""
+        city = City()
+        objs = self.storage.bulk_load(
+            [{"city_id": city.id, "name": str(i)} for i in range(50)] +
+            [city], cls=Place)
+        self.assertIs(objs[-1], city)
+        self.assertEqual(
+            len(self.rows('SELECT id FROM "Place" WHERE city_id = ?',
+                          city.id)), 50)
+        self.assertEqual(len(self.rows('SELECT id FROM "City"')), 1)
+
+    def test_transaction(self):
+        """Test that a transaction saves once or puts objects back."""
+        user = User()
+        user.first_name = "Betty"
+        self.storage.save()
+        with self.storage.transaction():
+            user.first_name = "Holberton"
+            user.save()
+            self.assertEqual(json.loads(self.rows(
+                'SELECT data FROM "User"')[0][0])["first_name"], "Betty")
+        self.assertEqual(json.loads(self.rows(
+            'SELECT data FROM "User"')[0][0])["first_name"], "Holberton")
+        with self.assertRaises(RuntimeError):
+            with self.storage.transaction():
+                self.storage.delete(user)
+                State().save()
+                raise RuntimeError
+        self.assertIs(self.storage.get(User, user.id), user)
+        self.assertEqual(user.first_name, "Holberton")
+        self.assertEqual(self.storage.count(State), 0)
+        self.assertEqual(self.rows('SELECT id FROM "State"'), [])
+
+    def test_find(self):
+        """Test that find() matches saved and unsaved objects."""
+        state = State()
+        cities = [City() for i in range(3)]
+        for city in cities:
+            city.state_id = state.id
+        user = User()
+        user.email = "betty@holberton.io"
+        self.storage.save()
+        cities[0].state_id = "moved"
+        extra = City()
+        extra.state_id = state.id
+        self.assertCountEqual(self.storage.find(City, state_id=state.id),
+                              cities[1:] + [extra])
+        self.assertEqual(self.storage.find(User, email=user.email), [user])
+        self.assertEqual(self.storage.find("City", name="", state_id="moved"),
+                         [cities[0]])
+        indexes = {row[0] for row in self.rows(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertIn("User_email", indexes)
+
+    def test_find_range(self):
+        """Test that find_range() orders saved and unsaved objects."""
+        places = []
+        for i in range(10):
+            place = Place()
+            place.price_by_night = i * 10
+            places.append(place)
+        self.storage.save()
+        places[2].price_by_night = 1000
+        extra = Place()
+        extra.price_by_night = 15
+        self.assertEqual(self.storage.find_range(Place, "price_by_night",
+                                                 10, 40),
+                         [places[1], extra, places[3], places[4]])
+        self.assertEqual(self.storage.find_range("Place", "price_by_night",
+                                                 reverse=True, limit=2),
+                         [places[2], places[9]])
+        self.assertEqual(self.rows('SELECT id FROM "Place" WHERE '
+                                   'price_by_night > 75 ORDER BY '
+                                   'price_by_night'),
+                         [(places[8].id,), (places[9].id,)])
+
+    def test_find_range_default(self):
+        """Test that find_range() finds saved places at the default 0."""
+        places = [Place(), Place()]
+        places[1].price_by_night = 5
+        self.storage.save()
+        self.assertEqual(self.storage.find_range(Place, "price_by_night",
+                                                 0, 10), places)
+        self.assertEqual(len(self.rows('SELECT id FROM "Place" WHERE '
+                                       'price_by_night BETWEEN 0 AND 10')),
+                         2)
+
+    def test_find_near(self):
+        """Test spatial queries on saved, changed and deleted objects."""
+        places = []
+        for i in range(5):
+            place = Place()
+            place.latitude = float(i)
+            place.longitude = 0.0
+            places.append(place)
+        self.storage.save()
+        self.assertEqual(self.storage.find_near(Place, 0, 0, limit=2),
+                         places[:2])
+        places[4].latitude = 0.5
+        self.storage.delete(places[0])
+        self.assertEqual(self.storage.find_near(Place, 0, 0, km=150),
+                         [places[4], places[1]])
+        self.assertCountEqual(self.storage.find_within(Place, 1, -1, 3, 1),
+                              places[1:4])
+
+    def test_search(self):
+        """Test that search() follows saved, changed and deleted objects."""
+        reviews = []
+        for text in ("Great view", "Great food", "Quiet"):
+            review = Review()
+            review.text = text
+            reviews.append(review)
+        self.storage.save()
+        self.assertCountEqual(self.storage.search(Review, "great"),
+                              reviews[:2])
+        reviews[2].text = "great"
+        self.storage.delete(reviews[0])
+        self.assertCountEqual(self.storage.search(Review, "great"),
+                              reviews[1:])
+        self.assertEqual(self.storage.search(Review, "view quiet", any=True),
+                         [])
+
+    def test_find_containing(self):
+        """Test that find_containing() follows updates and deletes."""
+        places = [Place() for i in range(3)]
+        places[0].amenity_ids = ["wifi", "tv"]
+        places[1].amenity_ids = ["wifi"]
+        self.storage.save()
+        self.assertCountEqual(self.storage.find_containing(
+            Place, "amenity_ids", ["wifi"]), places[:2])
+        places[2].amenity_ids = ["tv", "wifi"]
+        self.storage.delete(places[0])
+        self.assertEqual(self.storage.find_containing(
+            "Place", "amenity_ids", ["wifi", "tv"]), [places[2]])
+
+    def test_added_column_filled(self):
+        """Test that a column added to an old table is filled from data."""
+        place = Place()
+        place.price_by_night = 30
+        Place()
+        self.storage.save()
+        self.storage.close()
+        db = sqlite3.connect("test.db")
+        with db:
+            db.execute('DROP INDEX "Place_price_by_night"')
+            db.execute('ALTER TABLE "Place" DROP COLUMN price_by_night')
+        db.close()
+        self.storage = SQLiteStorage("test.db")
+        self.storage.reload()
+        self.assertCountEqual(self.rows('SELECT price_by_night FROM '
+                                        '"Place"'), [(30,), (0,)])
+
+    def test_all_by_class(self):
+        """Test that all(cls) and count(cls) follow every change."""
+        users = [User() for i in range(3)]
+        states = [State() for i in range(2)]
+        self.storage.delete(users[0])
+        self.storage.save()
+        self.assertEqual(self.storage.count(User), 2)
+        self.assertEqual(self.storage.count("State"), 2)
+        self.assertEqual(self.storage.count(), 4)
+        self.assertEqual(set(self.storage.all(State).values()), set(states))
+        with self.assertRaises(RuntimeError):
+            with self.storage.transaction():
+                User()
+                self.storage.delete(states[0])
+                raise RuntimeError
+        self.assertEqual(self.storage.count(User), 2)
+        self.assertEqual(self.storage.count(State), 2)
+        self.storage.reload()
+        self.assertEqual(set(self.storage.all(User)),
+                         {"User." + user.id for user in users[1:]})
+        self.assertEqual(self.storage.count(Review), 0)
+
+    def test_find_default(self):
+        """Test that find() matches saved objects still at a default."""
+        city = City()
+        self.storage.save()
+        self.assertEqual(self.storage.find(City, state_id=""), [city])
+        self.assertEqual(self.rows('SELECT state_id FROM "City"'), [("",)])
+
+    def test_group(self):
+        """Test that group() matches saved and unsaved objects by value."""
+        states = [State() for i in range(2)]
+        cities = [City() for i in range(3)]
+        for state, city in zip(states * 2, cities):
+            city.state_id = state.id
+        self.storage.save()
+        cities[1].state_id = states[0].id
+        groups = self.storage.group(City, "state_id",
+                                    [state.id for state in states])
+        self.assertCountEqual(groups[states[0].id], cities)
+        self.assertEqual(groups[states[1].id], [])
+        self.assertCountEqual(states[0].cities, groups[states[0].id])
+
+    def test_aggregate(self):
+        """Test that aggregate() follows updates and deletes, with and
+        without NumPy."""
+        places = [Place() for i in range(3)]
+        for place, city, price in zip(places, "aab", (10, 30, 50)):
+            place.city_id = city
+            place.price_by_night = price
+        self.storage.save()
+        self.assertEqual(self.storage.aggregate(Place, "price_by_night",
+                                                by="city_id"),
+                         {"a": 20, "b": 50})
+        places[2].city_id = "a"
+        self.storage.delete(places[0])
+        for np in (columns.np, None):
+            with patch.object(columns, "np", np):
+                self.assertEqual(self.storage.aggregate(
+                    "Place", "price_by_night", "sum", "city_id",
+                    {"price_by_night": (20, None)}), {"a": 80})
+
+    def test_foreign_key_columns(self):
+        """Test that *_id fields get their own indexed columns."""
+        state = State()
+        city = City()
+        city.state_id = state.id
+        place = Place()
+        place.city_id = city.id
+        review = Review()
+        review.place_id = place.id
+        self.storage.save()
+        self.assertEqual(
+            self.rows('SELECT id FROM "City" WHERE state_id = ?', state.id),
+            [(city.id,)])
+        self.assertEqual(
+            self.rows('SELECT id FROM "Review" WHERE place_id = ?',
+                      place.id), [(review.id,)])
+        indexes = {row[0] for row in self.rows(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        for name in ("City_state_id", "Place_city_id", "Place_user_id",
+                     "Review_place_id", "Review_user_id"):
+            self.assertIn(name, indexes)
+
+    def test_refresh(self):
+        """Test that refresh() picks up rows written elsewhere."""
+        self.assertFalse(self.storage.refresh())
+        mine = User()
+        other = SQLiteStorage("test.db")
+        other.reload()
+        with patch.object(models, "storage", other):
+            theirs = User()
+            other.save()
+        other.close()
+        self.assertTrue(self.storage.refresh())
+        self.assertFalse(self.storage.refresh())
+        self.assertIsNotNone(self.storage.get(User, theirs.id))
+        self.assertIs(self.storage.get(User, mine.id), mine)
+
+    def test_engine_selection(self):
+        """Test that HBNB_TYPE_STORAGE=sqlite selects SQLiteStorage."""
+        env = dict(os.environ, HBNB_TYPE_STORAGE="sqlite",
+                   HBNB_SQLITE_PATH="test.db")
+        out = subprocess.check_output(
+            [sys.executable, "-c",
+             "import models; print(type(models.storage).__name__)"],
+            env=env, universal_newlines=True)
+        self.assertEqual(out.strip(), "SQLiteStorage")
+
+    def test_console_restart(self):
+        """Test that the console creates objects that a restart reads."""
+        self.storage.close()
+        os.remove("test.db")
+        env = dict(os.environ, HBNB_TYPE_STORAGE="sqlite",
+                   HBNB_SQLITE_PATH="test.db")
+        id = subprocess.check_output(
+            [sys.executable, "console.py"], input="create User\n",
+            env=env, universal_newlines=True).replace("(hbnb)", "").strip()
+        self.assertNotIn("**", id)
+        out = subprocess.check_output(
+            [sys.executable, "console.py"],
+            input="show User {}\nUser.count()\n".format(id),
+            env=env, universal_newlines=True)
+        self.assertIn("[User] ({})".format(id), out)
+        self.assertIn("(hbnb) 1\n", out)
+        self.storage = SQLiteStorage("test.db")
+
+
+if __name__ == "__main__":
+    unittest.main()
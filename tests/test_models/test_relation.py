@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+"""Defines unittests for models/relation.py."""
+import os
+import unittest
+from unittest.mock import patch
+import models
+from models.amenity import Amenity
+from models.city import City
+from models.engine.file_storage import FileStorage
+from models.place import Place
+from models.relation import Relation
+from models.review import Review
+from models.state import State
+from models.user import User
+
+
+class TestRelation(unittest.TestCase):
+    def setUp(self):
+        FileStorage._FileStorage__objects = {}
+        self.state = State()
+        self.cities = [City() for i in range(2)]
+        for city in self.cities:
+            city.state_id = self.state.id
+        self.user = User()
+        self.wifi = Amenity()
+        self.place = Place()
+        self.place.city_id = self.cities[0].id
+        self.place.user_id = self.user.id
+        self.place.amenity_ids = [self.wifi.id, "gone"]
+        self.review = Review()
+        self.review.place_id = self.place.id
+        self.review.user_id = self.user.id
+
+    def tearDown(self):
+        try:
+            os.remove("file.json")
+        except FileNotFoundError:
+            pass
+
+    def test_by(self):
+        """Test the relations to the objects pointing at the owner."""
+        self.assertCountEqual(self.state.cities, self.cities)
+        self.assertEqual(self.cities[0].places, [self.place])
+        self.assertEqual(self.cities[1].places, [])
+        self.assertEqual(self.place.reviews, [self.review])
+        self.assertEqual(self.user.places, [self.place])
+        self.assertEqual(self.user.reviews, [self.review])
+        self.assertEqual(self.wifi.places, [self.place])
+
+    def test_on(self):
+        """Test the relations to the objects the owner points at."""
+        self.assertIs(self.cities[0].state, self.state)
+        self.assertIs(self.place.city, self.cities[0])
+        self.assertIs(self.place.user, self.user)
+        self.assertIs(self.review.place, self.place)
+        self.assertIs(self.review.user, self.user)
+        self.assertEqual(self.place.amenities, [self.wifi])
+        self.assertIsNone(City().state)
+
+    def test_follows_changes(self):
+        """Test that relations see updates and deletes right away."""
+        self.cities[1].state_id = "elsewhere"
+        models.storage.delete(self.review)
+        self.assertEqual(self.state.cities, [self.cities[0]])
+        self.assertEqual(self.place.reviews, [])
+        self.place.city_id = self.cities[1].id
+        self.assertIs(self.place.city, self.cities[1])
+
+    def test_prefetch(self):
+        """Test that prefetch() resolves many owners with one group()."""
+        other = State()
+        with patch.object(models.storage, "group",
+                          wraps=models.storage.group) as group:
+            cities = State.cities.prefetch([self.state, other])
+        group.assert_called_once()
+        self.assertCountEqual(cities[self.state.id], self.cities)
+        self.assertEqual(cities[other.id], [])
+        self.assertEqual(City.state.prefetch(self.cities),
+                         {city.id: self.state for city in self.cities})
+
+    def test_not_a_field(self):
+        """Test that relations are neither stored nor class fields."""
+        self.assertIsInstance(State.cities, Relation)
+        self.assertNotIn("cities", self.state.to_dict())
+        self.assertNotIn("state", self.cities[0].to_dict())
+
+
+if __name__ == "__main__":
+    unittest.main()